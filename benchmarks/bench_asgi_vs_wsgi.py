@@ -0,0 +1,43 @@
+"""Load test /beerfact on the threaded WSGI runserver vs the async handlers behind uvicorn.
+
+Run with: python -m benchmarks.bench_asgi_vs_wsgi [--requests N] [--concurrency C] [--latency SECONDS]
+
+The Beer API is a local stub that waits --latency seconds per request, standing in for a slow
+BreweryDB. The sync server needs a thread per waiting call; the async one waits on the event loop.
+"""
+import argparse
+
+from benchmarks.common import print_table
+from benchmarks.load import free_port, post_many, runserver_command, start_server, stop_server, uvicorn_command
+from twiliotutorial.tests.stubs import BeerApiStubHandler, StubServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.1, help='seconds the stub Beer API waits per request')
+    args = parser.parse_args()
+
+    beer_api = StubServer(BeerApiStubHandler, latency=args.latency).start()
+    environ = {'BEER_API_URL': beer_api.url, 'BEER_API_KEY': 'benchmark', 'BEER_API_POOL_SIZE': str(args.concurrency)}
+    requests = [{'path': '/beerfact'}] * args.requests
+    rows = {}
+    try:
+        for name, command in (('wsgi runserver', runserver_command), ('asgi uvicorn', uvicorn_command)):
+            port = free_port()
+            server = start_server(command(port), port, environ)
+            try:
+                rows[name] = post_many('http://127.0.0.1:%s' % port, requests, args.concurrency,
+                                       warmup=requests[:args.concurrency])
+            finally:
+                stop_server(server)
+    finally:
+        beer_api.stop()
+
+    print_table('/beerfact, %s requests at concurrency %s, Beer API latency %ss'
+                % (args.requests, args.concurrency, args.latency), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Throughput and peak memory of send_beer_campaign against a local fake Twilio, for growing recipient lists.
+
+Run with: python -m benchmarks.bench_campaign [--sizes N,N] [--workers N] [--latency SECONDS]
+
+Each campaign runs as its own manage.py process, so its peak RSS is its own. Memory should stay
+the same as the list grows, and throughput should come from --workers covering the fake Twilio's
+--latency. The rate limit is off, as it would be for a short code.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import print_table, setup_django
+from benchmarks.load import ROOT_DIR
+
+
+def run_campaign(recipients: str, workers: int, env) -> dict:
+    command = [sys.executable, 'manage.py', 'send_beer_campaign', recipients, '--from', '+15005550006',
+               '--beer-id', 'abc123', '--workers', str(workers), '--no-rate-limit', '--restart']
+    # Output goes to a file: a full pipe would stall the campaign while we sit in wait4
+    with tempfile.TemporaryFile() as output:
+        started = time.perf_counter()
+        process = subprocess.Popen(command, cwd=ROOT_DIR, env=env, stdout=output, stderr=subprocess.STDOUT)
+        # wait4 rather than wait, for this child's own peak RSS
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - started
+        output.seek(0)
+        lines = output.read().decode().strip().splitlines()
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise RuntimeError('\n'.join(lines[-20:]))
+    return {'seconds': elapsed, 'per_minute': 0.0, 'peak_rss_mb': usage.ru_maxrss / 1024.0, 'output': lines[-1]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='2000,20000')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds the fake Twilio waits per message')
+    args = parser.parse_args()
+
+    setup_django()
+    from twiliotutorial.tests.stubs import BeerApiStubHandler, StubServer, TwilioStubHandler
+
+    beer_api = StubServer(BeerApiStubHandler).start()
+    twilio = StubServer(TwilioStubHandler, latency=args.latency, keep_received=False).start()
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='twiliotutorial.settings', BEER_API_URL=beer_api.url,
+               TWILIO_API_BASE_URL=twilio.url, TWILIO_ACCOUNT_SID='ACbenchmark', TWILIO_ACCOUNT_TOKEN='benchmark',
+               TWILIO_POOL_SIZE=str(args.workers), BEER_SNAPSHOT_PATH='', WARM_UP='false')
+    rows = {}
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for size in [int(size) for size in args.sizes.split(',')]:
+                recipients = os.path.join(directory, 'recipients-%s.txt' % size)
+                with open(recipients, 'w') as recipients_file:
+                    for number in range(size):
+                        recipients_file.write('+1555%07d\n' % number)
+                received = twilio.counts['received']
+                stats = run_campaign(recipients, args.workers, env)
+                stats['received'] = twilio.counts['received'] - received
+                stats['per_minute'] = stats['received'] / stats['seconds'] * 60
+                print(stats.pop('output'))
+                rows['%s recipients' % size] = stats
+    finally:
+        beer_api.stop()
+        twilio.stop()
+    print_table('send_beer_campaign, %s workers, fake Twilio latency %sms' % (args.workers, args.latency * 1000),
+                rows)
+
+
+if __name__ == '__main__':
+    main()
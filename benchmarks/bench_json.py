@@ -0,0 +1,58 @@
+"""Decoding Beer API responses with each installed JSON library.
+
+Run with: python -m benchmarks.bench_json [--iterations N]
+
+Bodies are a random beer, a one-beer /v2/beers page, and full 50-beer pages like the snapshot export
+reads, with short and with long style descriptions.
+"""
+import argparse
+import json
+
+from benchmarks.common import print_table, setup_django, summarize, time_calls
+
+
+def make_beer(number: int, description_length: int):
+    return {
+        'id': 'beer%05d' % number, 'name': 'Beer %s' % number, 'nameDisplay': 'Beer %s' % number,
+        'abv': '5.5', 'ibu': '40', 'isOrganic': 'N', 'isRetired': 'N', 'status': 'verified',
+        'statusDisplay': 'Verified', 'createDate': '2019-08-01 12:00:00', 'updateDate': '2019-08-01 12:00:00',
+        'style': {'id': 25, 'categoryId': 3, 'name': 'American-Style Pale Ale', 'shortName': 'American Pale',
+                  'description': ('A hoppy pale ale. ' * description_length)[:description_length],
+                  'ibuMin': '30', 'ibuMax': '50', 'abvMin': '4.5', 'abvMax': '6.2', 'srmMin': '6', 'srmMax': '14',
+                  'createDate': '2012-03-21 20:06:45', 'updateDate': '2015-04-07 15:25:18'},
+    }
+
+
+def make_page(count: int, description_length: int) -> bytes:
+    return json.dumps({'currentPage': 1, 'numberOfPages': 20, 'totalResults': 1000,
+                       'data': [make_beer(number, description_length) for number in range(count)],
+                       'status': 'success'}).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from twiliotutorial.json_decoding import DECODERS
+
+    bodies = {
+        'random': json.dumps({'data': make_beer(1, 300), 'status': 'success'}).encode(),
+        'one id page': make_page(1, 300),
+        '50 beer page': make_page(50, 300),
+        '50 beer page, 2k styles': make_page(50, 2000),
+    }
+    rows = {}
+    for body_name, body in bodies.items():
+        for decoder_name, decoder in DECODERS.items():
+            if decoder is not None:
+                rows['%s: %s' % (body_name, decoder_name)] = summarize(
+                    time_calls(lambda: decoder(body), args.iterations, warmup=100))
+    print_table('JSON decoding, %s decodes each (%s)' % (
+        args.iterations, ', '.join('%s %s bytes' % (name, len(body)) for name, body in bodies.items())), rows)
+
+
+if __name__ == '__main__':
+    main()
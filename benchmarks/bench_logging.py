@@ -0,0 +1,84 @@
+"""Logging cost per webhook: writing on the request thread vs queueing for a listener thread.
+
+Run with: python -m benchmarks.bench_logging [--requests N] [--sample-rate R]
+
+Each request logs what a /beerfact and /beertext call does at DEBUG, to a file. "before" is the root
+StreamHandler logging.debug sets up when nothing is configured, which is what every worker used to
+write with. mean/p99 are the time on the request thread; total_ms_per_request adds the time the
+listener needs to catch up afterwards, so nothing is hidden on a single core.
+"""
+import argparse
+import logging
+import sys
+import tempfile
+import time
+
+from benchmarks.common import print_table, setup_django, summarize, time_calls
+
+
+def log_request(number: int) -> None:
+    beer_id = 'oeGSxs%s' % number
+    logging.debug("Getting a random beer fact")
+    logging.debug("Beer response: %s", 200)
+    logging.debug("Looking for beer id: %s", beer_id)
+    logging.debug("Beer response: %s", 200)
+    logging.info("OOhhh...Engagement.")
+    logging.info("Sent sms: %s", 'SM%032d' % number)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--sample-rate', type=float, default=0.01)
+    args = parser.parse_args()
+
+    setup_django()
+    from twiliotutorial.structured_logging import TEXT_FORMAT, call_sid_var, configure_logging
+
+    root = logging.getLogger()
+    setups = {
+        'before: sync text, DEBUG': None,
+        'queued text, DEBUG': {'format': 'text', 'debug_sample_rate': 1.0},
+        'queued json, DEBUG': {'format': 'json', 'debug_sample_rate': 1.0},
+        'queued json, DEBUG sampled': {'format': 'json', 'debug_sample_rate': args.sample_rate},
+        'queued json, INFO': {'format': 'json', 'debug_sample_rate': 1.0, 'level': 'INFO'},
+    }
+    rows = {}
+    stderr = sys.stderr
+    with tempfile.TemporaryFile('w') as log_file:
+        for name, config in setups.items():
+            sys.stderr = log_file
+            try:
+                if config is None:
+                    for handler in root.handlers[:]:
+                        root.removeHandler(handler)
+                    handler = logging.StreamHandler(log_file)
+                    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+                    root.addHandler(handler)
+                    root.setLevel(logging.DEBUG)
+                else:
+                    configure_logging(dict({'level': 'DEBUG', 'queue_size': args.requests * 6}, **config))
+                numbers = iter(range(10 ** 9))
+
+                def request():
+                    token = call_sid_var.set('CA%032d' % next(numbers))
+                    log_request(next(numbers))
+                    call_sid_var.reset(token)
+
+                started = time.perf_counter()
+                samples = time_calls(request, args.requests, warmup=100)
+                for handler in root.handlers:
+                    handler.flush()
+                elapsed = time.perf_counter() - started
+            finally:
+                sys.stderr = stderr
+            rows[name] = summarize(samples)
+            rows[name]['total_ms_per_request'] = elapsed / (args.requests + 100) * 1000
+        # Back to stderr before the file goes
+        configure_logging({'level': 'INFO', 'format': 'text', 'debug_sample_rate': 1.0, 'queue_size': 1000})
+    print_table('Logging %s requests of 4 DEBUG and 2 INFO records, DEBUG sample rate %s'
+                % (args.requests, args.sample_rate), rows)
+
+
+if __name__ == '__main__':
+    main()
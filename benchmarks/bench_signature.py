@@ -0,0 +1,75 @@
+"""Cost of checking X-Twilio-Signature on a voice webhook, against the twilio library's RequestValidator.
+
+Run with: python -m benchmarks.bench_signature [--iterations N]
+
+The middleware rows go through TwilioSignatureMiddleware with a view that does nothing, so they include
+building the url and parsing the form body.
+"""
+import argparse
+import urllib.parse
+
+from benchmarks.common import print_table, setup_django, summarize, time_calls
+
+TOKEN = 'benchmark-auth-token'
+
+# What Twilio posts to a voice webhook after a Gather
+PARAMS = {
+    'AccountSid': 'AC' + 'a' * 32, 'ApiVersion': '2010-04-01', 'CallSid': 'CA' + 'b' * 32, 'CallStatus': 'in-progress',
+    'Called': '+15005550006', 'CalledCity': 'SAN FRANCISCO', 'CalledCountry': 'US', 'CalledState': 'CA',
+    'CalledZip': '94105', 'Caller': '+18675309000', 'CallerCity': 'PORTLAND', 'CallerCountry': 'US',
+    'CallerState': 'OR', 'CallerZip': '97201', 'Digits': '1', 'Direction': 'inbound', 'FinishedOnKey': '',
+    'From': '+18675309000', 'FromCity': 'PORTLAND', 'FromCountry': 'US', 'FromState': 'OR', 'FromZip': '97201',
+    'To': '+15005550006', 'ToCity': 'SAN FRANCISCO', 'ToCountry': 'US', 'ToState': 'CA', 'ToZip': '94105',
+    'msg': 'Gather End',
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    setup_django(TWILIO_ACCOUNT_TOKEN=TOKEN, TWILIO_VALIDATE_SIGNATURES='true')
+
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+    from twilio.request_validator import RequestValidator
+
+    from twiliotutorial.middleware import TwilioSignatureMiddleware
+    from twiliotutorial.twilio_signature import SignatureValidator
+
+    url = 'http://testserver/beertext?beerid=abc123'
+    library = RequestValidator(TOKEN)
+    signature = library.compute_signature(url, PARAMS)
+    validator = SignatureValidator(TOKEN)
+    params = [(name, [value]) for name, value in PARAMS.items()]
+    assert validator.is_valid(url, params, signature)
+
+    response = HttpResponse()
+    middleware = TwilioSignatureMiddleware(lambda request: response)
+    factory = RequestFactory()
+
+    def through_middleware(**headers):
+        request = factory.post('/beertext?beerid=abc123', urllib.parse.urlencode(PARAMS),
+                               content_type='application/x-www-form-urlencoded', **headers)
+
+        def call():
+            # Parse the form again every time, like a new request would
+            request.__dict__.pop('_post', None)
+            request.__dict__.pop('_files', None)
+            return middleware(request)
+        return call
+
+    rows = {
+        'twilio RequestValidator': lambda: library.validate(url, PARAMS, signature),
+        'SignatureValidator': lambda: validator.is_valid(url, params, signature),
+        'middleware, valid': through_middleware(HTTP_X_TWILIO_SIGNATURE=signature),
+        'middleware, wrong signature': through_middleware(HTTP_X_TWILIO_SIGNATURE='bm9wZQ=='),
+        'middleware, no signature': through_middleware(),
+    }
+    print_table('Validating a %s parameter voice webhook, %s times each' % (len(PARAMS), args.iterations),
+                {name: summarize(time_calls(call, args.iterations, warmup=100)) for name, call in rows.items()})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Cost of taking an SMS status callback: buffered and written in batches vs one sqlite write per callback.
+
+Run with: python -m benchmarks.bench_sms_status [--callbacks N] [--batch-size N]
+
+The view rows include Django parsing the callback's form, as posted by Twilio. The last row is how
+long writing a whole burst out takes once it is buffered.
+"""
+import argparse
+import os
+import tempfile
+import time
+import urllib.parse
+
+from benchmarks.common import print_table, setup_django, summarize, time_calls
+
+# What Twilio posts to a StatusCallback
+FORM = {'SmsSid': 'SM' + 'a' * 32, 'SmsStatus': 'delivered', 'MessageStatus': 'delivered', 'To': '+18675309000',
+        'MessageSid': 'SM' + 'a' * 32, 'AccountSid': 'AC' + 'b' * 32, 'From': '+15005550006',
+        'ApiVersion': '2010-04-01'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--callbacks', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import RequestFactory
+
+    from twiliotutorial.sms_status import SmsStatusBuffer, SqliteSmsStatusStore
+    from twiliotutorial.views import SmsStatusView
+
+    factory = RequestFactory()
+    view = SmsStatusView()
+    sids = iter(range(10 ** 9))
+
+    def callback_request():
+        form = dict(FORM, MessageSid='SM%032d' % next(sids))
+        return factory.post('/sms-status?beerid=abc123', urllib.parse.urlencode(form),
+                            content_type='application/x-www-form-urlencoded')
+
+    with tempfile.TemporaryDirectory() as directory:
+        rows = {}
+        buffered_store = SqliteSmsStatusStore(os.path.join(directory, 'buffered.sqlite3'))
+        buffer = SmsStatusBuffer(buffered_store, batch_size=args.batch_size, flush_interval=1.0,
+                                 max_buffered=args.callbacks * 2)
+        # Build the requests up front, so only the view is timed
+        requests = [callback_request() for _ in range(args.callbacks)]
+        request_iter = iter(requests)
+        with mock_buffer(buffer):
+            rows['view, buffered'] = summarize(time_calls(lambda: view.post(next(request_iter)), args.callbacks))
+        buffer.stop()
+
+        direct_store = SqliteSmsStatusStore(os.path.join(directory, 'direct.sqlite3'))
+        direct = iter(range(args.callbacks))
+        rows['sqlite write per callback'] = summarize(time_calls(
+            lambda: direct_store.write([('SM%s' % next(direct), 'delivered', 'abc123', None, time.time())]),
+            min(args.callbacks, 2000)))
+
+        burst = [('SMburst%s' % number, 'delivered', 'abc123', None, time.time()) for number in range(args.callbacks)]
+        started = time.perf_counter()
+        for start in range(0, len(burst), args.batch_size):
+            buffered_store.write(burst[start:start + args.batch_size])
+        elapsed = time.perf_counter() - started
+        rows['batched write, whole burst'] = {'count': len(burst), 'seconds': elapsed,
+                                               'per_second': len(burst) / elapsed}
+        for name in ('view, buffered', 'sqlite write per callback'):
+            rows[name]['per_second'] = 1000.0 / rows[name]['mean_ms']
+        print_table('%s status callbacks, batches of %s' % (args.callbacks, args.batch_size), rows)
+        buffered_store.close()
+        direct_store.close()
+
+
+def mock_buffer(buffer):
+    from unittest import mock
+    return mock.patch('twiliotutorial.views.get_sms_status_buffer', return_value=buffer)
+
+
+if __name__ == '__main__':
+    main()
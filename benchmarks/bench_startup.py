@@ -0,0 +1,57 @@
+"""Cold start of a worker: importing the WSGI app and url conf, with and without warming up.
+
+Run with: python -m benchmarks.bench_startup [--runs N] [--top N]
+
+Each run is a fresh interpreter. Also lists the slowest imports, from python -X importtime, so it
+is easy to see what a change added to startup.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.common import print_table, summarize
+from benchmarks.load import ROOT_DIR
+
+SCENARIOS = {
+    'wsgi + urls': 'import twiliotutorial.wsgi, twiliotutorial.urls',
+    'wsgi + urls + warm_up': 'import twiliotutorial.wsgi; from twiliotutorial.warmup import warm_up; warm_up()',
+}
+
+
+def run(code, *options):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='twiliotutorial.settings', WARM_UP='false')
+    env.setdefault('BEER_API_URL', 'http://127.0.0.1:1')
+    return subprocess.run([sys.executable, *options, '-c', code], cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.PIPE, universal_newlines=True, check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    rows = {}
+    for name, code in SCENARIOS.items():
+        samples = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            run(code)
+            samples.append(time.perf_counter() - started)
+        rows[name] = summarize(samples)
+    print_table('Fresh interpreter start, %s runs each' % args.runs, rows)
+
+    imports = []
+    for line in run(SCENARIOS['wsgi + urls'], '-X', 'importtime').stderr.splitlines():
+        if line.startswith('import time:') and 'cumulative' not in line:
+            _, cumulative, module = line[len('import time:'):].split('|')
+            imports.append((int(cumulative), module.strip()))
+    print('Slowest imports for wsgi + urls (cumulative ms)')
+    for cumulative, module in sorted(imports, reverse=True)[:args.top]:
+        print('  %-40s %8.1f' % (module, cumulative / 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Per-SMS latency of a new Twilio Client per message vs the shared pooled client.
+
+Run with: python -m benchmarks.bench_twilio_client [--iterations N] [--latency SECONDS]
+
+Both sides talk to a local fake Twilio over plain HTTP, so the gap here is connection setup and
+client construction only. Against api.twilio.com each new connection also pays for a TLS handshake.
+"""
+import argparse
+
+from benchmarks.common import print_table, setup_django, summarize, time_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds the fake Twilio waits per request')
+    args = parser.parse_args()
+
+    setup_django(TWILIO_ACCOUNT_SID='ACbenchmark', TWILIO_ACCOUNT_TOKEN='benchmark')
+
+    from twilio.http.http_client import TwilioHttpClient
+    from twilio.rest import Client
+    from django.conf import settings
+
+    from twiliotutorial.tests.stubs import StubServer, TwilioStubHandler
+    from twiliotutorial.twilio_client import PooledTwilioHttpClient, build_twilio_client
+
+    server = StubServer(TwilioStubHandler, latency=args.latency).start()
+    try:
+        def per_request_client():
+            # What BeerTextView used to do: a new Client, and so a new session, for every SMS
+            http_client = PooledTwilioHttpClient(session=TwilioHttpClient().session, timeout=None, base_url=server.url)
+            client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_ACCOUNT_TOKEN, http_client=http_client)
+            client.messages.create(body='benchmark', from_='5551234', to='8675309')
+
+        shared_client = build_twilio_client(base_url=server.url)
+
+        def pooled_client():
+            shared_client.messages.create(body='benchmark', from_='5551234', to='8675309')
+
+        rows = {}
+        for name, call in (('per-request Client', per_request_client), ('shared pooled Client', pooled_client)):
+            server.counts['connections'] = 0
+            stats = summarize(time_calls(call, args.iterations, warmup=10))
+            stats['connections'] = server.counts['connections']
+            rows[name] = stats
+        print_table('Twilio messages.create, %s sends' % args.iterations, rows)
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Building a VoiceResponse and calling to_xml() vs rendering a precompiled TwiML template.
+
+Run with: python -m benchmarks.bench_twiml [--iterations N]
+"""
+import argparse
+
+from benchmarks.common import print_table, setup_django, summarize, time_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from twilio.twiml import voice_response
+
+    from twiliotutorial.twiml_templates import render_twiml
+
+    def prompt_tree():
+        response = voice_response.VoiceResponse()
+        gather = response.gather(action='/callback', num_digits=2, timeout=30)
+        gather.say("Pick a number between 0 and 99")
+        return response.to_xml().encode()
+
+    def digits_tree():
+        response = voice_response.VoiceResponse()
+        response.say("You picked 42")
+        response.redirect('/play-again')
+        return response.to_xml().encode()
+
+    assert prompt_tree() == render_twiml('pick_a_number.xml')
+    assert digits_tree() == render_twiml('you_picked.xml', digits='42')
+
+    rows = {
+        'static: VoiceResponse': prompt_tree,
+        'static: template': lambda: render_twiml('pick_a_number.xml'),
+        'variable: VoiceResponse': digits_tree,
+        'variable: template': lambda: render_twiml('you_picked.xml', digits='42'),
+    }
+    print_table('TwiML rendering, %s renders each' % args.iterations,
+                {name: summarize(time_calls(call, args.iterations, warmup=100)) for name, call in rows.items()})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Throughput of the production gunicorn profile as the worker count grows, against dev runserver.
+
+Run with: python -m benchmarks.bench_workers [--workers 1,2,4] [--threads T] [--requests N] [--concurrency C]
+                                             [--latency SECONDS]
+
+Replays /beerfact and /callback with digits, the first waiting on a stub Beer API (no latency by
+default, so the run is CPU bound) and the second never leaving the process. Worker counts default
+to 1, 2, 4, ... up to twice the CPU count; throughput should grow with them until the cores run out.
+"""
+import argparse
+import multiprocessing
+
+from benchmarks.common import print_table
+from benchmarks.load import free_port, gunicorn_command, post_many, runserver_command, start_server, stop_server
+from twiliotutorial.tests.stubs import BeerApiStubHandler, StubServer
+
+
+def default_worker_counts():
+    counts = [1]
+    while counts[-1] < multiprocessing.cpu_count() * 2:
+        counts.append(counts[-1] * 2)
+    return ','.join(map(str, counts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', default=default_worker_counts(), help='comma separated worker counts')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds the stub Beer API waits per request')
+    args = parser.parse_args()
+
+    beer_api = StubServer(BeerApiStubHandler, latency=args.latency).start()
+    # The load isn't signed, and the prod profile checks X-Twilio-Signature by default
+    environ = {'BEER_API_URL': beer_api.url, 'BEER_API_KEY': 'benchmark', 'SMS_QUEUE_BACKEND': '',
+               'TWILIO_VALIDATE_SIGNATURES': 'false'}
+    scenarios = {
+        '/beerfact': [{'path': '/beerfact'}] * args.requests,
+        '/callback': [{'path': '/callback', 'data': {'Digits': '42'}}] * args.requests,
+    }
+    servers = [('runserver dev', runserver_command, dict(environ, DJANGO_PROFILE='dev'))]
+    for workers in map(int, args.workers.split(',')):
+        servers.append(('gunicorn prod %sx%s' % (workers, args.threads), gunicorn_command,
+                        dict(environ, DJANGO_PROFILE='prod', WEB_CONCURRENCY=str(workers),
+                             GUNICORN_THREADS=str(args.threads), GUNICORN_LOG_LEVEL='warning')))
+
+    rows = {}
+    try:
+        for name, command, server_environ in servers:
+            port = free_port()
+            server = start_server(command(port), port, server_environ)
+            try:
+                for path, requests in scenarios.items():
+                    rows['%s %s' % (path, name)] = post_many('http://127.0.0.1:%s' % port, requests,
+                                                             args.concurrency, warmup=requests[:args.concurrency])
+            finally:
+                stop_server(server)
+    finally:
+        beer_api.stop()
+
+    print_table('%s requests per row at concurrency %s on %s CPUs, Beer API latency %ss'
+                % (args.requests, args.concurrency, multiprocessing.cpu_count(), args.latency), rows)
+
+
+if __name__ == '__main__':
+    main()
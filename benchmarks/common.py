@@ -0,0 +1,46 @@
+import os
+import statistics
+import time
+from typing import Callable, Dict, List
+
+
+def setup_django(**environ) -> None:
+    for key, value in environ.items():
+        os.environ.setdefault(key, value)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'twiliotutorial.settings')
+    import django
+    django.setup()
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        'count': len(samples),
+        'mean_ms': statistics.mean(samples) * 1000,
+        'p50_ms': percentile(samples, 0.50) * 1000,
+        'p95_ms': percentile(samples, 0.95) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+    }
+
+
+def time_calls(call: Callable[[], object], iterations: int, warmup: int = 0) -> List[float]:
+    for _ in range(warmup):
+        call()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def print_table(title: str, rows: Dict[str, Dict[str, float]]) -> None:
+    print(title)
+    for name, stats in rows.items():
+        print('  %-28s %s' % (name, '  '.join('%s=%.3f' % (key, value) if isinstance(value, float)
+                                              else '%s=%s' % (key, value) for key, value in stats.items())))
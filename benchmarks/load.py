@@ -0,0 +1,101 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from benchmarks.common import summarize
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError('Server on port %s did not start' % port)
+
+
+def start_server(command: List[str], port: int, environ: Dict[str, str]) -> subprocess.Popen:
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='twiliotutorial.settings', **environ)
+    process = subprocess.Popen(command, cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+    except RuntimeError:
+        process.kill()
+        raise
+    return process
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def runserver_command(port: int) -> List[str]:
+    return [sys.executable, 'manage.py', 'runserver', '127.0.0.1:%s' % port, '--noreload']
+
+
+def gunicorn_command(port: int) -> List[str]:
+    # Workers, threads and the rest come from gunicorn.conf.py and its environment variables
+    return [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', '127.0.0.1:%s' % port,
+            'twiliotutorial.wsgi']
+
+
+def uvicorn_command(port: int) -> List[str]:
+    return [sys.executable, '-m', 'uvicorn', 'twiliotutorial.asgi:application', '--port', str(port),
+            '--log-level', 'warning']
+
+
+async def _post_many(url: str, requests: List[Dict[str, str]], concurrency: int) -> Dict[str, object]:
+    latencies = []
+    errors = 0
+    position = 0
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=60)) as session:
+        async def worker():
+            nonlocal position, errors
+            while position < len(requests):
+                request = requests[position]
+                position += 1
+                started = time.perf_counter()
+                try:
+                    async with session.post(url + request['path'], data=request.get('data')) as response:
+                        await response.read()
+                        if response.status != 200:
+                            errors += 1
+                except aiohttp.ClientError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    stats = summarize(latencies)
+    stats['throughput_rps'] = len(latencies) / elapsed
+    stats['errors'] = errors
+    return stats
+
+
+def post_many(url: str, requests: List[Dict[str, str]], concurrency: int,
+              warmup: Optional[List[Dict[str, str]]] = None) -> Dict[str, object]:
+    if warmup:
+        asyncio.run(_post_many(url, warmup, concurrency))
+    return asyncio.run(_post_many(url, requests, concurrency))
@@ -0,0 +1,230 @@
+"""Replay Twilio webhook traffic against /callback, /play-again, /beerfact and /beertext.
+
+Run with: python -m benchmarks.suite [--server gunicorn|runserver|uvicorn] [--requests N] [--concurrency C]
+                                     [--beer-latency S] [--twilio-latency S] [--outage]
+                                     [--repeat N] [--save-baseline FILE] [--compare [FILE] [--tolerance F]]
+
+The server runs in a subprocess against local stub BreweryDB and Twilio servers that wait the
+given latency per request. Each scenario reports throughput, p50/p95/p99 latency and the server's
+resident memory afterwards, summed over its worker processes. With --outage, /beerfact and
+/beertext are replayed once more while the stub Beer API answers every request with a 503.
+
+--save-baseline writes the results as JSON, along with the server and the host's CPU they were
+measured with; --compare checks a run against a saved baseline and exits non-zero if p95 or
+throughput regressed by more than --tolerance (a fraction, 0.5 by default: medians of five runs
+still drift by about a third between runs on a shared single core host, so only bigger changes are
+reported). A baseline from another server or CPU isn't compared against at all.
+
+benchmarks/baseline.json is a default run (runserver, --repeat 5) on the 1 CPU host it names, and
+what --compare without a file checks against. Re-save it with --save-baseline benchmarks/baseline.json
+when a change is meant to move the numbers, or to compare on different hardware.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import uuid
+from typing import Dict, List, Optional
+
+from benchmarks.common import print_table
+from benchmarks.load import (free_port, gunicorn_command, post_many, runserver_command, start_server, stop_server,
+                             uvicorn_command)
+from twiliotutorial.tests.stubs import BeerApiStubHandler, StubServer, TwilioStubHandler
+
+SERVERS = {
+    'gunicorn': gunicorn_command,
+    'runserver': runserver_command,
+    'uvicorn': uvicorn_command,
+}
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+CALLER_NUMBERS = ['+1555%07d' % number for number in range(1000)]
+TWILIO_NUMBER = '+15005550006'
+
+
+def webhook_form(call_sid: str, **fields) -> Dict[str, str]:
+    form = {
+        'AccountSid': 'ACbenchmark',
+        'ApiVersion': '2010-04-01',
+        'CallSid': call_sid,
+        'CallStatus': 'in-progress',
+        'Direction': 'inbound',
+        'From': random.choice(CALLER_NUMBERS),
+        'To': TWILIO_NUMBER,
+    }
+    form.update(fields)
+    return form
+
+
+def call_sid() -> str:
+    return 'CA' + uuid.uuid4().hex
+
+
+def build_scenarios(count: int, beer_ids: List[str]) -> Dict[str, List[Dict[str, object]]]:
+    return {
+        'callback prompt': [{'path': '/callback', 'data': webhook_form(call_sid())} for _ in range(count)],
+        'callback digits': [{'path': '/callback', 'data': webhook_form(call_sid(), Digits=str(random.randint(0, 99)))}
+                            for _ in range(count)],
+        'play-again prompt': [{'path': '/play-again', 'data': webhook_form(call_sid())} for _ in range(count)],
+        'play-again digits': [{'path': '/play-again', 'data': webhook_form(call_sid(), Digits=random.choice('12'))}
+                              for _ in range(count)],
+        'beerfact': [{'path': '/beerfact', 'data': webhook_form(call_sid())} for _ in range(count)],
+        # A handful of beers being texted over and over, like callers hearing the same beer of the day
+        'beertext': [{'path': '/beertext?beerid=' + random.choice(beer_ids), 'data': webhook_form(call_sid(), Digits='1')}
+                     for _ in range(count)],
+    }
+
+
+def process_tree(pid: int) -> List[int]:
+    """pid and all of its descendants, e.g. a gunicorn master and the workers doing the work."""
+    pids = [pid]
+    for parent in pids:
+        try:
+            tasks = os.listdir('/proc/%s/task' % parent)
+        except OSError:
+            continue
+        for task in tasks:
+            try:
+                with open('/proc/%s/task/%s/children' % (parent, task)) as children:
+                    pids.extend(int(child) for child in children.read().split())
+            except OSError:
+                pass
+    return pids
+
+
+def resident_memory_mb(pid: int) -> Optional[float]:
+    total_kb = None
+    for process in process_tree(pid):
+        try:
+            with open('/proc/%s/status' % process) as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        total_kb = (total_kb or 0) + int(line.split()[1])
+        except OSError:
+            pass
+    return total_kb / 1024 if total_kb is not None else None
+
+
+def cpu_model() -> Optional[str]:
+    try:
+        with open('/proc/cpuinfo') as cpuinfo:
+            for line in cpuinfo:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or None
+
+
+# What a baseline was measured on. Numbers from a different server or CPU aren't comparable.
+def measured_on(server: str) -> Dict[str, object]:
+    return {'server': server, 'machine': platform.machine(), 'cpu_model': cpu_model(), 'cpu_count': os.cpu_count()}
+
+
+# One busy moment on the host can move a single run a lot, so compare the median of each figure
+def median_run(runs: List[Dict[str, float]]) -> Dict[str, float]:
+    return {key: statistics.median(stats[key] for stats in runs) for key in runs[0]}
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    regressions = []
+    for scenario, stats in results.items():
+        base = baseline.get(scenario)
+        if base is None:
+            continue
+        if stats['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append('%s: p95 %.1fms vs baseline %.1fms' % (scenario, stats['p95_ms'], base['p95_ms']))
+        if stats['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+            regressions.append('%s: throughput %.0f/s vs baseline %.0f/s'
+                               % (scenario, stats['throughput_rps'], base['throughput_rps']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--server', choices=sorted(SERVERS), default='runserver')
+    parser.add_argument('--requests', type=int, default=500, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--beer-latency', type=float, default=0.05)
+    parser.add_argument('--twilio-latency', type=float, default=0.1)
+    parser.add_argument('--scenario', action='append', help='only run these scenarios')
+    parser.add_argument('--outage', action='store_true', help='also replay /beerfact and /beertext with the Beer API down')
+    parser.add_argument('--save-baseline')
+    parser.add_argument('--compare', nargs='?', const=BASELINE_PATH,
+                        help='baseline to check against (default: benchmarks/baseline.json)')
+    parser.add_argument('--tolerance', type=float, default=0.5)
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='replay each scenario this many times and report the median of each figure')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    beer_api = StubServer(BeerApiStubHandler, latency=args.beer_latency).start()
+    twilio = StubServer(TwilioStubHandler, latency=args.twilio_latency).start()
+    environ = {
+        'BEER_API_URL': beer_api.url,
+        'BEER_API_KEY': 'benchmark',
+        'TWILIO_API_BASE_URL': twilio.url,
+        'TWILIO_ACCOUNT_SID': 'ACbenchmark',
+        'TWILIO_ACCOUNT_TOKEN': 'benchmark',
+        # The replayed webhooks aren't signed
+        'TWILIO_VALIDATE_SIGNATURES': 'false',
+    }
+    beer_ids = ['beer%s' % number for number in range(5)]
+    scenarios = build_scenarios(args.requests, beer_ids)
+    if args.scenario:
+        scenarios = {name: requests for name, requests in scenarios.items() if name in args.scenario}
+
+    results = {}
+    port = free_port()
+    server = start_server(SERVERS[args.server](port), port, environ)
+    try:
+        url = 'http://127.0.0.1:%s' % port
+        for name, requests in scenarios.items():
+            warmup = requests[:args.concurrency]
+            runs = []
+            for _ in range(args.repeat):
+                stats = post_many(url, requests, args.concurrency, warmup=warmup)
+                stats['rss_mb'] = resident_memory_mb(server.pid) or 0.0
+                runs.append(stats)
+            results[name] = median_run(runs)
+        if args.outage:
+            beer_api.failing = True
+            for name in ('beerfact', 'beertext'):
+                stats = post_many(url, build_scenarios(args.requests, beer_ids)[name], args.concurrency)
+                stats['rss_mb'] = resident_memory_mb(server.pid) or 0.0
+                results[name + ' outage'] = stats
+    finally:
+        stop_server(server)
+        beer_api.stop()
+        twilio.stop()
+
+    print_table('%s, %s requests per scenario at concurrency %s (Beer API %ss, Twilio %ss)'
+                % (args.server, args.requests, args.concurrency, args.beer_latency, args.twilio_latency), results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as baseline_file:
+            json.dump({'measured_on': measured_on(args.server), 'results': results}, baseline_file, indent=2,
+                      sort_keys=True)
+            baseline_file.write('\n')
+    if args.compare:
+        if not os.path.exists(args.compare):
+            sys.exit('No baseline at %s' % args.compare)
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['measured_on'] != measured_on(args.server):
+            sys.exit('%s was measured on %s, not %s; save a baseline here with --save-baseline first'
+                     % (args.compare, baseline['measured_on'], measured_on(args.server)))
+        regressions = compare(results, baseline['results'], args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# Production server: gunicorn -c gunicorn.conf.py twiliotutorial.wsgi
+# Every value can be overridden from the environment, which is how the Dockerfile and the benchmarks tune it.
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:%s' % os.environ.get('PORT', '8000'))
+
+# Webhooks mostly wait on BreweryDB and Twilio, so each process runs a few threads on top of the usual
+# two workers per core. Set GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker to serve
+# twiliotutorial.asgi:application instead.
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Twilio reuses connections between the webhooks of a call. Keep idle ones open longer than a load
+# balancer in front would (60s on an AWS ALB), so it is never the server closing under a request.
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 75))
+backlog = int(os.environ.get('GUNICORN_BACKLOG', 2048))
+
+# Twilio gives up on a webhook after 15 seconds
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 20))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 20))
+
+# Recycle workers now and then so slow growth in one process can't build up, with jitter so they
+# don't all restart at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+# Load Django once in the master and fork it. Nothing starts a thread or opens a connection at import,
+# the sessions, pools and queues are all created on first use inside each worker.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+# With preload_app the master warms up once and every worker inherits it, otherwise each worker warms up
+# after loading the app. Turned on by settings.WARM_UP, which the prod profile enables.
+def when_ready(server):
+    if preload_app:
+        _warm_up()
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        _warm_up()
+
+
+# A recycled (max_requests) or stopped worker finishes the texts it is sending before it goes. Queued ones
+# wait in the sqlite queue, the prod default, for the other workers.
+def worker_exit(server, worker):
+    from twiliotutorial.sms_queue import stop_sms_dispatcher
+    stop_sms_dispatcher()
+
+
+def _warm_up():
+    from django.conf import settings
+    if settings.WARM_UP:
+        from twiliotutorial.warmup import warm_up
+        warm_up()
@@ -0,0 +1,89 @@
+"""
+ASGI config for twiliotutorial project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+POSTs to /beerfact and /beertext are answered by the async handlers in async_views, which don't
+hold a thread while BreweryDB and Twilio respond. Everything else goes to the regular Django
+WSGI application, run in a thread pool.
+
+Serve it with an ASGI server, e.g. ``uvicorn twiliotutorial.asgi:application``.
+"""
+
+import os
+import urllib.parse
+
+from asgiref.wsgi import WsgiToAsgi
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'twiliotutorial.settings')
+
+django_application = WsgiToAsgi(get_wsgi_application())
+
+from twiliotutorial.async_http import close_async_session  # noqa: E402 (needs Django set up first)
+from twiliotutorial.async_views import ROUTES, read_body, wait_for_background_tasks  # noqa: E402
+from twiliotutorial.metrics import webhook_latency  # noqa: E402
+from twiliotutorial.twilio_signature import get_signature_validator, webhook_url  # noqa: E402
+from twiliotutorial.warmup import warm_up  # noqa: E402
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            if settings.WARM_UP:
+                warm_up()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await wait_for_background_tasks()
+            await close_async_session()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+# Returns a receive that replays the body already read, or None if the signature is missing or wrong
+async def validate_signature(scope, receive):
+    headers = dict(scope['headers'])
+    signature = headers.get(b'x-twilio-signature')
+    validator = get_signature_validator()
+    if not signature:
+        validator.reject()
+        return None
+    body = await read_body(receive)
+    host = headers.get(b'host', b'').decode() or '%s:%s' % scope['server']
+    url = '%s://%s%s' % (scope['scheme'], host, scope['path'])
+    if scope['query_string']:
+        url += '?' + scope['query_string'].decode()
+    params = urllib.parse.parse_qs(body.decode(), keep_blank_values=True).items()
+    if not validator.is_valid(webhook_url(url), params, signature.decode()):
+        validator.reject()
+        return None
+
+    async def replay():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+    return replay
+
+
+async def send_forbidden(send) -> None:
+    await send({'type': 'http.response.start', 'status': 403,
+                'headers': [(b'content-type', b'text/html; charset=utf-8'), (b'content-length', b'0')]})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    handler = ROUTES.get(scope['path']) if scope['type'] == 'http' and scope['method'] == 'POST' else None
+    if handler is not None:
+        # These never reach Django, so TimingMiddleware and TwilioSignatureMiddleware don't see them
+        with webhook_latency.time(scope['path'].lstrip('/')):
+            if settings.TWILIO_VALIDATE_SIGNATURES:
+                receive = await validate_signature(scope, receive)
+                if receive is None:
+                    await send_forbidden(send)
+                    return
+            await handler(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+import aiohttp
+from django.conf import settings
+
+from twiliotutorial.async_http import get_async_session
+from twiliotutorial.beer import EMPTY_BEER_FACT, Beer, BeerFact
+from twiliotutorial.beer_cache import get_beer_fact_cache
+from twiliotutorial.beer_snapshot import get_beer_snapshot
+from twiliotutorial.circuit_breaker import get_beer_api_breaker
+from twiliotutorial.json_decoding import DecodeError, loads, preview
+from twiliotutorial.metrics import upstream_latency
+from twiliotutorial.random_beer_batch import get_random_beer_batch
+from twiliotutorial.singleflight import AsyncSingleFlight
+
+async_beer_id_lookups = AsyncSingleFlight()
+
+
+class AsyncBeer:
+    """Async twin of Beer for the ASGI views. URLs, parsing and the BeerFact cache are shared with Beer.
+
+    With the snapshot backend, beers in the snapshot are answered from memory without awaiting anything.
+    """
+
+    @staticmethod
+    async def get_beer_fact_from_api(url: str, params: Optional[Dict[str, str]]) -> Dict[str, str]:
+        # requests leaves out None params, aiohttp refuses them
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+        breaker = get_beer_api_breaker()
+        if not breaker.allow():
+            logging.debug("Beer API circuit is open, not calling %s", url)
+            return dict()
+        try:
+            with upstream_latency.time('beer_api'):
+                async with get_async_session().get(url, params=params) as response:
+                    if response.status != 200:
+                        logging.debug("Response code: %s", response.status)
+                        if response.status >= 500 or response.status == 429:
+                            breaker.record_failure()
+                        else:
+                            breaker.record_success()
+                        return dict()
+                    content = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.debug("Beer API request failed: %s", e)
+            breaker.record_failure()
+            return dict()
+
+        result = dict()
+        try:
+            result = loads(content)
+        except DecodeError:
+            logging.debug("Could not parse JSON from Beer API %s", preview(content))
+            breaker.record_failure()
+            return result
+        breaker.record_success()
+        logging.debug("Beer response: %s", response.status)
+        return result
+
+    async def get_random_beer_fact(self) -> BeerFact:
+        logging.debug("Getting a random beer fact")
+        if settings.BEER_BACKEND == 'snapshot':
+            fact = get_beer_snapshot().random()
+            if fact is not None:
+                return fact
+        if settings.BEER_RANDOM_BATCH_SIZE > 1:
+            fact = await get_random_beer_batch().get_async(self.fetch_random_beer_facts)
+            return fact if fact is not None else Beer.stale_random_beer_fact()
+        params = {
+            'key': settings.BEER_API_KEY
+        }
+        result = await self.get_beer_fact_from_api(url=Beer.get_random_beer_url(), params=params)
+        if not result:
+            return Beer.stale_random_beer_fact()
+
+        fact = Beer.convert_result_to_beer_fact(result)
+        if fact.id is not None:
+            get_beer_fact_cache().set(fact.id, fact)
+        return fact
+
+    async def get_beer_by_id(self, beer_id: str) -> BeerFact:
+        logging.debug("Looking for beer id: %s", beer_id)
+        if settings.BEER_BACKEND == 'snapshot':
+            fact = get_beer_snapshot().get(beer_id)
+            if fact is not None:
+                return fact
+        fact = get_beer_fact_cache().get(beer_id)
+        if fact is not None:
+            return fact
+        return await async_beer_id_lookups.do(beer_id, lambda: self.fetch_beer_by_id(beer_id))
+
+    async def fetch_random_beer_facts(self, count: int) -> List[BeerFact]:
+        params = {
+            'key': settings.BEER_API_KEY,
+            'order': 'random',
+            'randomCount': count
+        }
+        result = await self.get_beer_fact_from_api(url=Beer.get_beer_with_id_url(), params=params)
+        facts = [fact for fact in map(Beer.convert_data_to_beer_fact, result.get('data') or []) if fact.id is not None]
+        cache = get_beer_fact_cache()
+        for fact in facts:
+            cache.set(fact.id, fact)
+        return facts
+
+    async def fetch_beer_by_id(self, beer_id: str) -> BeerFact:
+        cache = get_beer_fact_cache()
+        params = {
+            'key': settings.BEER_API_KEY,
+            'ids': beer_id
+        }
+        result = await self.get_beer_fact_from_api(url=Beer.get_beer_with_id_url(), params=params)
+        if not result:
+            return cache.get_stale(beer_id) or EMPTY_BEER_FACT
+        fact = Beer.convert_result_to_beer_fact(result)
+        cache.set(beer_id, fact)
+        return fact
@@ -0,0 +1,32 @@
+import asyncio
+from typing import Dict
+
+import aiohttp
+from django.conf import settings
+
+_sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+
+
+def build_async_session(pool_size: int, connect_timeout: float, read_timeout: float) -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(limit_per_host=pool_size, keepalive_timeout=30)
+    timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+# aiohttp sessions belong to the loop they were made on, so keep one per running loop. The same
+# session serves the Beer API and Twilio; limit_per_host caps the pool for each separately.
+def get_async_session() -> aiohttp.ClientSession:
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = build_async_session(pool_size=settings.BEER_API_POOL_SIZE,
+                                      connect_timeout=settings.BEER_API_CONNECT_TIMEOUT,
+                                      read_timeout=settings.BEER_API_READ_TIMEOUT)
+        _sessions[loop] = session
+    return session
+
+
+async def close_async_session() -> None:
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
@@ -0,0 +1,42 @@
+import asyncio
+import logging
+from typing import Optional
+
+import aiohttp
+from django.conf import settings
+
+from twiliotutorial.async_http import get_async_session
+from twiliotutorial.metrics import upstream_latency
+
+TWILIO_API_URL = 'https://api.twilio.com'
+MESSAGES_URI = '/2010-04-01/Accounts/{account_sid}/Messages.json'
+
+
+class TwilioSendError(Exception):
+    pass
+
+
+def get_messages_url() -> str:
+    base_url = settings.TWILIO_API_BASE_URL or TWILIO_API_URL
+    return base_url.rstrip('/') + MESSAGES_URI.format(account_sid=settings.TWILIO_ACCOUNT_SID)
+
+
+# Same request twilio.rest's messages.create makes, without tying up a thread while Twilio answers
+async def send_sms(body: str, from_: str, to: str, status_callback: Optional[str] = None) -> str:
+    data = {'Body': body, 'From': from_, 'To': to}
+    if status_callback:
+        data['StatusCallback'] = status_callback
+    auth = aiohttp.BasicAuth(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_ACCOUNT_TOKEN)
+    timeout = aiohttp.ClientTimeout(sock_connect=settings.TWILIO_CONNECT_TIMEOUT,
+                                    sock_read=settings.TWILIO_READ_TIMEOUT)
+    try:
+        with upstream_latency.time('twilio_messages'):
+            async with get_async_session().post(get_messages_url(), data=data, auth=auth,
+                                                timeout=timeout) as response:
+                payload = await response.json(content_type=None)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        raise TwilioSendError(str(e)) from e
+    if response.status >= 400:
+        raise TwilioSendError("Twilio returned %s: %s" % (response.status, payload.get('message')))
+    logging.info("Sent sms: %s", payload['sid'])
+    return payload['sid']
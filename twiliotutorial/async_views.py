@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import urllib.parse
+from typing import Dict, Optional, Set
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from twiliotutorial.async_beer import AsyncBeer
+from twiliotutorial.async_twilio import TwilioSendError, send_sms
+from twiliotutorial.call_session import get_call_sessions
+from twiliotutorial.metrics import twiml_latency
+from twiliotutorial.rate_limiter import get_sms_rate_limiter
+from twiliotutorial.sms_status import sms_status_callback_url
+from twiliotutorial.structured_logging import call_sid_var
+from twiliotutorial.twiml_templates import render_twiml
+from twiliotutorial.views import BeerFactView, BeerTextView
+
+# Strong references to the SMS sends still running, so they aren't garbage collected mid-flight
+_background_tasks: Set[asyncio.Task] = set()
+
+
+async def read_body(receive) -> bytes:
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+
+def parse_form(data: bytes) -> Dict[str, str]:
+    return dict(urllib.parse.parse_qsl(data.decode()))
+
+
+async def send_twiml(send, twiml: bytes) -> None:
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/xml'), (b'content-length', str(len(twiml)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': twiml})
+
+
+async def beer_fact(scope, receive, send) -> None:
+    call_sid = parse_form(await read_body(receive)).get('CallSid')
+    # Each request runs in its own task, so this only tags this call's records
+    call_sid_var.set(call_sid)
+    sessions = get_call_sessions()
+    fact = sessions.get(call_sid).get('beer_fact') if call_sid is not None else None
+    if fact is None:
+        fact = await AsyncBeer().get_random_beer_fact()
+        if call_sid is not None and fact.id is not None:
+            sessions.update(call_sid, beer_fact=fact)
+    response = BeerFactView().build_response(fact)
+    with twiml_latency.time('beerfact'):
+        twiml = response.to_xml().encode()
+    await send_twiml(send, twiml)
+
+
+async def text_beer_info_to_number(beer_id: str, from_: str, to_: str, call_sid: Optional[str] = None) -> None:
+    fact = get_call_sessions().get(call_sid).get('beer_fact') if call_sid is not None else None
+    if fact is None or fact.id != beer_id:
+        fact = await AsyncBeer().get_beer_by_id(beer_id)
+    if fact.id is None:
+        logging.info("No beer found for %s, not texting", beer_id)
+        return
+    # This runs after the webhook has answered, so waiting for the rate limit holds up nobody. The sqlite
+    # buckets can wait on another worker's lock, so reserving runs on a thread rather than the event loop.
+    reserve = sync_to_async(lambda: get_sms_rate_limiter().reserve(to_), thread_sensitive=False)
+    wait = await reserve()
+    while wait > 0:
+        await asyncio.sleep(wait)
+        wait = await reserve()
+    try:
+        await send_sms(body=BeerTextView().create_text_body(fact), from_=to_, to=from_,
+                       status_callback=sms_status_callback_url(fact.id))
+    except TwilioSendError:
+        logging.exception("Could not text beer %s", beer_id)
+
+
+async def beer_text(scope, receive, send) -> None:
+    request_beerid = parse_form(scope['query_string']).get('beerid')
+    form = parse_form(await read_body(receive))
+    call_sid_var.set(form.get("CallSid"))
+    logging.info("OOhhh...Engagement.")
+    request_from_number = form.get("From")
+    request_to_number = form.get("To")
+
+    if request_beerid is None:
+        logging.info("Weird, we didn't get a beerid")
+    elif request_from_number is None:
+        logging.info("Weird, we didn't get a number")
+    elif settings.SMS_QUEUE_BACKEND:
+        # The same dispatch queue as BeerTextView, for its dedupe, retries and rate limit. Enqueueing can
+        # write to sqlite, so it runs on a thread.
+        await sync_to_async(BeerTextView().queue_beer_text, thread_sensitive=False)(
+            call_sid=form.get("CallSid", request_from_number), beer_id=request_beerid, from_=request_from_number,
+            to_=request_to_number)
+    else:
+        task = asyncio.ensure_future(text_beer_info_to_number(beer_id=request_beerid, from_=request_from_number,
+                                                              to_=request_to_number, call_sid=form.get("CallSid")))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    await send_twiml(send, render_twiml('empty.xml'))
+
+
+async def wait_for_background_tasks() -> None:
+    if _background_tasks:
+        await asyncio.gather(*_background_tasks, return_exceptions=True)
+
+
+ROUTES = {
+    '/beerfact': beer_fact,
+    '/beertext': beer_text,
+}
@@ -1,20 +1,27 @@
-import json
 import logging
 import urllib.parse
-from collections import namedtuple
-from json import JSONDecodeError
-from typing import Dict, Optional
+from typing import Dict, Iterable, List, Optional
 
-import requests
 from django.conf import settings
 
-logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+from twiliotutorial.beer_cache import get_beer_fact_cache
+from twiliotutorial.beer_fact import BeerFact
+from twiliotutorial.circuit_breaker import get_beer_api_breaker
+from twiliotutorial.http_session import get_session, get_timeout
+from twiliotutorial.json_decoding import DecodeError, loads, preview
+from twiliotutorial.metrics import REGISTRY, upstream_latency
+from twiliotutorial.random_beer_batch import get_random_beer_batch
+from twiliotutorial.singleflight import SingleFlight
 
 RANDOM_BEER_URI = "/v2/beer/random"
 BEER_URI = "/v2/beers"
 
-BeerFact = namedtuple('Beerfact', 'id name abv ibu style')
+EMPTY_BEER_FACT = BeerFact(id=None, name=None, abv=None, style=None, ibu=None)
+
+beer_id_lookups = SingleFlight()
+REGISTRY.register_callback('twiliotutorial_beer_lookups_coalesced_total',
+                           'Beer id lookups that waited for a call already in flight.', 'counter',
+                           lambda: beer_id_lookups.shared)
 
 
 class Beer:
@@ -26,47 +33,103 @@ class Beer:
     def get_beer_with_id_url() -> str:
         return urllib.parse.urljoin(settings.BEER_API_URL, BEER_URI)
 
+    # Returns an empty dict when the call fails, or isn't made at all because the circuit is open
     @staticmethod
     def get_beer_fact_from_api(url: str, params: Optional[Dict[str, str]]) -> Dict[str, str]:
-        response = requests.get(url=url, params=params)
+        breaker = get_beer_api_breaker()
+        if not breaker.allow():
+            logging.debug("Beer API circuit is open, not calling %s", url)
+            return dict()
+        session = get_session()
+        # Loaded by get_session() already, this only looks it up
+        from requests import RequestException
+        try:
+            with upstream_latency.time('beer_api'):
+                response = session.get(url=url, params=params, timeout=get_timeout())
+        except RequestException as e:
+            logging.debug("Beer API request failed: %s", e)
+            breaker.record_failure()
+            return dict()
 
         result = dict()
         if response.status_code != 200:
             logging.debug("Response code: %s", response.status_code)
+            if response.status_code >= 500 or response.status_code == 429:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
             return result
         try:
-            result = json.loads(response.content)
-        except JSONDecodeError as e:
-            logging.debug("Could not parse JSON from Beer API %s", response.content)
+            result = loads(response.content)
+        except DecodeError:
+            logging.debug("Could not parse JSON from Beer API %s", preview(response.content))
+            breaker.record_failure()
+            return result
+        breaker.record_success()
         logging.debug("Beer response: %s", response.status_code)
         return result
 
     @staticmethod
     def convert_result_to_beer_fact(result) -> BeerFact:
         if 'currentPage' in result:
-            data = result.get('data')[0]
+            data = (result.get('data') or [None])[0]
         else:
             data = result.get('data')
 
+        return Beer.convert_data_to_beer_fact(data)
+
+    @staticmethod
+    def convert_data_to_beer_fact(data) -> BeerFact:
         if not data or 'name' not in data or 'id' not in data:
-            return BeerFact(id=None, name=None, abv=None, style=None, ibu=None)
+            return EMPTY_BEER_FACT
         return BeerFact(id=data.get('id'), name=data.get('name'), abv=data.get('abv'), style=data.get('style'),
                         ibu=data.get('ibu'))
 
     # Gets a random beer from the API. Returns some data.
     def get_random_beer_fact(self) -> BeerFact:
         logging.debug("Getting a random beer fact")
+        if settings.BEER_RANDOM_BATCH_SIZE > 1:
+            fact = get_random_beer_batch().get(self.fetch_random_beer_facts)
+            return fact if fact is not None else self.stale_random_beer_fact()
         params = {
             'key': settings.BEER_API_KEY
         }
         url = self.get_random_beer_url()
         result = self.get_beer_fact_from_api(url=url, params=params)
+        if not result:
+            return self.stale_random_beer_fact()
 
-        return self.convert_result_to_beer_fact(result)
+        fact = self.convert_result_to_beer_fact(result)
+        if fact.id is not None:
+            # Whoever hears this beer is likely to ask for it by id on /beertext next
+            get_beer_fact_cache().set(fact.id, fact)
+        return fact
+
+    # Up to count random beers with one /v2/beers?order=random call
+    def fetch_random_beer_facts(self, count: int) -> List[BeerFact]:
+        params = {
+            'key': settings.BEER_API_KEY,
+            'order': 'random',
+            'randomCount': count
+        }
+        result = self.get_beer_fact_from_api(url=self.get_beer_with_id_url(), params=params)
+        facts = [fact for fact in map(self.convert_data_to_beer_fact, result.get('data') or []) if fact.id is not None]
+        cache = get_beer_fact_cache()
+        for fact in facts:
+            cache.set(fact.id, fact)
+        return facts
 
     # Get a specific beer from the API by ID. Returns some data.
     def get_beer_by_id(self, beer_id: str) -> BeerFact:
         logging.debug("Looking for beer id: %s", beer_id)
+        fact = get_beer_fact_cache().get(beer_id)
+        if fact is not None:
+            return fact
+        # Everyone asking for this id while it is being fetched shares the one API call
+        return beer_id_lookups.do(beer_id, lambda: self.fetch_beer_by_id(beer_id))
+
+    def fetch_beer_by_id(self, beer_id: str) -> BeerFact:
+        cache = get_beer_fact_cache()
         params = {
             'key': settings.BEER_API_KEY,
             'ids': beer_id
@@ -74,5 +137,76 @@ class Beer:
 
         url = self.get_beer_with_id_url()
         result = self.get_beer_fact_from_api(url=url, params=params)
+        if not result:
+            # Don't remember the API being down as the beer not existing
+            return cache.get_stale(beer_id) or EMPTY_BEER_FACT
         # Getting a beer by ID returns a paginated list. Let's grab the first item only
-        return self.convert_result_to_beer_fact(result)
+        fact = self.convert_result_to_beer_fact(result)
+        cache.set(beer_id, fact)
+        return fact
+
+    # Some beer we have heard of before, for when the API can't give us a random one
+    @staticmethod
+    def stale_random_beer_fact() -> BeerFact:
+        fact = get_beer_fact_cache().random_stale()
+        if fact is None:
+            logging.warning("Beer API is unavailable and no beers are cached")
+            return EMPTY_BEER_FACT
+        logging.debug("Beer API is unavailable, serving cached beer %s", fact.id)
+        return fact
+
+    # Get many beers by ID, asking the API for up to BEER_API_MAX_IDS_PER_REQUEST ids at a time.
+    # Ids the API doesn't know come back as an empty BeerFact.
+    def get_beers_by_ids(self, beer_ids: Iterable[str]) -> Dict[str, BeerFact]:
+        cache = get_beer_fact_cache()
+        facts = dict()
+        missing = []
+        for beer_id in dict.fromkeys(beer_ids):
+            fact = cache.get(beer_id)
+            if fact is None:
+                missing.append(beer_id)
+            else:
+                facts[beer_id] = fact
+        logging.debug("Looking for %s beer ids, %s cached", len(facts) + len(missing), len(facts))
+
+        chunk_size = settings.BEER_API_MAX_IDS_PER_REQUEST
+        for start in range(0, len(missing), chunk_size):
+            chunk = missing[start:start + chunk_size]
+            fetched = self.fetch_beer_facts_for_ids(chunk)
+            if fetched is None:
+                for beer_id in chunk:
+                    facts[beer_id] = cache.get_stale(beer_id) or EMPTY_BEER_FACT
+                continue
+            found = {fact.id: fact for fact in fetched if fact.id is not None}
+            for beer_id in chunk:
+                fact = found.get(beer_id, EMPTY_BEER_FACT)
+                cache.set(beer_id, fact)
+                facts[beer_id] = fact
+        return facts
+
+    # None if the API couldn't be asked for every page
+    def fetch_beer_facts_for_ids(self, beer_ids: List[str]) -> Optional[List[BeerFact]]:
+        url = self.get_beer_with_id_url()
+        facts = []
+        page = 1
+        while True:
+            params = {
+                'key': settings.BEER_API_KEY,
+                'ids': ','.join(beer_ids),
+                'p': page
+            }
+            result = self.get_beer_fact_from_api(url=url, params=params)
+            if not result:
+                return None
+            facts.extend(self.convert_data_to_beer_fact(data) for data in result.get('data') or [])
+            if page >= result.get('numberOfPages', 1):
+                return facts
+            page += 1
+
+
+def get_beer() -> Beer:
+    if settings.BEER_BACKEND == 'snapshot':
+        # Imported here because beer_snapshot builds on Beer
+        from twiliotutorial.beer_snapshot import SnapshotBeer
+        return SnapshotBeer()
+    return Beer()
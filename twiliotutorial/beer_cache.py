@@ -0,0 +1,133 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from twiliotutorial.beer_fact import BeerFact
+from twiliotutorial.metrics import REGISTRY
+
+SHARED_KEY_PREFIX = 'beerfact:'
+
+
+class BeerFactCache:
+    """Bounded LRU of BeerFacts by beer id, with TTL expiry.
+
+    Empty BeerFacts (the API had nothing for that id) are cached too, for negative_ttl seconds, so a
+    bad id doesn't go upstream on every request. If a shared Django cache is given, local misses fall
+    through to it and every set is written through, so workers can share what they have fetched.
+
+    Expired beers are kept until the LRU pushes them out, so get_stale() and random_stale() still
+    have something to answer with while the API is down.
+    """
+
+    def __init__(self, max_size: int, ttl: float, negative_ttl: float, shared_cache=None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.shared_cache = shared_cache
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, beer_id: str) -> Optional[BeerFact]:
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(beer_id)
+            if entry is not None:
+                expires_at, fact = entry
+                if expires_at > now:
+                    self._entries.move_to_end(beer_id)
+                    self.hits += 1
+                    return fact
+                if fact.id is None:
+                    del self._entries[beer_id]
+
+        fact = self._get_shared(beer_id)
+        with self._lock:
+            if fact is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._set_local(beer_id, fact)
+        return fact
+
+    def set(self, beer_id: str, fact: BeerFact) -> None:
+        self._set_local(beer_id, fact)
+        if self.shared_cache is not None:
+            self.shared_cache.set(SHARED_KEY_PREFIX + beer_id, fact, timeout=self._ttl_for(fact))
+
+    # Any beer we have for this id, expired or not. Empty BeerFacts don't count.
+    def get_stale(self, beer_id: str) -> Optional[BeerFact]:
+        with self._lock:
+            entry = self._entries.get(beer_id)
+        if entry is None or entry[1].id is None:
+            return None
+        return entry[1]
+
+    def random_stale(self) -> Optional[BeerFact]:
+        with self._lock:
+            facts = [fact for _, fact in self._entries.values() if fact.id is not None]
+        return random.choice(facts) if facts else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+    def _ttl_for(self, fact: BeerFact) -> float:
+        return self.ttl if fact.id is not None else self.negative_ttl
+
+    def _set_local(self, beer_id: str, fact: BeerFact) -> None:
+        expires_at = self.clock() + self._ttl_for(fact)
+        with self._lock:
+            self._entries[beer_id] = (expires_at, fact)
+            self._entries.move_to_end(beer_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _get_shared(self, beer_id: str) -> Optional[BeerFact]:
+        if self.shared_cache is None:
+            return None
+        return self.shared_cache.get(SHARED_KEY_PREFIX + beer_id)
+
+
+_beer_fact_cache: Optional[BeerFactCache] = None
+_beer_fact_cache_lock = threading.Lock()
+
+
+def get_beer_fact_cache() -> BeerFactCache:
+    global _beer_fact_cache
+    if _beer_fact_cache is None:
+        with _beer_fact_cache_lock:
+            if _beer_fact_cache is None:
+                shared_cache = None
+                if settings.BEER_CACHE_SHARED_BACKEND:
+                    shared_cache = caches[settings.BEER_CACHE_SHARED_BACKEND]
+                _beer_fact_cache = BeerFactCache(max_size=settings.BEER_CACHE_MAX_SIZE,
+                                                 ttl=settings.BEER_CACHE_TTL,
+                                                 negative_ttl=settings.BEER_CACHE_NEGATIVE_TTL,
+                                                 shared_cache=shared_cache)
+                cache = _beer_fact_cache
+                for name in ('hits', 'misses'):
+                    REGISTRY.register_callback('twiliotutorial_beer_cache_%s_total' % name,
+                                               'BeerFact cache lookups that were %s.' % name, 'counter',
+                                               lambda name=name: cache.stats()[name])
+    return _beer_fact_cache
+
+
+def reset_beer_fact_cache() -> None:
+    global _beer_fact_cache
+    with _beer_fact_cache_lock:
+        _beer_fact_cache = None
@@ -0,0 +1,56 @@
+from typing import Optional, Tuple
+
+
+class BeerFact:
+    """An immutable beer, keeping only the fields the IVR and SMS use.
+
+    The raw style dict from the API is reduced to its description, and the Say lines and SMS body
+    are formatted once here rather than on every request that uses the fact.
+    """
+
+    __slots__ = ('id', 'name', 'abv', 'ibu', 'style_description', 'say_lines', 'text_body')
+
+    def __init__(self, id, name, abv, ibu, style: Optional[dict]):
+        description = style.get('description') if style else None
+        self._init(id, name, abv, ibu, description)
+
+    @classmethod
+    def from_fields(cls, id, name, abv, ibu, style_description) -> 'BeerFact':
+        fact = cls.__new__(cls)
+        fact._init(id, name, abv, ibu, style_description)
+        return fact
+
+    def _init(self, id, name, abv, ibu, style_description) -> None:
+        say_lines = [f"Our beer today is {name}"]
+        if abv:
+            say_lines.append(f"Coming in at {abv} percent.")
+        if style_description is not None:
+            say_lines.append(f"{style_description}")
+
+        for slot, value in (('id', id), ('name', name), ('abv', abv), ('ibu', ibu),
+                            ('style_description', style_description), ('say_lines', tuple(say_lines)),
+                            ('text_body', f"Hi there! You were listening to: {name}, {abv}%, IBU: {ibu}")):
+            object.__setattr__(self, slot, value)
+
+    def fields(self) -> Tuple:
+        return self.id, self.name, self.abv, self.ibu, self.style_description
+
+    def __setattr__(self, name, value):
+        raise AttributeError("BeerFact is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("BeerFact is immutable")
+
+    def __eq__(self, other):
+        if not isinstance(other, BeerFact):
+            return NotImplemented
+        return self.fields() == other.fields()
+
+    def __hash__(self):
+        return hash(self.fields())
+
+    def __reduce__(self):
+        return BeerFact.from_fields, self.fields()
+
+    def __repr__(self):
+        return 'BeerFact(id=%r, name=%r, abv=%r, ibu=%r, style_description=%r)' % self.fields()
@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+
+from twiliotutorial.beer import BeerFact, get_beer
+from twiliotutorial.metrics import REGISTRY
+
+
+class RandomBeerPool:
+    """Random BeerFacts fetched ahead of time so /beerfact can answer from memory.
+
+    Whenever the pool drops below low_watermark it is topped back up to high_watermark in the
+    background, with at most refill_concurrency fetches in flight. If it is empty when a caller
+    needs a beer, the caller fetches one directly. A refill that comes back with nothing waits
+    retry_interval seconds before the next one, so a dead upstream isn't hammered.
+    """
+
+    def __init__(self, fetch: Callable[[], BeerFact], low_watermark: int, high_watermark: int,
+                 refill_concurrency: int, retry_interval: float = 5.0, clock: Callable[[], float] = time.monotonic):
+        self.fetch = fetch
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.retry_interval = retry_interval
+        self.clock = clock
+        self.served = 0
+        self.fallbacks = 0
+        self._facts = deque()
+        self._in_flight = 0
+        self._refill_started_at: Optional[float] = None
+        self._last_refill_lag = 0.0
+        self._next_refill_at = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=refill_concurrency, thread_name_prefix='beer-pool')
+
+    def get(self) -> BeerFact:
+        try:
+            fact = self._facts.popleft()
+        except IndexError:
+            fact = None
+        self.refill()
+
+        with self._lock:
+            self.served += 1
+            if fact is None:
+                self.fallbacks += 1
+        if fact is None:
+            logging.debug("Random beer pool is empty, fetching directly")
+            return self.fetch()
+        return fact
+
+    def refill(self) -> None:
+        with self._lock:
+            depth = len(self._facts)
+            if depth + self._in_flight >= self.low_watermark:
+                return
+            now = self.clock()
+            if now < self._next_refill_at:
+                return
+            if self._refill_started_at is None:
+                self._refill_started_at = now
+            wanted = self.high_watermark - depth - self._in_flight
+            self._in_flight += wanted
+        for _ in range(wanted):
+            self._executor.submit(self._fetch_one)
+
+    def metrics(self) -> Dict[str, float]:
+        with self._lock:
+            refill_lag = self._last_refill_lag
+            if self._refill_started_at is not None:
+                refill_lag = self.clock() - self._refill_started_at
+            return {
+                'depth': len(self._facts),
+                'in_flight': self._in_flight,
+                'refill_lag_seconds': refill_lag,
+                'served': self.served,
+                'fallbacks': self.fallbacks,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    def _fetch_one(self) -> None:
+        fact = None
+        try:
+            fact = self.fetch()
+        except Exception:
+            logging.exception("Could not prefetch a random beer")
+
+        with self._lock:
+            self._in_flight -= 1
+            # Don't pool the empty BeerFact a failed lookup returns
+            if fact is not None and fact.id is not None and len(self._facts) < self.high_watermark:
+                self._facts.append(fact)
+            if self._in_flight == 0 and self._refill_started_at is not None:
+                now = self.clock()
+                self._last_refill_lag = now - self._refill_started_at
+                self._refill_started_at = None
+                if not self._facts:
+                    self._next_refill_at = now + self.retry_interval
+
+
+def fetch_random_beer_fact() -> BeerFact:
+    return get_beer().get_random_beer_fact()
+
+
+def register_pool_metrics(pool: RandomBeerPool) -> None:
+    for name, metric_type, help, key in (
+            ('depth', 'gauge', 'Random beers waiting in the pool.', 'depth'),
+            ('in_flight', 'gauge', 'Random beer fetches in progress.', 'in_flight'),
+            ('refill_lag_seconds', 'gauge', 'Age of the current refill, or duration of the last one.',
+             'refill_lag_seconds'),
+            ('fallbacks_total', 'counter', 'Requests that found the pool empty.', 'fallbacks')):
+        REGISTRY.register_callback('twiliotutorial_beer_pool_' + name, help, metric_type,
+                                   lambda key=key: pool.metrics()[key])
+
+
+_random_beer_pool: Optional[RandomBeerPool] = None
+_random_beer_pool_lock = threading.Lock()
+
+
+def get_random_beer_pool() -> RandomBeerPool:
+    global _random_beer_pool
+    if _random_beer_pool is None:
+        with _random_beer_pool_lock:
+            if _random_beer_pool is None:
+                _random_beer_pool = RandomBeerPool(fetch=fetch_random_beer_fact,
+                                                   low_watermark=settings.BEER_POOL_LOW_WATERMARK,
+                                                   high_watermark=settings.BEER_POOL_HIGH_WATERMARK,
+                                                   refill_concurrency=settings.BEER_POOL_REFILL_CONCURRENCY)
+                register_pool_metrics(_random_beer_pool)
+                _random_beer_pool.refill()
+    return _random_beer_pool
+
+
+def reset_random_beer_pool() -> None:
+    global _random_beer_pool
+    with _random_beer_pool_lock:
+        if _random_beer_pool is not None:
+            _random_beer_pool.shutdown()
+        _random_beer_pool = None
@@ -0,0 +1,173 @@
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+from twiliotutorial.beer import Beer, BeerFact
+from twiliotutorial.json_decoding import loads
+
+# BreweryDB only honours "since" for changes in the last 30 days
+MAX_SINCE_AGE = 30 * 24 * 60 * 60
+
+
+def snapshot_meta_path(path: str) -> str:
+    return path + '.meta.json'
+
+
+def read_snapshot(path: str) -> Tuple[List[BeerFact], Optional[float]]:
+    facts = []
+    with open(path, encoding='utf-8') as snapshot_file:
+        for line in snapshot_file:
+            if line.strip():
+                record = loads(line)
+                facts.append(BeerFact.from_fields(record['id'], record['name'], record.get('abv'),
+                                                  record.get('ibu'), record.get('style_description')))
+    updated_at = None
+    if os.path.exists(snapshot_meta_path(path)):
+        with open(snapshot_meta_path(path), encoding='utf-8') as meta_file:
+            updated_at = json.load(meta_file).get('updated_at')
+    return facts, updated_at
+
+
+def write_snapshot(path: str, facts: Iterable[BeerFact], updated_at: float) -> int:
+    directory = os.path.dirname(os.path.abspath(path))
+    count = 0
+    # Write next to the old snapshot and swap it in, so readers never see half a file
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=directory, delete=False) as snapshot_file:
+        for fact in facts:
+            record = dict(zip(('id', 'name', 'abv', 'ibu', 'style_description'), fact.fields()))
+            snapshot_file.write(json.dumps(record, separators=(',', ':')) + '\n')
+            count += 1
+    # NamedTemporaryFile makes the file readable by its owner only, and the export may run as another user
+    # than the app reading it
+    os.chmod(snapshot_file.name, 0o644)
+    os.replace(snapshot_file.name, path)
+    with open(snapshot_meta_path(path), 'w', encoding='utf-8') as meta_file:
+        json.dump({'updated_at': updated_at, 'count': count}, meta_file)
+    return count
+
+
+def fetch_all_beers(since: Optional[float] = None) -> Iterator[BeerFact]:
+    beer = Beer()
+    url = beer.get_beer_with_id_url()
+    page = 1
+    while True:
+        params = {
+            'key': settings.BEER_API_KEY,
+            'p': page
+        }
+        if since is not None:
+            params['since'] = int(since)
+        result = beer.get_beer_fact_from_api(url=url, params=params)
+        if not result:
+            raise IOError("Beer API request for page %s failed" % page)
+        for data in result.get('data') or []:
+            fact = beer.convert_data_to_beer_fact(data)
+            if fact.id is not None:
+                yield fact
+        if page >= result.get('numberOfPages', 1):
+            return
+        page += 1
+
+
+# Returns (total beers, beers fetched). A refresh is incremental when there is a snapshot recent
+# enough for the API's "since" filter, otherwise every beer is fetched again.
+def refresh_snapshot(path: str, full: bool = False, clock: Callable[[], float] = time.time) -> Tuple[int, int]:
+    started_at = clock()
+    facts: Dict[str, BeerFact] = {}
+    since = None
+    if not full and os.path.exists(path):
+        existing, updated_at = read_snapshot(path)
+        if updated_at is not None and started_at - updated_at < MAX_SINCE_AGE:
+            facts = {fact.id: fact for fact in existing}
+            since = updated_at
+
+    fetched = 0
+    for fact in fetch_all_beers(since=since):
+        facts[fact.id] = fact
+        fetched += 1
+    total = write_snapshot(path, facts.values(), updated_at=started_at)
+    return total, fetched
+
+
+class BeerSnapshot:
+    """Beers loaded from a snapshot file: an id index for lookups and a list for random picks."""
+
+    def __init__(self, facts: List[BeerFact]):
+        self.facts = facts
+        self.index = {fact.id: fact for fact in facts}
+
+    @classmethod
+    def load(cls, path: str) -> 'BeerSnapshot':
+        facts, _ = read_snapshot(path)
+        return cls(facts)
+
+    def random(self) -> Optional[BeerFact]:
+        return random.choice(self.facts) if self.facts else None
+
+    def get(self, beer_id: str) -> Optional[BeerFact]:
+        return self.index.get(beer_id)
+
+
+class SnapshotBeer(Beer):
+    """Beer backed by the local snapshot. Ids missing from it still fall through to the API."""
+
+    def get_random_beer_fact(self) -> BeerFact:
+        fact = get_beer_snapshot().random()
+        if fact is None:
+            logging.debug("Beer snapshot is empty, asking the API")
+            return super().get_random_beer_fact()
+        return fact
+
+    def get_beer_by_id(self, beer_id: str) -> BeerFact:
+        fact = get_beer_snapshot().get(beer_id)
+        if fact is None:
+            logging.debug("Beer %s is not in the snapshot, asking the API", beer_id)
+            return super().get_beer_by_id(beer_id)
+        return fact
+
+    def get_beers_by_ids(self, beer_ids: Iterable[str]) -> Dict[str, BeerFact]:
+        snapshot = get_beer_snapshot()
+        facts = {beer_id: snapshot.get(beer_id) for beer_id in dict.fromkeys(beer_ids)}
+        missing = [beer_id for beer_id, fact in facts.items() if fact is None]
+        if missing:
+            facts.update(super().get_beers_by_ids(missing))
+        return facts
+
+
+_snapshot: Optional[BeerSnapshot] = None
+_snapshot_mtime: Optional[float] = None
+_snapshot_checked_at = 0.0
+_snapshot_lock = threading.Lock()
+
+
+# Loaded once, and reloaded when the file changes. The file is stat'ed at most every
+# BEER_SNAPSHOT_CHECK_INTERVAL seconds.
+def get_beer_snapshot() -> BeerSnapshot:
+    global _snapshot, _snapshot_mtime, _snapshot_checked_at
+    now = time.monotonic()
+    if _snapshot is not None and now - _snapshot_checked_at < settings.BEER_SNAPSHOT_CHECK_INTERVAL:
+        return _snapshot
+    with _snapshot_lock:
+        _snapshot_checked_at = now
+        try:
+            mtime = os.stat(settings.BEER_SNAPSHOT_PATH).st_mtime
+        except FileNotFoundError:
+            logging.warning("No beer snapshot at %s", settings.BEER_SNAPSHOT_PATH)
+            _snapshot, _snapshot_mtime = BeerSnapshot([]), None
+            return _snapshot
+        if _snapshot is None or mtime != _snapshot_mtime:
+            _snapshot, _snapshot_mtime = BeerSnapshot.load(settings.BEER_SNAPSHOT_PATH), mtime
+    return _snapshot
+
+
+def reset_beer_snapshot() -> None:
+    global _snapshot, _snapshot_mtime, _snapshot_checked_at
+    with _snapshot_lock:
+        _snapshot, _snapshot_mtime, _snapshot_checked_at = None, None, 0.0
@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from twiliotutorial.metrics import REGISTRY
+
+SHARED_KEY_PREFIX = 'callsession:'
+
+
+class CallSessionStore:
+    """Per call state keyed by Twilio CallSid, so later webhooks of a call can reuse what earlier ones
+    looked up instead of passing it through URLs or fetching it again.
+
+    Sessions are kept in a bounded LRU and expire ttl seconds after their last update. If a shared Django
+    cache is given, updates are written through and local misses read from it, so the webhooks of one
+    call can land on different workers.
+    """
+
+    def __init__(self, ttl: float, max_size: int, shared_cache=None, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.shared_cache = shared_cache
+        self.clock = clock
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, call_sid: str) -> Dict[str, Any]:
+        now = self.clock()
+        with self._lock:
+            entry = self._sessions.get(call_sid)
+            if entry is not None:
+                expires_at, session = entry
+                if expires_at > now:
+                    self._sessions.move_to_end(call_sid)
+                    return dict(session)
+                del self._sessions[call_sid]
+
+        if self.shared_cache is None:
+            return {}
+        session = self.shared_cache.get(SHARED_KEY_PREFIX + call_sid)
+        if session is None:
+            return {}
+        self._set_local(call_sid, session)
+        return dict(session)
+
+    def update(self, call_sid: str, **values) -> None:
+        session = self.get(call_sid)
+        session.update(values)
+        self._set_local(call_sid, session)
+        if self.shared_cache is not None:
+            self.shared_cache.set(SHARED_KEY_PREFIX + call_sid, session, timeout=self.ttl)
+
+    def delete(self, call_sid: str) -> None:
+        with self._lock:
+            self._sessions.pop(call_sid, None)
+        if self.shared_cache is not None:
+            self.shared_cache.delete(SHARED_KEY_PREFIX + call_sid)
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def _set_local(self, call_sid: str, session: Dict[str, Any]) -> None:
+        expires_at = self.clock() + self.ttl
+        with self._lock:
+            self._sessions[call_sid] = (expires_at, session)
+            self._sessions.move_to_end(call_sid)
+            while len(self._sessions) > self.max_size:
+                self._sessions.popitem(last=False)
+
+
+_call_sessions: Optional[CallSessionStore] = None
+_call_sessions_lock = threading.Lock()
+
+
+def get_call_sessions() -> CallSessionStore:
+    global _call_sessions
+    if _call_sessions is None:
+        with _call_sessions_lock:
+            if _call_sessions is None:
+                shared_cache = None
+                if settings.CALL_SESSION_SHARED_BACKEND:
+                    shared_cache = caches[settings.CALL_SESSION_SHARED_BACKEND]
+                _call_sessions = CallSessionStore(ttl=settings.CALL_SESSION_TTL,
+                                                  max_size=settings.CALL_SESSION_MAX_SIZE,
+                                                  shared_cache=shared_cache)
+                sessions = _call_sessions
+                REGISTRY.register_callback('twiliotutorial_call_sessions', 'Call sessions held in memory.',
+                                           'gauge', sessions.size)
+    return _call_sessions
+
+
+def reset_call_sessions() -> None:
+    global _call_sessions
+    with _call_sessions_lock:
+        _call_sessions = None
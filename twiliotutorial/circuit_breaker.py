@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from django.conf import settings
+
+from twiliotutorial.metrics import REGISTRY
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Fails calls to an upstream fast once too many of them have been failing.
+
+    Outcomes are counted in one-second buckets over the last window seconds. Once at least
+    minimum_requests were made in the window and failure_rate of them failed, the breaker opens and
+    allow() says no for open_seconds. After that a single probe call is let through (half open): if
+    it succeeds the breaker closes again, if it fails the breaker stays open for another open_seconds.
+    """
+
+    def __init__(self, name: str, failure_rate: float, minimum_requests: int, window: float, open_seconds: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.minimum_requests = minimum_requests
+        self.window = window
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self.state = CLOSED
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probe_started_at: Optional[float] = None
+        # [second, requests, failures]
+        self._buckets = deque()
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = self.clock()
+            if self.state == OPEN and now - self._opened_at >= self.open_seconds:
+                logging.info("Circuit %s is half open, letting a probe through", self.name)
+                self.state = HALF_OPEN
+            # A probe that never reported back doesn't keep the breaker half open forever
+            if self.state == HALF_OPEN and (self._probe_started_at is None
+                                            or now - self._probe_started_at >= self.open_seconds):
+                self._probe_started_at = now
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                logging.info("Circuit %s closed", self.name)
+                self._close()
+            self._record(failed=False)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._open()
+                return
+            requests, failures = self._record(failed=True)
+            if (self.state == CLOSED and requests >= self.minimum_requests
+                    and failures >= requests * self.failure_rate):
+                logging.warning("Circuit %s opened after %s of %s calls failed", self.name, failures, requests)
+                self._open()
+
+    def _record(self, failed: bool):
+        second = int(self.clock())
+        while self._buckets and self._buckets[0][0] <= second - self.window:
+            self._buckets.popleft()
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, 0, 0])
+        bucket = self._buckets[-1]
+        bucket[1] += 1
+        bucket[2] += failed
+        return sum(bucket[1] for bucket in self._buckets), sum(bucket[2] for bucket in self._buckets)
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = self.clock()
+        self._probe_started_at = None
+
+    def _close(self) -> None:
+        self.state = CLOSED
+        self._probe_started_at = None
+        self._buckets.clear()
+
+
+_beer_api_breaker: Optional[CircuitBreaker] = None
+_beer_api_breaker_lock = threading.Lock()
+
+
+def get_beer_api_breaker() -> CircuitBreaker:
+    global _beer_api_breaker
+    if _beer_api_breaker is None:
+        with _beer_api_breaker_lock:
+            if _beer_api_breaker is None:
+                _beer_api_breaker = CircuitBreaker('beer_api',
+                                                   failure_rate=settings.BEER_API_BREAKER_FAILURE_RATE,
+                                                   minimum_requests=settings.BEER_API_BREAKER_MINIMUM_REQUESTS,
+                                                   window=settings.BEER_API_BREAKER_WINDOW,
+                                                   open_seconds=settings.BEER_API_BREAKER_OPEN_SECONDS)
+                breaker = _beer_api_breaker
+                REGISTRY.register_callback('twiliotutorial_beer_api_circuit_open',
+                                           'Whether calls to the Beer API are being failed fast.', 'gauge',
+                                           lambda: breaker.state != CLOSED)
+                REGISTRY.register_callback('twiliotutorial_beer_api_circuit_rejected_total',
+                                           'Beer API calls failed fast by the circuit breaker.', 'counter',
+                                           lambda: breaker.rejected)
+    return _beer_api_breaker
+
+
+def reset_beer_api_breaker() -> None:
+    global _beer_api_breaker
+    with _beer_api_breaker_lock:
+        _beer_api_breaker = None
@@ -0,0 +1,270 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+
+from twiliotutorial.metrics import REGISTRY, upstream_latency
+from twiliotutorial.rate_limiter import InMemoryTokenBuckets
+
+# Statuses Twilio's status callback ends a call with, and those worth calling back about
+FINAL_STATUSES = frozenset(('completed', 'busy', 'no-answer', 'failed', 'canceled'))
+RETRY_STATUSES = frozenset(('busy', 'no-answer', 'failed'))
+
+
+class DialedNumber:
+    """What the dialer knows about one number: its latest call and how that call is going."""
+
+    __slots__ = ('number', 'attempts', 'status', 'call_sid', 'deadline')
+
+    def __init__(self, number: str):
+        self.number = number
+        self.attempts = 0
+        self.status = 'queued'
+        self.call_sid: Optional[str] = None
+        self.deadline: Optional[float] = None
+
+    def as_dict(self) -> Dict:
+        return {'number': self.number, 'attempts': self.attempts, 'status': self.status, 'call_sid': self.call_sid}
+
+
+class OutboundDialer:
+    """Calls a queue of numbers into the IVR, paced and capped, and calls back the ones that didn't connect.
+
+    Calls are placed at most `rate` a second and with at most max_in_flight placed but not yet
+    finished. A call finishes when its status callback reports a final status, or call_timeout
+    seconds after it was placed if that callback never comes. Busy, no-answer and failed calls, and
+    calls Twilio wouldn't place, are tried again after retry_delay, doubling each time, up to
+    max_attempts.
+    """
+
+    def __init__(self, place_call: Callable[[str], str], rate: float, max_in_flight: int, max_attempts: int,
+                 retry_delay: float, call_timeout: float = 3600.0, clock: Callable[[], float] = time.monotonic):
+        self.place_call = place_call
+        self.rate = rate
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.call_timeout = call_timeout
+        self.clock = clock
+        self.placed = 0
+        self.answered = 0
+        self.gave_up = 0
+        self._pacing = InMemoryTokenBuckets(clock=clock)
+        self._numbers: Dict[str, DialedNumber] = {}
+        self._by_call_sid: Dict[str, DialedNumber] = {}
+        # Statuses for sids we don't know yet: either place_call hasn't returned the sid, or the callback is a late
+        # one for a call that already finished. Only the newest few are kept.
+        self._early_statuses: OrderedDict = OrderedDict()
+        self._queue = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._changed = False
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._condition = threading.Condition()
+
+    def enqueue(self, number: str) -> bool:
+        """Queue a call to number. False if it is already queued or on a call."""
+        with self._condition:
+            dialed = self._numbers.get(number)
+            if dialed is not None and dialed.status not in FINAL_STATUSES and dialed.status != 'gave-up':
+                return False
+            dialed = DialedNumber(number)
+            self._numbers[number] = dialed
+            self._push(dialed, self.clock())
+        return True
+
+    def status_update(self, call_sid: str, status: str) -> bool:
+        """Record a status callback. False if the call isn't one this dialer placed."""
+        with self._condition:
+            dialed = self._by_call_sid.get(call_sid)
+            if dialed is None:
+                self._early_statuses[call_sid] = status
+                while len(self._early_statuses) > self.max_in_flight * 2:
+                    self._early_statuses.popitem(last=False)
+                return False
+            self._apply_status(dialed, status)
+            return True
+
+    def call_state(self, number: str) -> Optional[Dict]:
+        with self._condition:
+            dialed = self._numbers.get(number)
+            return dialed.as_dict() if dialed is not None else None
+
+    def dial_due(self) -> Optional[float]:
+        """Place every call that is due and allowed now.
+
+        Returns how long until the next call could be placed, or None if that waits on a call
+        finishing or a number being queued.
+        """
+        while True:
+            with self._condition:
+                dialed, wait = self._take_next()
+            if dialed is None:
+                return wait
+            self._place(dialed)
+
+    def wait_until_idle(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._queue or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(min(remaining, 0.1))
+            return True
+
+    def metrics(self) -> Dict[str, float]:
+        with self._condition:
+            return {'queued': len(self._queue), 'in_flight': self._in_flight, 'placed': self.placed,
+                    'answered': self.answered, 'gave_up': self.gave_up}
+
+    # Calls are only placed once this is called, or from dial_due
+    def start(self) -> None:
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='outbound-dialer', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping.set()
+        with self._condition:
+            self._changed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            wait = self.dial_due()
+            with self._condition:
+                if not self._changed and not self._stopping.is_set():
+                    # Wake up at least once a second to time out calls whose callbacks were lost
+                    self._condition.wait(min(wait or 1.0, 1.0))
+                self._changed = False
+
+    def _take_next(self) -> Tuple[Optional[DialedNumber], Optional[float]]:
+        now = self.clock()
+        self._time_out_lost_calls(now)
+        if not self._queue or self._in_flight >= self.max_in_flight:
+            return None, None
+        not_before = self._queue[0][0]
+        if not_before > now:
+            return None, not_before - now
+        wait = self._pacing.acquire([('calls', self.rate, 1)])
+        if wait > 0:
+            return None, wait
+        dialed = heapq.heappop(self._queue)[2]
+        dialed.attempts += 1
+        dialed.status = 'dialing'
+        dialed.deadline = now + self.call_timeout
+        self._in_flight += 1
+        return dialed, None
+
+    def _place(self, dialed: DialedNumber) -> None:
+        try:
+            call_sid = self.place_call(dialed.number)
+        except Exception as e:
+            logging.warning("Could not call %s: %s", dialed.number, e)
+            with self._condition:
+                self._finish(dialed, 'failed')
+            return
+        with self._condition:
+            self.placed += 1
+            dialed.call_sid = call_sid
+            self._by_call_sid[call_sid] = dialed
+            status = self._early_statuses.pop(call_sid, None)
+            if status is not None:
+                self._apply_status(dialed, status)
+
+    def _apply_status(self, dialed: DialedNumber, status: str) -> None:
+        if status in FINAL_STATUSES:
+            self._finish(dialed, status)
+        else:
+            dialed.status = status
+            if status == 'in-progress':
+                self.answered += 1
+
+    def _finish(self, dialed: DialedNumber, status: str) -> None:
+        self._in_flight -= 1
+        self._by_call_sid.pop(dialed.call_sid, None)
+        dialed.deadline = None
+        if status in RETRY_STATUSES and dialed.attempts < self.max_attempts:
+            dialed.status = 'retrying'
+            self._push(dialed, self.clock() + self.retry_delay * 2 ** (dialed.attempts - 1))
+        elif status in RETRY_STATUSES:
+            dialed.status = 'gave-up'
+            self.gave_up += 1
+            logging.info("Giving up on calling %s after %s attempts", dialed.number, dialed.attempts)
+        else:
+            dialed.status = status
+        self._changed = True
+        self._condition.notify_all()
+
+    def _time_out_lost_calls(self, now: float) -> None:
+        for dialed in list(self._by_call_sid.values()):
+            if dialed.deadline is not None and dialed.deadline <= now:
+                logging.warning("No final status for call %s to %s, freeing its slot", dialed.call_sid,
+                                dialed.number)
+                self._finish(dialed, 'failed')
+
+    def _push(self, dialed: DialedNumber, not_before: float) -> None:
+        heapq.heappush(self._queue, (not_before, next(self._seq), dialed))
+        self._changed = True
+        self._condition.notify_all()
+
+
+def twilio_call_placer(from_: str, webhook_base_url: str) -> Callable[[str], str]:
+    """Places a call from our number from_ that Twilio answers with the IVR at /callback and reports on to /call-status."""
+
+    def place_call(to: str) -> str:
+        from twiliotutorial.views import get_twilio_client
+        with upstream_latency.time('twilio_calls'):
+            call = get_twilio_client().calls.create(
+                to=to, from_=from_, url=webhook_base_url + '/callback', method='POST',
+                status_callback=webhook_base_url + '/call-status', status_callback_method='POST',
+                status_callback_event=['initiated', 'ringing', 'answered', 'completed'])
+        return call.sid
+    return place_call
+
+
+_outbound_dialer: Optional[OutboundDialer] = None
+_outbound_dialer_lock = threading.Lock()
+
+
+def get_outbound_dialer() -> OutboundDialer:
+    global _outbound_dialer
+    if _outbound_dialer is None:
+        with _outbound_dialer_lock:
+            if _outbound_dialer is None:
+                place_call = twilio_call_placer(settings.DIALER_FROM_NUMBER,
+                                                (settings.TWILIO_WEBHOOK_BASE_URL or '').rstrip('/'))
+                _outbound_dialer = OutboundDialer(place_call=place_call, rate=settings.DIALER_RATE,
+                                                  max_in_flight=settings.DIALER_MAX_IN_FLIGHT,
+                                                  max_attempts=settings.DIALER_MAX_ATTEMPTS,
+                                                  retry_delay=settings.DIALER_RETRY_DELAY,
+                                                  call_timeout=settings.DIALER_CALL_TIMEOUT)
+                dialer = _outbound_dialer
+                for name, metric_type, help in (
+                        ('queued', 'gauge', 'Outbound calls waiting to be placed or retried.'),
+                        ('in_flight', 'gauge', 'Outbound calls placed and not finished yet.'),
+                        ('placed', 'counter', 'Outbound calls placed.'),
+                        ('answered', 'counter', 'Outbound calls that were answered.'),
+                        ('gave_up', 'counter', 'Numbers given up on after max attempts.')):
+                    REGISTRY.register_callback('twiliotutorial_dialer_' + name, help, metric_type,
+                                               lambda name=name: dialer.metrics()[name])
+    return _outbound_dialer
+
+
+def reset_outbound_dialer() -> None:
+    global _outbound_dialer
+    with _outbound_dialer_lock:
+        if _outbound_dialer is not None:
+            _outbound_dialer.stop()
+        _outbound_dialer = None
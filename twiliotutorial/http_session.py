@@ -0,0 +1,56 @@
+import threading
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from django.conf import settings
+
+if TYPE_CHECKING:
+    import requests
+
+_session: Optional['requests.Session'] = None
+_session_lock = threading.Lock()
+
+
+def build_session(pool_size: int, max_retries: int, backoff_factor: float = 0.1) -> 'requests.Session':
+    # requests and urllib3 are a good part of a worker's import time, so they are only loaded once a
+    # worker makes its first outbound call
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    # Only connection errors are retried. A read timeout or a 5xx is returned at once, so a call made
+    # while answering a webhook can't wait out several read timeouts, and the circuit breaker hears
+    # about an upstream outage on the first failed call instead of after the retries.
+    retry = Retry(total=max_retries, connect=max_retries, read=0, status=0,
+                  backoff_factor=backoff_factor, raise_on_status=False)
+    # pool_maxsize is how many keep-alive connections we hold per host. pool_block=False means a burst
+    # bigger than the pool still goes out, the extra connections just aren't kept around afterwards.
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry, pool_block=False)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+# Process-wide session for the Beer API. The urllib3 pool behind it is thread safe, so every Beer
+# instance in every worker thread shares the same keep-alive connections.
+def get_session() -> 'requests.Session':
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session(pool_size=settings.BEER_API_POOL_SIZE,
+                                         max_retries=settings.BEER_API_MAX_RETRIES)
+    return _session
+
+
+def get_timeout() -> Tuple[float, float]:
+    return settings.BEER_API_CONNECT_TIMEOUT, settings.BEER_API_READ_TIMEOUT
+
+
+def reset_session() -> None:
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
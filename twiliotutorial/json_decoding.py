@@ -0,0 +1,42 @@
+import json
+from typing import Any, Callable, Dict, Optional, Union
+
+from django.conf import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+# Every decoder raises a ValueError subclass on bad input: json.JSONDecodeError, orjson.JSONDecodeError
+# and ujson's ValueError / JSONDecodeError
+DecodeError = ValueError
+
+DECODERS: Dict[str, Optional[Callable[[Union[bytes, str]], Any]]] = {
+    'orjson': orjson.loads if orjson is not None else None,
+    'ujson': ujson.loads if ujson is not None else None,
+    'json': json.loads,
+}
+
+
+def get_decoder(name: str) -> Callable[[Union[bytes, str]], Any]:
+    if name == 'auto':
+        return next(decoder for decoder in DECODERS.values() if decoder is not None)
+    decoder = DECODERS.get(name)
+    if decoder is None:
+        raise ValueError("JSON decoder %r is unknown or not installed" % name)
+    return decoder
+
+
+def loads(content: Union[bytes, str]) -> Any:
+    return get_decoder(settings.BEER_API_JSON_DECODER)(content)
+
+
+# For logging bodies that didn't parse, without putting a whole page in the log
+def preview(content: Union[bytes, str], length: int = 200) -> Union[bytes, str]:
+    return content if len(content) <= length else content[:length] + (b'...' if isinstance(content, bytes) else '...')
@@ -0,0 +1,57 @@
+import threading
+from collections import Counter
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+
+from twiliotutorial.dialer import get_outbound_dialer
+from twiliotutorial.sms_campaign import read_recipients
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = ("Call every number in a file into the IVR. Serves the app on --port while it runs, since the "
+            "status callbacks have to reach this process")
+
+    def add_arguments(self, parser):
+        parser.add_argument('numbers', help="File with one phone number per line, or a CSV with the number first")
+        parser.add_argument('--port', type=int, default=8001,
+                            help="Port to serve the IVR and /call-status on (TWILIO_WEBHOOK_BASE_URL must reach it)")
+        parser.add_argument('--timeout', type=float, default=None, help="Give up waiting after this many seconds")
+
+    def handle(self, *args, **options):
+        if not settings.DIALER_FROM_NUMBER or not settings.TWILIO_WEBHOOK_BASE_URL:
+            raise CommandError("DIALER_FROM_NUMBER and TWILIO_WEBHOOK_BASE_URL have to be set to place calls")
+        server = make_server('', options['port'], get_wsgi_application(), server_class=ThreadingWSGIServer,
+                             handler_class=QuietWSGIRequestHandler)
+        threading.Thread(target=server.serve_forever, name='dialer-webhooks', daemon=True).start()
+        dialer = get_outbound_dialer()
+        numbers = []
+        try:
+            for _, number in read_recipients(options['numbers']):
+                if dialer.enqueue(number):
+                    numbers.append(number)
+            self.stdout.write(f"Calling {len(numbers)} numbers, {settings.DIALER_RATE} a second and at most "
+                              f"{settings.DIALER_MAX_IN_FLIGHT} at once")
+            dialer.start()
+            idle = dialer.wait_until_idle(options['timeout'] if options['timeout'] is not None else float('inf'))
+        except KeyboardInterrupt:
+            idle = False
+        finally:
+            dialer.stop()
+            server.shutdown()
+        outcomes = Counter(dialer.call_state(number)['status'] for number in numbers)
+        self.stdout.write(', '.join(f"{count} {status}" for status, count in sorted(outcomes.items())))
+        if not idle:
+            raise CommandError("Stopped with calls still queued or in progress")
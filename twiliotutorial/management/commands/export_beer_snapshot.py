@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from twiliotutorial.beer_snapshot import refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = "Export beers from the Beer API to a local JSON lines snapshot, fetching only changes when possible"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=settings.BEER_SNAPSHOT_PATH,
+                            help="Snapshot file to write (default: BEER_SNAPSHOT_PATH)")
+        parser.add_argument('--full', action='store_true', help="Fetch every beer instead of only recent changes")
+
+    def handle(self, *args, **options):
+        try:
+            total, fetched = refresh_snapshot(options['path'], full=options['full'])
+        except IOError as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"Wrote {total} beers to {options['path']} ({fetched} fetched)")
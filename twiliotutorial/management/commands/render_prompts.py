@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from twiliotutorial.beer_snapshot import read_snapshot
+from twiliotutorial.tts_cache import get_audio_cache
+from twiliotutorial.views import STATIC_PROMPTS
+
+
+class Command(BaseCommand):
+    help = "Render /beerfact's spoken lines to audio ahead of time, so calls can Play them straight away"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--voice', default=settings.VOICE, help="Voice to render with (default: VOICE)")
+        parser.add_argument('--snapshot', nargs='?', const=settings.BEER_SNAPSHOT_PATH,
+                            help="Also render the lines of every beer in this snapshot (default: BEER_SNAPSHOT_PATH)")
+
+    def handle(self, *args, **options):
+        if not settings.TTS_BACKEND:
+            raise CommandError("TTS_BACKEND is not set, there is nothing to render with")
+        texts = list(STATIC_PROMPTS)
+        if options['snapshot']:
+            try:
+                facts, _ = read_snapshot(options['snapshot'])
+            except IOError as e:
+                raise CommandError(str(e))
+            texts.extend(line for fact in facts for line in fact.say_lines)
+        cache = get_audio_cache()
+        rendered = cache.render_all(dict.fromkeys(texts), options['voice'])
+        self.stdout.write(f"Rendered {rendered} prompts to {cache.directory} ({cache.size_bytes()} bytes)")
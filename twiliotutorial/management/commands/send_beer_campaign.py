@@ -0,0 +1,63 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from twiliotutorial.beer import BeerFact, get_beer
+from twiliotutorial.rate_limiter import get_sms_rate_limiter
+from twiliotutorial.sms_campaign import CampaignCheckpoint, CampaignError, SmsCampaign, twilio_sender
+from twiliotutorial.views import BeerTextView
+
+
+class Command(BaseCommand):
+    help = "Text the beer of the day to every number in a file, picking up where an interrupted run stopped"
+
+    def add_arguments(self, parser):
+        parser.add_argument('recipients', help="File with one phone number per line, or a CSV with the number first")
+        parser.add_argument('--from', dest='from_', required=True, help="Our Twilio number to send from")
+        parser.add_argument('--beer-id', help="Beer to text about (default: a random one)")
+        parser.add_argument('--workers', type=int, default=settings.TWILIO_POOL_SIZE,
+                            help="Sends in flight at once (default: TWILIO_POOL_SIZE)")
+        parser.add_argument('--checkpoint', help="Progress file (default: <recipients>.checkpoint.json)")
+        parser.add_argument('--restart', action='store_true', help="Ignore any saved progress and start over")
+        parser.add_argument('--no-rate-limit', action='store_true',
+                            help="Don't apply SMS_RATE_LIMIT_* (e.g. for a short code or a local fake Twilio)")
+
+    def handle(self, *args, **options):
+        checkpoint_path = options['checkpoint'] or options['recipients'] + '.checkpoint.json'
+        try:
+            checkpoint = None if options['restart'] else CampaignCheckpoint.resume(checkpoint_path,
+                                                                                   options['recipients'])
+        except CampaignError as e:
+            raise CommandError(str(e))
+        if checkpoint is None:
+            beer_fact = self.get_beer_fact(options)
+            # Every recipient gets the same beer, so the body is rendered once
+            checkpoint = CampaignCheckpoint(checkpoint_path, options['recipients'],
+                                            BeerTextView().create_text_body(beer_fact), beer_id=beer_fact.id)
+        else:
+            self.stdout.write(f"Resuming from line {checkpoint.next_line} ({checkpoint.sent} sent, "
+                              f"{checkpoint.failed} failed so far)")
+
+        send = twilio_sender(options['from_'], checkpoint.body, beer_id=checkpoint.beer_id)
+        campaign = SmsCampaign(checkpoint, send=send, workers=options['workers'], from_=options['from_'],
+                               rate_limiter=None if options['no_rate_limit'] else get_sms_rate_limiter())
+        started = time.monotonic()
+        sent = checkpoint.sent
+        try:
+            campaign.run()
+        except KeyboardInterrupt:
+            raise CommandError(f"Interrupted at line {checkpoint.next_line}, run again to resume")
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"Sent {checkpoint.sent} and failed {checkpoint.failed} in {elapsed:.1f}s "
+                          f"({(checkpoint.sent - sent) / elapsed * 60:.0f} a minute)")
+
+    def get_beer_fact(self, options) -> BeerFact:
+        beer = get_beer()
+        if options['beer_id']:
+            beer_fact = beer.get_beer_by_id(beer_id=options['beer_id'])
+        else:
+            beer_fact = beer.get_random_beer_fact()
+        if beer_fact.id is None:
+            raise CommandError("Could not find a beer to text about")
+        return beer_fact
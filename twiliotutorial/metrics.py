@@ -0,0 +1,141 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# How many per-thread shards to allow before folding the ones of finished threads
+MAX_SHARDS = 256
+
+
+class Histogram:
+    """Latency histogram with one label, in the Prometheus sense.
+
+    Every thread observes into its own shard, so observe() never takes a lock; the shards are
+    only added up when the histogram is collected. Shards of threads that have finished are
+    folded into a retired total so servers that start a thread per request don't leak them.
+    """
+
+    def __init__(self, name: str, help: str, label: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, Dict[str, List[float]]]] = []
+        self._retired: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, seconds: float) -> None:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._new_shard()
+        counts = shard.get(label_value)
+        if counts is None:
+            # One count per bucket, one for +Inf, then the sum
+            counts = shard[label_value] = [0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, seconds)] += 1
+        counts[-1] += seconds
+
+    @contextmanager
+    def time(self, label_value: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(label_value, time.perf_counter() - started)
+
+    def collect(self) -> Dict[str, List[float]]:
+        with self._lock:
+            self._fold_finished_shards()
+            totals = {label_value: list(counts) for label_value, counts in self._retired.items()}
+            for _, shard in self._shards:
+                for label_value, counts in list(shard.items()):
+                    self._add(totals, label_value, counts)
+        return totals
+
+    # extra_labels is added to every series, e.g. 'worker="123"'
+    def exposition(self, extra_labels: str = '') -> List[str]:
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s histogram' % self.name]
+        for label_value, counts in sorted(self.collect().items()):
+            label = '%s="%s"' % (self.label, label_value)
+            if extra_labels:
+                label += ',' + extra_labels
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('%s_bucket{%s,le="%s"} %d' % (self.name, label, le, cumulative))
+            lines.append('%s_sum{%s} %r' % (self.name, label, counts[-1]))
+            lines.append('%s_count{%s} %d' % (self.name, label, cumulative))
+        return lines
+
+    def _new_shard(self) -> Dict[str, List[float]]:
+        shard = {}
+        self._local.shard = shard
+        with self._lock:
+            if len(self._shards) >= MAX_SHARDS:
+                self._fold_finished_shards()
+            self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _fold_finished_shards(self) -> None:
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                for label_value, counts in shard.items():
+                    self._add(self._retired, label_value, counts)
+        self._shards = alive
+
+    @staticmethod
+    def _add(totals: Dict[str, List[float]], label_value: str, counts: List[float]) -> None:
+        total = totals.get(label_value)
+        if total is None:
+            totals[label_value] = list(counts)
+        else:
+            for index, count in enumerate(counts):
+                total[index] += count
+
+
+class Registry:
+    """Histograms plus callback metrics (gauges and counters read from elsewhere at scrape time)."""
+
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+        self.callbacks: Dict[str, Tuple[str, str, Callable[[], float]]] = {}
+
+    def histogram(self, name: str, help: str, label: str) -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(name, help, label)
+        return histogram
+
+    def register_callback(self, name: str, help: str, metric_type: str, callback: Callable[[], float]) -> None:
+        self.callbacks[name] = (help, metric_type, callback)
+
+    def exposition(self, extra_labels: str = '') -> str:
+        lines = []
+        for histogram in self.histograms.values():
+            lines.extend(histogram.exposition(extra_labels))
+        for name, (help, metric_type, callback) in sorted(self.callbacks.items()):
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s %s' % (name, metric_type))
+            if extra_labels:
+                lines.append('%s{%s} %r' % (name, extra_labels, float(callback())))
+            else:
+                lines.append('%s %r' % (name, float(callback())))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+webhook_latency = REGISTRY.histogram('twiliotutorial_webhook_request_seconds',
+                                     'Time to answer a webhook, by url name.', 'endpoint')
+upstream_latency = REGISTRY.histogram('twiliotutorial_upstream_request_seconds',
+                                      'Time spent in calls to the Beer API and Twilio.', 'upstream')
+twiml_latency = REGISTRY.histogram('twiliotutorial_twiml_serialize_seconds',
+                                   'Time spent serializing TwiML with to_xml.', 'view')
@@ -0,0 +1,61 @@
+import time
+
+from django.conf import settings
+from django.http import HttpResponseForbidden
+
+from twiliotutorial.metrics import webhook_latency
+from twiliotutorial.structured_logging import call_sid_var
+from twiliotutorial.twilio_signature import SIGNATURE_HEADER, get_signature_validator, webhook_url
+
+
+class TimingMiddleware:
+    """Records how long every request takes, labelled with the url name it resolved to."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        resolver_match = getattr(request, 'resolver_match', None)
+        endpoint = resolver_match.url_name if resolver_match is not None else 'unmatched'
+        webhook_latency.observe(endpoint, time.perf_counter() - started)
+        return response
+
+
+class TwilioSignatureMiddleware:
+    """Answers 403 to requests without a valid X-Twilio-Signature, before any view runs.
+
+    Requests without the header at all are refused without reading their body.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Django builds the middleware when the app loads, so a missing token stops the server starting
+        if settings.TWILIO_VALIDATE_SIGNATURES:
+            get_signature_validator()
+
+    def __call__(self, request):
+        if settings.TWILIO_VALIDATE_SIGNATURES and not request.path.startswith(tuple(settings.TWILIO_SIGNATURE_EXEMPT_PATHS)):
+            validator = get_signature_validator()
+            signature = request.META.get(SIGNATURE_HEADER)
+            if not signature or not validator.is_valid(webhook_url(request.build_absolute_uri()),
+                                                       request.POST.lists(), signature):
+                validator.reject()
+                return HttpResponseForbidden()
+        return self.get_response(request)
+
+
+class CallSidMiddleware:
+    """Tags every log record of a webhook with its CallSid. Runs after the signature check, so
+    unsigned requests don't get their bodies parsed here."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = call_sid_var.set(request.POST.get('CallSid') or request.GET.get('CallSid'))
+        try:
+            return self.get_response(request)
+        finally:
+            call_sid_var.reset(token)
@@ -0,0 +1,67 @@
+import threading
+from collections import deque
+from typing import Awaitable, Callable, List, Optional
+
+from django.conf import settings
+
+from twiliotutorial.beer_fact import BeerFact
+from twiliotutorial.singleflight import AsyncSingleFlight, SingleFlight
+
+
+class RandomBeerBatch:
+    """Random beers fetched batch_size at a time, handed out one per caller.
+
+    When the batch runs out, the next caller fetches another with fetch_batch(batch_size) and anyone
+    else who runs out meanwhile waits for that fetch instead of starting their own. get() returns
+    None once a fetch comes back empty.
+    """
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self._facts = deque()
+        self._flight = SingleFlight()
+        self._async_flight = AsyncSingleFlight()
+
+    def get(self, fetch_batch: Callable[[int], List[BeerFact]]) -> Optional[BeerFact]:
+        while True:
+            try:
+                return self._facts.popleft()
+            except IndexError:
+                pass
+            if not self._flight.do('batch', lambda: self._add(fetch_batch(self.batch_size))):
+                return None
+
+    async def get_async(self, fetch_batch: Callable[[int], Awaitable[List[BeerFact]]]) -> Optional[BeerFact]:
+        while True:
+            try:
+                return self._facts.popleft()
+            except IndexError:
+                pass
+            if not await self._async_flight.do('batch', lambda: self._add_async(fetch_batch(self.batch_size))):
+                return None
+
+    def _add(self, facts: List[BeerFact]) -> int:
+        self._facts.extend(facts)
+        return len(facts)
+
+    async def _add_async(self, facts: Awaitable[List[BeerFact]]) -> int:
+        return self._add(await facts)
+
+
+_random_beer_batch: Optional[RandomBeerBatch] = None
+_random_beer_batch_lock = threading.Lock()
+
+
+def get_random_beer_batch() -> RandomBeerBatch:
+    global _random_beer_batch
+    if _random_beer_batch is None:
+        with _random_beer_batch_lock:
+            if _random_beer_batch is None:
+                _random_beer_batch = RandomBeerBatch(batch_size=settings.BEER_RANDOM_BATCH_SIZE)
+    return _random_beer_batch
+
+
+def reset_random_beer_batch() -> None:
+    global _random_beer_batch
+    with _random_beer_batch_lock:
+        _random_beer_batch = None
@@ -0,0 +1,153 @@
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from django.conf import settings
+
+from twiliotutorial.metrics import REGISTRY
+
+# (key, tokens added per second, most tokens the bucket holds)
+Bucket = Tuple[str, float, float]
+
+
+def refill(tokens: float, updated: float, now: float, rate: float, burst: float) -> float:
+    return min(burst, tokens + max(0.0, now - updated) * rate)
+
+
+def wait_for_token(tokens: float, rate: float) -> float:
+    return (1 - tokens) / rate
+
+
+class InMemoryTokenBuckets:
+    """Token buckets for one process."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, buckets: List[Bucket]) -> float:
+        """Take a token from every bucket, or from none of them if any is empty. Returns 0 when the tokens
+        were taken, otherwise how many seconds until they all have one."""
+        with self._lock:
+            now = self.clock()
+            levels = []
+            wait = 0.0
+            for key, rate, burst in buckets:
+                tokens, updated = self._buckets.get(key, (burst, now))
+                tokens = refill(tokens, updated, now, rate, burst)
+                levels.append((key, tokens))
+                if tokens < 1:
+                    wait = max(wait, wait_for_token(tokens, rate))
+            for key, tokens in levels:
+                self._buckets[key] = (tokens - 1 if wait == 0 else tokens, now)
+            return wait
+
+
+class SqliteTokenBuckets:
+    """Token buckets kept in a sqlite file, so every worker process on the host shares the same limits.
+
+    The clock is wall time because it is compared across processes.
+    """
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS token_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+            "updated REAL NOT NULL)")
+
+    def acquire(self, buckets: List[Bucket]) -> float:
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                now = self.clock()
+                levels = []
+                wait = 0.0
+                for key, rate, burst in buckets:
+                    row = self._connection.execute(
+                        "SELECT tokens, updated FROM token_buckets WHERE key = ?", (key,)).fetchone()
+                    tokens = refill(*row, now, rate, burst) if row is not None else burst
+                    levels.append((key, tokens))
+                    if tokens < 1:
+                        wait = max(wait, wait_for_token(tokens, rate))
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO token_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                    [(key, tokens - 1 if wait == 0 else tokens, now) for key, tokens in levels])
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            return wait
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class SmsRateLimiter:
+    """Limits outbound SMS per sending number and across the whole account.
+
+    A rate of 0 turns that limit off. reserve never sleeps: the caller gets back how long to put the
+    send off for, and nothing is taken from either bucket unless both had a token.
+    """
+
+    def __init__(self, buckets, per_number_rate: float, per_number_burst: float, global_rate: float,
+                 global_burst: float):
+        self.buckets = buckets
+        self.per_number_rate = per_number_rate
+        self.per_number_burst = per_number_burst
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.deferred = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, sending_number: Optional[str]) -> float:
+        buckets = []
+        if self.global_rate > 0:
+            buckets.append(('global', self.global_rate, self.global_burst))
+        if self.per_number_rate > 0 and sending_number is not None:
+            buckets.append(('number:' + sending_number, self.per_number_rate, self.per_number_burst))
+        if not buckets:
+            return 0.0
+        wait = self.buckets.acquire(buckets)
+        if wait > 0:
+            with self._lock:
+                self.deferred += 1
+        return wait
+
+
+def build_token_buckets():
+    if settings.SMS_RATE_LIMIT_BACKEND == 'sqlite':
+        return SqliteTokenBuckets(path=settings.SMS_RATE_LIMIT_PATH)
+    return InMemoryTokenBuckets()
+
+
+_sms_rate_limiter: Optional[SmsRateLimiter] = None
+_sms_rate_limiter_lock = threading.Lock()
+
+
+def get_sms_rate_limiter() -> SmsRateLimiter:
+    global _sms_rate_limiter
+    if _sms_rate_limiter is None:
+        with _sms_rate_limiter_lock:
+            if _sms_rate_limiter is None:
+                _sms_rate_limiter = SmsRateLimiter(buckets=build_token_buckets(),
+                                                   per_number_rate=settings.SMS_RATE_LIMIT_PER_NUMBER,
+                                                   per_number_burst=settings.SMS_RATE_LIMIT_PER_NUMBER_BURST,
+                                                   global_rate=settings.SMS_RATE_LIMIT_GLOBAL,
+                                                   global_burst=settings.SMS_RATE_LIMIT_GLOBAL_BURST)
+                limiter = _sms_rate_limiter
+                REGISTRY.register_callback('twiliotutorial_sms_rate_limited_total',
+                                           'SMS sends put off because a rate limit had no tokens left.',
+                                           'counter', lambda: limiter.deferred)
+    return _sms_rate_limiter
+
+
+def reset_sms_rate_limiter() -> None:
+    global _sms_rate_limiter
+    with _sms_rate_limiter_lock:
+        _sms_rate_limiter = None
@@ -16,24 +16,56 @@ import os
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
+# 'dev' for runserver on a laptop, 'prod' behind gunicorn (see gunicorn.conf.py and the Dockerfile)
+PROFILE = os.environ.get('DJANGO_PROFILE', 'dev')
+if PROFILE not in ('dev', 'prod'):
+    raise ValueError("DJANGO_PROFILE must be 'dev' or 'prod', not %r" % PROFILE)
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'pretty-shitty-secret'
+SECRET_KEY = os.environ.get('SECRET_KEY', 'pretty-shitty-secret')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
-
-ALLOWED_HOSTS = ['*']
+DEBUG = os.environ.get('DEBUG', str(PROFILE == 'dev')).lower() == 'true'
+
+ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', '*').split(',')
+
+# DEBUG level logs every Beer API response, which costs noticeably per request in production
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'DEBUG' if PROFILE == 'dev' else 'INFO')
+# Records are queued and written to stderr by a background thread, so requests don't wait on the log.
+# 'json' writes one object per line with the call's CallSid, 'text' the usual LEVEL:logger:message.
+# LOG_DEBUG_SAMPLE_RATE keeps that fraction of DEBUG records, picked per call.
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text' if PROFILE == 'dev' else 'json')
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 1.0))
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+LOGGING_CONFIG = 'twiliotutorial.structured_logging.configure_logging'
+LOGGING = {
+    'level': LOG_LEVEL,
+    'format': LOG_FORMAT,
+    'debug_sample_rate': LOG_DEBUG_SAMPLE_RATE,
+    'queue_size': LOG_QUEUE_SIZE,
+}
+
+# Import and load everything lazy before the first request instead of during it (see warmup.py)
+WARM_UP = os.environ.get('WARM_UP', str(PROFILE == 'prod')).lower() == 'true'
+
+# Label /metrics series with the worker process that answered the scrape. Each gunicorn worker keeps its
+# own counters, so without the label a scrape reaching another worker looks like a reset.
+METRICS_WORKER_LABEL = os.environ.get('METRICS_WORKER_LABEL', str(PROFILE == 'prod')).lower() == 'true'
 
 
 # Application definition
 
 INSTALLED_APPS = [
+    'twiliotutorial',
 ]
 
 MIDDLEWARE = [
+    'twiliotutorial.middleware.TimingMiddleware',
+    'twiliotutorial.middleware.TwilioSignatureMiddleware',
+    'twiliotutorial.middleware.CallSidMiddleware',
 ]
 
 ROOT_URLCONF = 'twiliotutorial.urls'
@@ -45,6 +77,24 @@ WSGI_APPLICATION = 'twiliotutorial.wsgi.application'
 
 DATABASES = {}
 
+# Caches
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+# Setting SHARED_CACHE_DIR adds a file-based cache that every worker process on the host can read. The prod
+# profile runs several worker processes, so it has one by default.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+SHARED_CACHE_DIR = os.environ.get('SHARED_CACHE_DIR', os.path.join(BASE_DIR, 'cache') if PROFILE == 'prod' else '')
+if SHARED_CACHE_DIR:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': SHARED_CACHE_DIR,
+    }
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/2.2/topics/i18n/
@@ -67,10 +117,120 @@ STATIC_URL = '/static/'
 
 APPEND_SLASH = False
 
+# TwiML templates, compiled once on first use
+TWIML_TEMPLATE_DIR = os.path.join(BASE_DIR, 'twiml')
+
 TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID')
 TWILIO_ACCOUNT_TOKEN = os.environ.get('TWILIO_ACCOUNT_TOKEN')
+TWILIO_POOL_SIZE = int(os.environ.get('TWILIO_POOL_SIZE', 10))
+TWILIO_CONNECT_TIMEOUT = float(os.environ.get('TWILIO_CONNECT_TIMEOUT', 3.05))
+TWILIO_READ_TIMEOUT = float(os.environ.get('TWILIO_READ_TIMEOUT', 10))
+TWILIO_MAX_RETRIES = int(os.environ.get('TWILIO_MAX_RETRIES', 1))
+# Only for pointing the client at a local fake Twilio, e.g. http://127.0.0.1:8001
+TWILIO_API_BASE_URL = os.environ.get('TWILIO_API_BASE_URL')
+# Refuse webhooks whose X-Twilio-Signature doesn't match TWILIO_ACCOUNT_TOKEN. Set TWILIO_WEBHOOK_BASE_URL
+# to the public scheme and host Twilio calls, e.g. https://beer.example.com, when behind a proxy.
+TWILIO_VALIDATE_SIGNATURES = os.environ.get('TWILIO_VALIDATE_SIGNATURES', str(PROFILE == 'prod')).lower() == 'true'
+TWILIO_WEBHOOK_BASE_URL = os.environ.get('TWILIO_WEBHOOK_BASE_URL')
+# Path prefixes Twilio doesn't sign requests for. /sms-delivery checks SMS_DELIVERY_REPORT_TOKEN instead.
+TWILIO_SIGNATURE_EXEMPT_PATHS = ['/metrics', '/sms-delivery', '/audio/']
 
 BEER_API_URL = os.environ.get('BEER_API_URL')
 BEER_API_KEY = os.environ.get('BEER_API_KEY')
+BEER_API_POOL_SIZE = int(os.environ.get('BEER_API_POOL_SIZE', 10))
+BEER_API_CONNECT_TIMEOUT = float(os.environ.get('BEER_API_CONNECT_TIMEOUT', 3.05))
+BEER_API_READ_TIMEOUT = float(os.environ.get('BEER_API_READ_TIMEOUT', 5))
+# Connection errors only. At worst a call takes (MAX_RETRIES + 1) * CONNECT_TIMEOUT + READ_TIMEOUT, which
+# has to stay under the 15s Twilio waits for a webhook
+BEER_API_MAX_RETRIES = int(os.environ.get('BEER_API_MAX_RETRIES', 1))
+# Stop calling the Beer API for BEER_API_BREAKER_OPEN_SECONDS once BEER_API_BREAKER_FAILURE_RATE of the
+# calls in the last BEER_API_BREAKER_WINDOW seconds failed (and there were at least MINIMUM_REQUESTS)
+BEER_API_BREAKER_FAILURE_RATE = float(os.environ.get('BEER_API_BREAKER_FAILURE_RATE', 0.5))
+BEER_API_BREAKER_MINIMUM_REQUESTS = int(os.environ.get('BEER_API_BREAKER_MINIMUM_REQUESTS', 10))
+BEER_API_BREAKER_WINDOW = float(os.environ.get('BEER_API_BREAKER_WINDOW', 10))
+BEER_API_BREAKER_OPEN_SECONDS = float(os.environ.get('BEER_API_BREAKER_OPEN_SECONDS', 15))
+# 'auto' picks orjson, then ujson, when installed, and falls back to the standard library's json
+BEER_API_JSON_DECODER = os.environ.get('BEER_API_JSON_DECODER', 'auto')
+# Above 1, random beers are fetched this many at a time with /v2/beers?order=random (BreweryDB's
+# randomCount goes up to 10) and handed out one per request
+BEER_RANDOM_BATCH_SIZE = int(os.environ.get('BEER_RANDOM_BATCH_SIZE', 1))
+# BreweryDB accepts at most 10 comma separated ids per /beers request
+BEER_API_MAX_IDS_PER_REQUEST = int(os.environ.get('BEER_API_MAX_IDS_PER_REQUEST', 10))
+
+BEER_CACHE_MAX_SIZE = int(os.environ.get('BEER_CACHE_MAX_SIZE', 1024))
+BEER_CACHE_TTL = float(os.environ.get('BEER_CACHE_TTL', 3600))
+BEER_CACHE_NEGATIVE_TTL = float(os.environ.get('BEER_CACHE_NEGATIVE_TTL', 60))
+# Alias in CACHES to share cached beers between workers, e.g. 'shared'
+BEER_CACHE_SHARED_BACKEND = os.environ.get('BEER_CACHE_SHARED_BACKEND')
+
+# 'api' asks BreweryDB for every lookup, 'snapshot' serves beers from the file written by
+# manage.py export_beer_snapshot and only asks the API for ids it doesn't have
+BEER_BACKEND = os.environ.get('BEER_BACKEND', 'api')
+BEER_SNAPSHOT_PATH = os.environ.get('BEER_SNAPSHOT_PATH', os.path.join(BASE_DIR, 'beers.jsonl'))
+BEER_SNAPSHOT_CHECK_INTERVAL = float(os.environ.get('BEER_SNAPSHOT_CHECK_INTERVAL', 30))
+
+# State kept per CallSid between the webhooks of one call. Set CALL_SESSION_SHARED_BACKEND to an alias
+# in CACHES when a call's webhooks can reach different worker processes, as they do in the prod profile
+CALL_SESSION_TTL = float(os.environ.get('CALL_SESSION_TTL', 900))
+CALL_SESSION_MAX_SIZE = int(os.environ.get('CALL_SESSION_MAX_SIZE', 10000))
+CALL_SESSION_SHARED_BACKEND = os.environ.get('CALL_SESSION_SHARED_BACKEND', 'shared' if PROFILE == 'prod' else '')
+
+# Serve /beerfact from a pool of random beers that is refilled in the background
+BEER_POOL_ENABLED = os.environ.get('BEER_POOL_ENABLED', 'false').lower() == 'true'
+BEER_POOL_LOW_WATERMARK = int(os.environ.get('BEER_POOL_LOW_WATERMARK', 5))
+BEER_POOL_HIGH_WATERMARK = int(os.environ.get('BEER_POOL_HIGH_WATERMARK', 20))
+BEER_POOL_REFILL_CONCURRENCY = int(os.environ.get('BEER_POOL_REFILL_CONCURRENCY', 2))
+
+# 'memory' or 'sqlite' to send /beertext SMS from a background queue, empty to send inline. gunicorn recycles
+# prod workers (max_requests), so the prod profile keeps the queue in sqlite where a new worker picks it up.
+SMS_QUEUE_BACKEND = os.environ.get('SMS_QUEUE_BACKEND', 'sqlite' if PROFILE == 'prod' else 'memory')
+SMS_QUEUE_PATH = os.environ.get('SMS_QUEUE_PATH', os.path.join(BASE_DIR, 'sms_queue.sqlite3'))
+SMS_QUEUE_CAPACITY = int(os.environ.get('SMS_QUEUE_CAPACITY', 1000))
+SMS_QUEUE_WORKERS = int(os.environ.get('SMS_QUEUE_WORKERS', 4))
+SMS_QUEUE_MAX_ATTEMPTS = int(os.environ.get('SMS_QUEUE_MAX_ATTEMPTS', 5))
+SMS_QUEUE_BACKOFF = float(os.environ.get('SMS_QUEUE_BACKOFF', 1.0))
+# With 'sqlite', a job in flight this long (or whose worker process died) is taken back and sent again
+SMS_QUEUE_LEASE_SECONDS = float(os.environ.get('SMS_QUEUE_LEASE_SECONDS', 120))
+
+# Delivery status callbacks for texts (/sms-status) are buffered and written to SMS_STATUS_PATH in batches,
+# once SMS_STATUS_BATCH_SIZE are waiting or every SMS_STATUS_FLUSH_INTERVAL seconds. Texts only ask for
+# callbacks when TWILIO_WEBHOOK_BASE_URL is set.
+SMS_STATUS_PATH = os.environ.get('SMS_STATUS_PATH', os.path.join(BASE_DIR, 'sms_status.sqlite3'))
+SMS_STATUS_BATCH_SIZE = int(os.environ.get('SMS_STATUS_BATCH_SIZE', 500))
+SMS_STATUS_FLUSH_INTERVAL = float(os.environ.get('SMS_STATUS_FLUSH_INTERVAL', 1.0))
+SMS_STATUS_MAX_BUFFERED = int(os.environ.get('SMS_STATUS_MAX_BUFFERED', 100000))
+# /sms-delivery reports delivery rates per beer to requests with "Authorization: Bearer <token>", and is
+# off (404) when no token is set
+SMS_DELIVERY_REPORT_TOKEN = os.environ.get('SMS_DELIVERY_REPORT_TOKEN')
+
+# Token buckets for outbound SMS, in messages per second (0 for no limit). A US long code number sends
+# 1 a second. SMS_RATE_LIMIT_BACKEND 'sqlite' shares the buckets between worker processes, which the prod
+# profile needs: with 'memory' each of its workers would send 1 a second from the same number.
+SMS_RATE_LIMIT_PER_NUMBER = float(os.environ.get('SMS_RATE_LIMIT_PER_NUMBER', 1))
+SMS_RATE_LIMIT_PER_NUMBER_BURST = float(os.environ.get('SMS_RATE_LIMIT_PER_NUMBER_BURST', 1))
+SMS_RATE_LIMIT_GLOBAL = float(os.environ.get('SMS_RATE_LIMIT_GLOBAL', 0))
+SMS_RATE_LIMIT_GLOBAL_BURST = float(os.environ.get('SMS_RATE_LIMIT_GLOBAL_BURST', 10))
+SMS_RATE_LIMIT_BACKEND = os.environ.get('SMS_RATE_LIMIT_BACKEND', 'sqlite' if PROFILE == 'prod' else 'memory')
+SMS_RATE_LIMIT_PATH = os.environ.get('SMS_RATE_LIMIT_PATH', os.path.join(BASE_DIR, 'sms_rate_limit.sqlite3'))
+
+# Outbound calls into the IVR (manage.py dial_numbers). Twilio fetches /callback and posts /call-status on
+# TWILIO_WEBHOOK_BASE_URL. Busy and unanswered numbers are called again after DIALER_RETRY_DELAY seconds,
+# doubling each time.
+DIALER_FROM_NUMBER = os.environ.get('DIALER_FROM_NUMBER')
+DIALER_RATE = float(os.environ.get('DIALER_RATE', 1))
+DIALER_MAX_IN_FLIGHT = int(os.environ.get('DIALER_MAX_IN_FLIGHT', 10))
+DIALER_MAX_ATTEMPTS = int(os.environ.get('DIALER_MAX_ATTEMPTS', 3))
+DIALER_RETRY_DELAY = float(os.environ.get('DIALER_RETRY_DELAY', 300))
+DIALER_CALL_TIMEOUT = float(os.environ.get('DIALER_CALL_TIMEOUT', 3600))
+
+# Render /beerfact's spoken lines to audio once and <Play> them instead of <Say>. 'stub' writes silence,
+# 'command' runs TTS_COMMAND, e.g. 'espeak -v en -w {output} {text}'. Empty to always use <Say>.
+# TTS_AUDIO_URL can point at a CDN in front of TTS_CACHE_DIR instead of the /audio/ view.
+TTS_BACKEND = os.environ.get('TTS_BACKEND', '')
+TTS_COMMAND = os.environ.get('TTS_COMMAND', 'espeak -w {output} {text}')
+TTS_EXTENSION = os.environ.get('TTS_EXTENSION', '.wav')
+TTS_CACHE_DIR = os.environ.get('TTS_CACHE_DIR', os.path.join(BASE_DIR, 'tts_cache'))
+TTS_CACHE_MAX_BYTES = int(os.environ.get('TTS_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+TTS_AUDIO_URL = os.environ.get('TTS_AUDIO_URL', '/audio/')
 
 VOICE = os.environ.get('VOICE', "alice")
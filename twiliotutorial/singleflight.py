@@ -0,0 +1,71 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Runs fn once per key at a time. Threads asking for a key that is already being fetched
+    wait for that call and get its result, or its exception, instead of making their own.
+    """
+
+    def __init__(self):
+        self.shared = 0
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines. The call runs as its own task, so a caller that is cancelled
+    doesn't cancel it for the others waiting on the same key.
+    """
+
+    def __init__(self):
+        self.shared = 0
+        self._tasks: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_event_loop()
+        # Tasks belong to a loop, so the same key on another loop is a different call
+        task_key = (id(loop), key)
+        task = self._tasks.get(task_key)
+        if task is None:
+            task = self._tasks[task_key] = loop.create_task(fn())
+            task.add_done_callback(lambda _: self._tasks.pop(task_key, None))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
@@ -0,0 +1,212 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterator, Optional, Tuple
+
+from twiliotutorial.metrics import upstream_latency
+from twiliotutorial.sms_status import sms_status_callback_url
+
+
+class CampaignError(Exception):
+    pass
+
+
+def read_recipients(path: str, start_line: int = 0) -> Iterator[Tuple[int, str]]:
+    """(line number, phone number) for every recipient from start_line on, read a line at a time.
+
+    A line is a number, or a CSV row with the number first. Blank lines and lines starting with #
+    are skipped but still counted, so line numbers stay stable across runs.
+    """
+    with open(path, encoding='utf-8') as recipients_file:
+        for line_number, line in enumerate(recipients_file):
+            if line_number < start_line:
+                continue
+            number = line.split(',', 1)[0].strip()
+            if number and not number.startswith('#'):
+                yield line_number, number
+
+
+class CampaignCheckpoint:
+    """How far a campaign has got through its recipient list, saved so an interrupted run can pick up there.
+
+    Sends finish out of order, so what is saved is next_line: every recipient before it has been
+    sent or given up on. Recipients after it that were already sent when the run stopped are sent
+    again on resume, the same at-least-once trade the SMS queue makes. The body and beer are saved
+    too, so a resumed campaign sends the same text as the rest of it did.
+    """
+
+    def __init__(self, path: str, recipients_path: str, body: str, beer_id: Optional[str] = None,
+                 interval: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        self.path = path
+        self.recipients_path = os.path.abspath(recipients_path)
+        self.body = body
+        self.beer_id = beer_id
+        self.interval = interval
+        self.clock = clock
+        self.next_line = 0
+        self.sent = 0
+        self.failed = 0
+        # Lines at or after next_line that are already done. At most as many as there are sends in flight.
+        self._done = set()
+        self._saved_at = clock()
+
+    @classmethod
+    def resume(cls, path: str, recipients_path: str, interval: float = 1.0) -> Optional['CampaignCheckpoint']:
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as checkpoint_file:
+            state = json.load(checkpoint_file)
+        if state['recipients'] != os.path.abspath(recipients_path):
+            raise CampaignError("%s is a checkpoint for %s, not %s" % (path, state['recipients'], recipients_path))
+        checkpoint = cls(path, recipients_path, state['body'], beer_id=state.get('beer_id'), interval=interval)
+        checkpoint.next_line = state['next_line']
+        checkpoint.sent = state['sent']
+        checkpoint.failed = state['failed']
+        return checkpoint
+
+    def done(self, line_number: int, sent: bool) -> None:
+        if sent:
+            self.sent += 1
+        else:
+            self.failed += 1
+        self.skip(line_number)
+
+    # Also used for blank and comment lines, which are never sent but mustn't hold next_line back
+    def skip(self, line_number: int) -> None:
+        self._done.add(line_number)
+        while self.next_line in self._done:
+            self._done.remove(self.next_line)
+            self.next_line += 1
+
+    def save_if_due(self) -> None:
+        if self.clock() - self._saved_at >= self.interval:
+            self.save()
+
+    def save(self) -> None:
+        state = {'recipients': self.recipients_path, 'body': self.body, 'beer_id': self.beer_id,
+                 'next_line': self.next_line, 'sent': self.sent, 'failed': self.failed}
+        partial = self.path + '.partial'
+        with open(partial, 'w', encoding='utf-8') as checkpoint_file:
+            json.dump(state, checkpoint_file)
+        os.replace(partial, self.path)
+        self._saved_at = self.clock()
+
+
+def is_retryable(error: Exception) -> bool:
+    from requests import RequestException
+    from twilio.base.exceptions import TwilioRestException
+    if isinstance(error, TwilioRestException):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, RequestException)
+
+
+class SmsCampaign:
+    """Sends one text to every recipient in a file from a pool of worker threads.
+
+    Recipients are read as workers free up, with at most twice as many queued as there are workers,
+    so memory stays the same however long the list is. A send that fails with a 429, a 5xx or a
+    connection error is retried with exponential backoff up to max_attempts; any other failure (e.g.
+    an invalid number) is logged and counted. With a rate_limiter, sends wait for the sending number's
+    tokens, which is fine here since nothing is waiting on a campaign but its operator.
+    """
+
+    def __init__(self, checkpoint: CampaignCheckpoint, send: Callable[[str], None], workers: int,
+                 max_attempts: int = 3, backoff: float = 1.0, rate_limiter=None, from_: Optional[str] = None):
+        self.checkpoint = checkpoint
+        self.send = send
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.rate_limiter = rate_limiter
+        self.from_ = from_
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def run(self) -> CampaignCheckpoint:
+        checkpoint = self.checkpoint
+        slots = threading.BoundedSemaphore(self.workers * 2)
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='sms-campaign')
+
+        def finished(line_number: int, future: Future) -> None:
+            slots.release()
+            # Sends cancelled or cut short by stop are left before next_line, so they are sent on resume
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                logging.error("Campaign send to line %s crashed", line_number, exc_info=future.exception())
+                sent = False
+            else:
+                sent = future.result()
+                if sent is None:
+                    return
+            with self._lock:
+                checkpoint.done(line_number, sent)
+                checkpoint.save_if_due()
+
+        try:
+            previous = checkpoint.next_line - 1
+            for line_number, number in read_recipients(checkpoint.recipients_path, checkpoint.next_line):
+                if self._stopping.is_set():
+                    break
+                with self._lock:
+                    for skipped in range(previous + 1, line_number):
+                        checkpoint.skip(skipped)
+                previous = line_number
+                slots.acquire()
+                future = executor.submit(self._send_one, number)
+                future.add_done_callback(lambda future, line_number=line_number: finished(line_number, future))
+        except KeyboardInterrupt:
+            self.stop()
+            raise
+        finally:
+            stopping = self._stopping.is_set()
+            executor.shutdown(wait=True, cancel_futures=stopping)
+            with self._lock:
+                checkpoint.save()
+        return checkpoint
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    # True once sent, False once given up on, None if stop came first
+    def _send_one(self, number: str) -> Optional[bool]:
+        for attempt in range(self.max_attempts):
+            if not self._wait_for_rate_limit():
+                return None
+            try:
+                self.send(number)
+                return True
+            except Exception as e:
+                if not is_retryable(e) or attempt + 1 == self.max_attempts:
+                    logging.warning("Could not text %s: %s", number, e)
+                    return False
+                logging.debug("Texting %s failed, retrying: %s", number, e)
+                if self._stopping.wait(self.backoff * 2 ** attempt):
+                    return None
+        return False
+
+    def _wait_for_rate_limit(self) -> bool:
+        if self.rate_limiter is None:
+            return True
+        wait = self.rate_limiter.reserve(self.from_)
+        while wait > 0:
+            if self._stopping.wait(wait):
+                return False
+            wait = self.rate_limiter.reserve(self.from_)
+        return True
+
+
+def twilio_sender(from_: str, body: str, beer_id: Optional[str] = None) -> Callable[[str], None]:
+    """Sends body from our number from_ with the process's pooled Twilio client, the way BeerTextView does."""
+    from twiliotutorial.views import get_twilio_client
+    client = get_twilio_client()
+    status_callback = sms_status_callback_url(beer_id)
+    extra = {'status_callback': status_callback} if status_callback else {}
+
+    def send(to: str) -> None:
+        with upstream_latency.time('twilio_messages'):
+            client.messages.create(body=body, from_=from_, to=to, **extra)
+    return send
@@ -0,0 +1,345 @@
+import heapq
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Callable, List, Optional
+
+from django.conf import settings
+
+from twiliotutorial.metrics import REGISTRY
+from twiliotutorial.rate_limiter import get_sms_rate_limiter
+
+# from_ is the caller and to_ is our Twilio number, the same way round as BeerTextView uses them. call_sid is
+# the call the text was asked for in, if any.
+SmsJob = namedtuple('SmsJob', 'dedupe_key beer_id from_ to_ attempts call_sid', defaults=(None,))
+
+
+class SmsQueueFull(Exception):
+    pass
+
+
+class InMemorySmsBackend:
+    """Bounded in-process queue. Jobs are lost if the process exits before they are sent."""
+
+    def __init__(self, capacity: int, remembered_keys: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self.remembered_keys = remembered_keys
+        self.clock = clock
+        self._heap = []
+        self._seq = itertools.count()
+        self._queued_keys = set()
+        self._in_flight = 0
+        self._done_keys = OrderedDict()
+        self._condition = threading.Condition()
+
+    def put(self, job: SmsJob) -> bool:
+        with self._condition:
+            if job.dedupe_key in self._queued_keys or job.dedupe_key in self._done_keys:
+                return False
+            if len(self._heap) + self._in_flight >= self.capacity:
+                raise SmsQueueFull(job.dedupe_key)
+            self._queued_keys.add(job.dedupe_key)
+            self._push(job, self.clock())
+            return True
+
+    def get(self, timeout: float) -> Optional[SmsJob]:
+        deadline = self.clock() + timeout
+        with self._condition:
+            while True:
+                now = self.clock()
+                if self._heap and self._heap[0][0] <= now:
+                    job = heapq.heappop(self._heap)[2]
+                    self._in_flight += 1
+                    return job
+                if now >= deadline:
+                    return None
+                wait = deadline - now
+                if self._heap:
+                    wait = min(wait, self._heap[0][0] - now)
+                self._condition.wait(wait)
+
+    def ack(self, job: SmsJob) -> None:
+        with self._condition:
+            self._finish(job)
+            self._done_keys[job.dedupe_key] = True
+            while len(self._done_keys) > self.remembered_keys:
+                self._done_keys.popitem(last=False)
+
+    def retry(self, job: SmsJob, delay: float) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._push(job._replace(attempts=job.attempts + 1), self.clock() + delay)
+
+    # Put a job back for later without counting it as an attempt
+    def defer(self, job: SmsJob, delay: float) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._push(job, self.clock() + delay)
+
+    def fail(self, job: SmsJob) -> None:
+        with self._condition:
+            self._finish(job)
+
+    def size(self) -> int:
+        with self._condition:
+            return len(self._heap) + self._in_flight
+
+    def _push(self, job: SmsJob, not_before: float) -> None:
+        heapq.heappush(self._heap, (not_before, next(self._seq), job))
+        self._condition.notify()
+
+    def _finish(self, job: SmsJob) -> None:
+        self._in_flight -= 1
+        self._queued_keys.discard(job.dedupe_key)
+
+
+class SqliteSmsBackend:
+    """Queue kept in a sqlite file so pending sends survive a restart.
+
+    A claimed job is leased to the process that claimed it. Claims take back jobs whose owner has
+    died or whose lease (lease_seconds) ran out, which is what makes delivery at-least-once, while
+    jobs that live sibling workers are still sending are left alone. Sent and failed rows are kept so
+    their dedupe keys keep rejecting repeats.
+    """
+
+    def __init__(self, path: str, capacity: int, poll_interval: float = 0.5, lease_seconds: float = 120.0,
+                 clock: Callable[[], float] = time.time):
+        self.capacity = capacity
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.clock = clock
+        self._condition = threading.Condition()
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS sms_jobs ("
+            "dedupe_key TEXT PRIMARY KEY, beer_id TEXT, from_number TEXT, to_number TEXT, "
+            "attempts INTEGER NOT NULL DEFAULT 0, not_before REAL NOT NULL, status TEXT NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS sms_jobs_pending ON sms_jobs (status, not_before)")
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(sms_jobs)")}
+        # Queue files from before leases and call sids. Their in flight rows have no lease and are taken
+        # back; their jobs are sent without a call's session.
+        for column, column_type in (('owner_pid', 'INTEGER'), ('claimed_at', 'REAL'), ('call_sid', 'TEXT')):
+            if column not in columns:
+                try:
+                    self._connection.execute("ALTER TABLE sms_jobs ADD COLUMN %s %s" % (column, column_type))
+                except sqlite3.OperationalError:
+                    # Another worker process added it first
+                    pass
+
+    def put(self, job: SmsJob) -> bool:
+        with self._condition:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                exists = self._connection.execute(
+                    "SELECT 1 FROM sms_jobs WHERE dedupe_key = ?", (job.dedupe_key,)).fetchone()
+                if exists is None:
+                    queued = self._connection.execute(
+                        "SELECT COUNT(*) FROM sms_jobs WHERE status IN ('pending', 'in_flight')").fetchone()[0]
+                    if queued >= self.capacity:
+                        raise SmsQueueFull(job.dedupe_key)
+                    self._connection.execute(
+                        "INSERT INTO sms_jobs (dedupe_key, beer_id, from_number, to_number, attempts, call_sid, "
+                        "not_before, status) VALUES (?, ?, ?, ?, ?, ?, ?, 'pending')",
+                        (job.dedupe_key, job.beer_id, job.from_, job.to_, job.attempts, job.call_sid, self.clock()))
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._condition.notify()
+            return exists is None
+
+    def get(self, timeout: float) -> Optional[SmsJob]:
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                job = self._claim()
+                if job is not None:
+                    return job
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                # Other processes can add jobs too, so don't rely on notify alone
+                self._condition.wait(min(remaining, self.poll_interval))
+
+    def ack(self, job: SmsJob) -> None:
+        self._set_status(job, 'sent')
+
+    def retry(self, job: SmsJob, delay: float) -> None:
+        with self._condition:
+            self._connection.execute(
+                "UPDATE sms_jobs SET status = 'pending', attempts = attempts + 1, not_before = ? WHERE dedupe_key = ?",
+                (self.clock() + delay, job.dedupe_key))
+            self._condition.notify()
+
+    def defer(self, job: SmsJob, delay: float) -> None:
+        with self._condition:
+            self._connection.execute("UPDATE sms_jobs SET status = 'pending', not_before = ? WHERE dedupe_key = ?",
+                                     (self.clock() + delay, job.dedupe_key))
+            self._condition.notify()
+
+    def fail(self, job: SmsJob) -> None:
+        self._set_status(job, 'failed')
+
+    def size(self) -> int:
+        with self._condition:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM sms_jobs WHERE status IN ('pending', 'in_flight')").fetchone()[0]
+
+    def close(self) -> None:
+        with self._condition:
+            self._connection.close()
+
+    def _claim(self) -> Optional[SmsJob]:
+        now = self.clock()
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            self._reclaim_abandoned(now)
+            row = self._connection.execute(
+                "SELECT dedupe_key, beer_id, from_number, to_number, attempts, call_sid FROM sms_jobs "
+                "WHERE status = 'pending' AND not_before <= ? ORDER BY not_before LIMIT 1",
+                (now,)).fetchone()
+            if row is not None:
+                self._connection.execute(
+                    "UPDATE sms_jobs SET status = 'in_flight', owner_pid = ?, claimed_at = ? WHERE dedupe_key = ?",
+                    (os.getpid(), now, row[0]))
+            self._connection.execute("COMMIT")
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        return SmsJob(*row) if row is not None else None
+
+    # Puts in flight jobs back to pending if their lease ran out or the process sending them is gone.
+    # Runs inside _claim's transaction.
+    def _reclaim_abandoned(self, now: float) -> None:
+        owners = [pid for (pid,) in self._connection.execute(
+            "SELECT DISTINCT owner_pid FROM sms_jobs WHERE status = 'in_flight' AND owner_pid IS NOT NULL")]
+        dead = [pid for pid in owners if not process_alive(pid)]
+        self._connection.execute(
+            "UPDATE sms_jobs SET status = 'pending', owner_pid = NULL, claimed_at = NULL "
+            "WHERE status = 'in_flight' AND (claimed_at IS NULL OR claimed_at <= ? OR owner_pid IN (%s))"
+            % ', '.join('?' * len(dead)), [now - self.lease_seconds] + dead)
+
+    def _set_status(self, job: SmsJob, status: str) -> None:
+        with self._condition:
+            self._connection.execute("UPDATE sms_jobs SET status = ? WHERE dedupe_key = ?", (status, job.dedupe_key))
+
+
+def process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SmsDispatcher:
+    """Sends queued SMS jobs from a pool of worker threads.
+
+    A job that raises is retried with exponential backoff until max_attempts, then dropped. It is
+    only acked once send returns, so a crash mid-send means it is sent again (at-least-once). With a
+    rate_limiter, a job over the limit for its sending number goes back on the queue until a token is
+    free, without using up an attempt.
+    """
+
+    def __init__(self, backend, send: Callable[[SmsJob], None], workers: int, max_attempts: int,
+                 backoff: float, max_backoff: float = 60.0, rate_limiter=None):
+        self.backend = backend
+        self.rate_limiter = rate_limiter
+        self.send = send
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._threads:
+                return
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._work, name='sms-dispatch-%s' % number, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def enqueue(self, dedupe_key: str, beer_id: str, from_: str, to_: str, call_sid: Optional[str] = None) -> bool:
+        self.start()
+        return self.backend.put(SmsJob(dedupe_key=dedupe_key, beer_id=beer_id, from_=from_, to_=to_, attempts=0,
+                                       call_sid=call_sid))
+
+    def backoff_for(self, attempts: int) -> float:
+        return min(self.max_backoff, self.backoff * 2 ** attempts)
+
+    def _work(self) -> None:
+        while not self._stopping.is_set():
+            job = self.backend.get(timeout=0.5)
+            if job is None:
+                continue
+            if self.rate_limiter is not None:
+                wait = self.rate_limiter.reserve(job.to_)
+                if wait > 0:
+                    self.backend.defer(job, wait)
+                    continue
+            try:
+                self.send(job)
+            except Exception:
+                if job.attempts + 1 >= self.max_attempts:
+                    logging.exception("Giving up on sms %s after %s attempts", job.dedupe_key, job.attempts + 1)
+                    self.backend.fail(job)
+                else:
+                    logging.warning("Sending sms %s failed, retrying", job.dedupe_key, exc_info=True)
+                    self.backend.retry(job, delay=self.backoff_for(job.attempts))
+            else:
+                self.backend.ack(job)
+
+
+def build_sms_backend():
+    if settings.SMS_QUEUE_BACKEND == 'sqlite':
+        return SqliteSmsBackend(path=settings.SMS_QUEUE_PATH, capacity=settings.SMS_QUEUE_CAPACITY,
+                                lease_seconds=settings.SMS_QUEUE_LEASE_SECONDS)
+    return InMemorySmsBackend(capacity=settings.SMS_QUEUE_CAPACITY)
+
+
+_sms_dispatcher: Optional[SmsDispatcher] = None
+_sms_dispatcher_lock = threading.Lock()
+
+
+def get_sms_dispatcher(send: Callable[[SmsJob], None]) -> SmsDispatcher:
+    global _sms_dispatcher
+    if _sms_dispatcher is None:
+        with _sms_dispatcher_lock:
+            if _sms_dispatcher is None:
+                _sms_dispatcher = SmsDispatcher(backend=build_sms_backend(), send=send,
+                                                workers=settings.SMS_QUEUE_WORKERS,
+                                                max_attempts=settings.SMS_QUEUE_MAX_ATTEMPTS,
+                                                backoff=settings.SMS_QUEUE_BACKOFF,
+                                                rate_limiter=get_sms_rate_limiter())
+                REGISTRY.register_callback('twiliotutorial_sms_queue_depth', 'SMS jobs queued or being sent.',
+                                           'gauge', _sms_dispatcher.backend.size)
+    return _sms_dispatcher
+
+
+# Lets the dispatch threads finish the sends they are in the middle of, for a worker that is exiting.
+# Jobs still queued stay in the sqlite backend for the next worker; the in-memory backend loses them.
+def stop_sms_dispatcher(timeout: float = 5.0) -> None:
+    global _sms_dispatcher
+    with _sms_dispatcher_lock:
+        dispatcher, _sms_dispatcher = _sms_dispatcher, None
+    if dispatcher is not None:
+        dispatcher.stop(timeout)
+        pending = dispatcher.backend.size()
+        if pending and settings.SMS_QUEUE_BACKEND != 'sqlite':
+            logging.warning("Worker exiting with %s queued sms that won't be sent", pending)
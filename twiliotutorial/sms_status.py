@@ -0,0 +1,215 @@
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+import urllib.parse
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from twiliotutorial.metrics import REGISTRY
+
+# How far along a message is. Callbacks can arrive out of order, so a status only replaces one that
+# isn't further along.
+STATUS_RANKS = {'accepted': 0, 'scheduled': 0, 'queued': 0, 'sending': 1, 'sent': 2, 'delivered': 3,
+                'undelivered': 3, 'failed': 3, 'canceled': 3, 'read': 4}
+DELIVERED_STATUSES = ('delivered', 'read')
+NOT_DELIVERED_STATUSES = ('undelivered', 'failed', 'canceled')
+
+# message sid, status, beer id, error code, when the callback came in
+StatusUpdate = Tuple[str, str, Optional[str], Optional[str], float]
+
+
+class SqliteSmsStatusStore:
+    """Latest status of every message, in a sqlite file that all worker processes write to."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS sms_status (message_sid TEXT PRIMARY KEY, beer_id TEXT, status TEXT NOT NULL, "
+            "rank INTEGER NOT NULL, error_code TEXT, updated_at REAL NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS sms_status_beer ON sms_status (beer_id, status)")
+
+    def write(self, updates: List[StatusUpdate]) -> None:
+        rows = [(sid, beer_id, status, STATUS_RANKS.get(status, 0), error_code, received_at)
+                for sid, status, beer_id, error_code, received_at in updates]
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.executemany(
+                    "INSERT INTO sms_status (message_sid, beer_id, status, rank, error_code, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (message_sid) DO UPDATE SET "
+                    "status = excluded.status, rank = excluded.rank, error_code = excluded.error_code, "
+                    "updated_at = excluded.updated_at, beer_id = coalesce(sms_status.beer_id, excluded.beer_id) "
+                    "WHERE excluded.rank >= sms_status.rank", rows)
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def delivery_rates(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT beer_id, status, COUNT(*) FROM sms_status WHERE beer_id IS NOT NULL "
+                "GROUP BY beer_id, status").fetchall()
+        rates = {}
+        for beer_id, status, count in rows:
+            counts = rates.setdefault(beer_id, {'messages': 0, 'delivered': 0, 'not_delivered': 0, 'pending': 0})
+            counts['messages'] += count
+            if status in DELIVERED_STATUSES:
+                counts['delivered'] += count
+            elif status in NOT_DELIVERED_STATUSES:
+                counts['not_delivered'] += count
+            else:
+                counts['pending'] += count
+        for counts in rates.values():
+            finished = counts['delivered'] + counts['not_delivered']
+            counts['delivery_rate'] = counts['delivered'] / finished if finished else None
+        return rates
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class SmsStatusBuffer:
+    """Takes status callbacks in memory and writes them to the store in batches.
+
+    add only appends to a list, so the webhook answers without touching the disk. A background
+    thread writes the list out once it holds batch_size updates or flush_interval seconds after
+    the last write. If the store falls behind by more than max_buffered updates, new ones are
+    dropped (and counted) rather than letting memory grow.
+    """
+
+    def __init__(self, store, batch_size: int, flush_interval: float, max_buffered: int,
+                 clock: Callable[[], float] = time.time):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.clock = clock
+        self.received = 0
+        self.dropped = 0
+        self.flushed = 0
+        self._updates: List[StatusUpdate] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, message_sid: str, status: str, beer_id: Optional[str] = None,
+            error_code: Optional[str] = None) -> bool:
+        with self._lock:
+            self.received += 1
+            if len(self._updates) >= self.max_buffered:
+                self.dropped += 1
+                return False
+            self._updates.append((message_sid, status, beer_id, error_code, self.clock()))
+            full = len(self._updates) >= self.batch_size
+        if full:
+            self._wake.set()
+        if self._thread is None:
+            self.start()
+        return True
+
+    def flush(self) -> int:
+        """Write everything buffered so far. Returns how many updates were written."""
+        with self._flush_lock:
+            with self._lock:
+                updates, self._updates = self._updates, []
+            if not updates:
+                return 0
+            try:
+                self.store.write(updates)
+            except Exception:
+                logging.exception("Could not write %s sms status updates", len(updates))
+                with self._lock:
+                    # Put them back in front of whatever came in meanwhile, still within max_buffered
+                    room = max(0, self.max_buffered - len(self._updates))
+                    self.dropped += max(0, len(updates) - room)
+                    self._updates[:0] = updates[-room:] if room else []
+                return 0
+            with self._lock:
+                self.flushed += len(updates)
+            return len(updates)
+
+    def buffered(self) -> int:
+        with self._lock:
+            return len(self._updates)
+
+    # Only counts what has been written, which is at most flush_interval behind. Reads don't flush, so a
+    # report doesn't make the webhook worker serving it write the buffer out.
+    def delivery_rates(self) -> Dict[str, Dict[str, float]]:
+        return self.store.delivery_rates()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='sms-status-flush', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+
+def sms_status_callback_url(beer_id: Optional[str]) -> Optional[str]:
+    """Where Twilio should post a text's delivery status, or None without TWILIO_WEBHOOK_BASE_URL to post to."""
+    if not settings.TWILIO_WEBHOOK_BASE_URL:
+        return None
+    url = settings.TWILIO_WEBHOOK_BASE_URL.rstrip('/') + '/sms-status'
+    if beer_id is not None:
+        url += '?' + urllib.parse.urlencode({'beerid': beer_id})
+    return url
+
+
+_sms_status_buffer: Optional[SmsStatusBuffer] = None
+_sms_status_buffer_lock = threading.Lock()
+
+
+def get_sms_status_buffer() -> SmsStatusBuffer:
+    global _sms_status_buffer
+    if _sms_status_buffer is None:
+        with _sms_status_buffer_lock:
+            if _sms_status_buffer is None:
+                _sms_status_buffer = SmsStatusBuffer(store=SqliteSmsStatusStore(settings.SMS_STATUS_PATH),
+                                                     batch_size=settings.SMS_STATUS_BATCH_SIZE,
+                                                     flush_interval=settings.SMS_STATUS_FLUSH_INTERVAL,
+                                                     max_buffered=settings.SMS_STATUS_MAX_BUFFERED)
+                buffer = _sms_status_buffer
+                # Don't lose the last partial batch when the worker exits
+                atexit.register(buffer.flush)
+                for name, metric_type, help, value in (
+                        ('buffered', 'gauge', 'SMS status callbacks waiting to be written.', buffer.buffered),
+                        ('received_total', 'counter', 'SMS status callbacks received.', lambda: buffer.received),
+                        ('flushed_total', 'counter', 'SMS status callbacks written to the store.',
+                         lambda: buffer.flushed),
+                        ('dropped_total', 'counter', 'SMS status callbacks dropped with the buffer full.',
+                         lambda: buffer.dropped)):
+                    REGISTRY.register_callback('twiliotutorial_sms_status_' + name, help, metric_type, value)
+    return _sms_status_buffer
+
+
+def reset_sms_status_buffer() -> None:
+    global _sms_status_buffer
+    with _sms_status_buffer_lock:
+        if _sms_status_buffer is not None:
+            atexit.unregister(_sms_status_buffer.flush)
+            _sms_status_buffer.stop()
+            _sms_status_buffer.store.close()
+        _sms_status_buffer = None
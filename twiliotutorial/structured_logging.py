@@ -0,0 +1,210 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import zlib
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from twiliotutorial.metrics import REGISTRY
+
+# CallSid of the webhook being handled. ContextVars are per thread and per asyncio task, so concurrent
+# requests don't see each other's, and tasks started by a request (like async_views' SMS sends) keep it.
+call_sid_var: ContextVar[Optional[str]] = ContextVar('call_sid', default=None)
+
+TEXT_FORMAT = '%(levelname)s:%(name)s:%(message)s'
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with the call's CallSid when there is one."""
+
+    def __init__(self):
+        super().__init__()
+        self._second = None
+        self._second_prefix = ''
+
+    def format(self, record: logging.LogRecord) -> str:
+        # Records come in many to a second, so only the milliseconds are formatted for each
+        second = int(record.created)
+        if second != self._second:
+            self._second_prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(second))
+            self._second = second
+        entry = {
+            'time': '%s.%03dZ' % (self._second_prefix, (record.created - second) * 1000),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        call_sid = getattr(record, 'call_sid', None)
+        if call_sid is not None:
+            entry['call_sid'] = call_sid
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class CallSidFilter(logging.Filter):
+    """Stamps records with call_sid_var, on the thread that logged them."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.call_sid = call_sid_var.get()
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Keeps only rate of the DEBUG records, and every record above DEBUG.
+
+    Records are kept or dropped per call, by a hash of the CallSid, so a sampled call keeps all of its
+    lines. Records from outside a call are sampled one by one.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+        self._threshold = int(rate * 2 ** 32)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        call_sid = getattr(record, 'call_sid', None)
+        if call_sid is None:
+            return random.random() < self.rate
+        return zlib.crc32(call_sid.encode()) < self._threshold
+
+
+class _FlushMarker:
+    """Put on the queue by flush(), and set by the listener once everything queued before it is written."""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def handle(self, record) -> None:
+        if isinstance(record, _FlushMarker):
+            record.done.set()
+        else:
+            super().handle(record)
+
+
+class QueueLogHandler(logging.handlers.QueueHandler):
+    """Puts records on a queue that a listener thread formats and writes to target.
+
+    The request thread only renders the message and enqueues it. The listener is started on the first
+    record a process logs, so a gunicorn master that logs before forking doesn't hand its workers a
+    queue whose thread is gone. When the queue is full, records are dropped and counted rather than
+    making requests wait for the log.
+    """
+
+    def __init__(self, target: logging.Handler, capacity: int, flush_timeout: float = 5.0):
+        super().__init__(queue.SimpleQueue())
+        self.target = target
+        self.capacity = capacity
+        self.flush_timeout = flush_timeout
+        self.dropped = 0
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        # The process the queue and listener belong to
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message now, in case its arguments change before the listener gets to it. Tracebacks
+        # and everything else the formatter does are left to the listener.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self._listener is None or self._pid != os.getpid():
+            self.start()
+        # SimpleQueue's put is much cheaper than a bounded Queue's, and the cap only needs to be about right
+        if self.queue.qsize() >= self.capacity:
+            self.dropped += 1
+        else:
+            self.queue.put(record)
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._pid != os.getpid():
+                # A fresh queue in a forked child, so it doesn't write out what the parent had queued as
+                # well. The parent's listener thread didn't come along.
+                self.queue = queue.SimpleQueue()
+                self._listener = None
+                self._pid = os.getpid()
+            # After stop() the same queue is kept, so a record put on it while the listener was stopping
+            # is written by the next one
+            if self._listener is None:
+                self._listener = _QueueListener(self.queue, self.target)
+                self._listener.start()
+
+    def flush(self) -> None:
+        """Wait until everything queued so far is written. The listener keeps running."""
+        listener = self._listener
+        if listener is not None and self._pid == os.getpid():
+            marker = _FlushMarker()
+            self.queue.put(marker)
+            marker.done.wait(self.flush_timeout)
+        self._flush_target()
+
+    def stop(self) -> None:
+        """Write out everything queued so far and stop the listener."""
+        with self._start_lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+                self._listener = None
+        self._flush_target()
+
+    # logging.shutdown closes this handler at exit, which can be after whoever owns the stream (a test
+    # runner capturing stderr, say) has closed it
+    def _flush_target(self) -> None:
+        try:
+            self.target.flush()
+        except ValueError:
+            pass
+
+    def close(self) -> None:
+        self.stop()
+        self.target.close()
+        super().close()
+
+
+_queue_handler: Optional[QueueLogHandler] = None
+
+
+def configure_logging(config: Dict) -> None:
+    """LOGGING_CONFIG callable, given settings.LOGGING after Django's own logging is set up.
+
+    Replaces the root logger's handlers with a QueueLogHandler writing to stderr, as text or JSON.
+    """
+    global _queue_handler
+    if config['format'] == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+    target = logging.StreamHandler(sys.stderr)
+    target.setFormatter(formatter)
+    handler = QueueLogHandler(target, capacity=config['queue_size'])
+    handler.addFilter(CallSidFilter())
+    if config['debug_sample_rate'] < 1:
+        handler.addFilter(DebugSamplingFilter(config['debug_sample_rate']))
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+        old.close()
+    root.addHandler(handler)
+    root.setLevel(config['level'])
+
+    # logging.shutdown closes the handler at exit, which writes out what is still queued
+    if _queue_handler is None:
+        REGISTRY.register_callback('twiliotutorial_log_records_dropped_total',
+                                   'Log records dropped with the log queue full.', 'counter',
+                                   lambda: _queue_handler.dropped)
+    _queue_handler = handler
@@ -0,0 +1,182 @@
+import json
+import re
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Send headers and body in one segment, otherwise Nagle + delayed ACK adds ~40ms to keep-alive requests
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        # setup runs once per accepted TCP connection, not once per request
+        self.server.count('connections')
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_form(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return dict(urllib.parse.parse_qsl(self.rfile.read(length).decode()))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class BeerApiStubHandler(StubHandler):
+    """Answers /v2/beer/random, /v2/beers?ids=... and /v2/beers?order=random like BreweryDB, or 503 while the server is failing."""
+
+    def do_GET(self):
+        self.server.count('requests')
+        time.sleep(self.server.latency)
+        if self.server.failing:
+            self.send_json(503, {'status': 'failure', 'errorMessage': 'Service Unavailable'})
+            return
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        if url.path.endswith('/beer/random'):
+            self.send_json(200, {'status': 'success', 'data': self.server.make_beer(uuid.uuid4().hex[:6])})
+        elif url.path.endswith('/beers'):
+            if query.get('order') == 'random':
+                beers = [self.server.make_beer(uuid.uuid4().hex[:6]) for _ in range(int(query.get('randomCount', 1)))]
+            else:
+                beers = [self.server.make_beer(beer_id) for beer_id in query.get('ids', '').split(',') if beer_id]
+            self.send_json(200, {'currentPage': 1, 'numberOfPages': 1, 'totalResults': len(beers),
+                                 'data': beers, 'status': 'success'})
+        else:
+            self.send_json(404, {'status': 'failure'})
+
+
+class TwilioStubHandler(StubHandler):
+    """Accepts Messages.json and Calls.json POSTs the way the Twilio REST API does, and records them, or 503 while
+    the server is failing.
+
+    A call "rings" for the server's call_duration and then posts its status callbacks. How it ends is the next
+    status in call_outcomes for its To number, 'completed' if there are none left.
+    """
+
+    messages_path = re.compile(r'^/2010-04-01/Accounts/(?P<account_sid>\w+)/Messages\.json$')
+    calls_path = re.compile(r'^/2010-04-01/Accounts/(?P<account_sid>\w+)/Calls\.json$')
+
+    def do_POST(self):
+        self.server.count('requests')
+        time.sleep(self.server.latency)
+        if self.server.failing:
+            self.read_form()
+            self.send_json(503, {'code': 20503, 'message': 'Service Unavailable', 'status': 503})
+            return
+        path = urllib.parse.urlsplit(self.path).path
+        match = self.messages_path.match(path) or self.calls_path.match(path)
+        if match is None:
+            self.send_json(404, {'status': 404, 'message': 'Not found'})
+            return
+        form = self.read_form()
+        self.server.record(form)
+        if match.re is self.calls_path:
+            payload = self.call_payload(match.group('account_sid'), form)
+            self.send_json(201, payload)
+            self.server.finish_call(payload['sid'], form)
+        else:
+            self.send_json(201, self.message_payload(match.group('account_sid'), form))
+
+    @staticmethod
+    def call_payload(account_sid, form):
+        sid = 'CA' + uuid.uuid4().hex
+        return {
+            'sid': sid, 'account_sid': account_sid, 'annotation': None, 'answered_by': None, 'api_version': '2010-04-01',
+            'caller_name': None, 'date_created': None, 'date_updated': None, 'direction': 'outbound-api',
+            'duration': None, 'end_time': None, 'forwarded_from': None, 'from': form.get('From'),
+            'from_formatted': form.get('From'), 'group_sid': None, 'parent_call_sid': None, 'phone_number_sid': None,
+            'price': None, 'price_unit': 'USD', 'start_time': None, 'status': 'queued', 'subresource_uris': {},
+            'to': form.get('To'), 'to_formatted': form.get('To'),
+            'uri': '/2010-04-01/Accounts/%s/Calls/%s.json' % (account_sid, sid),
+        }
+
+    @staticmethod
+    def message_payload(account_sid, form):
+        sid = 'SM' + uuid.uuid4().hex
+        return {
+            'sid': sid, 'account_sid': account_sid, 'api_version': '2010-04-01', 'body': form.get('Body'),
+            'date_created': None, 'date_updated': None, 'date_sent': None, 'direction': 'outbound-api',
+            'error_code': None, 'error_message': None, 'from': form.get('From'), 'to': form.get('To'),
+            'messaging_service_sid': None, 'num_media': '0', 'num_segments': '1', 'price': None,
+            'price_unit': 'USD', 'status': 'queued', 'subresource_uris': {},
+            'uri': '/2010-04-01/Accounts/%s/Messages/%s.json' % (account_sid, sid),
+        }
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    # keep_received=False only counts what is posted, for runs long enough that keeping it all would show up
+    # in the memory being measured
+    def __init__(self, handler_class, latency: float = 0.0, keep_received: bool = True):
+        super().__init__(('127.0.0.1', 0), handler_class)
+        self.latency = latency
+        self.keep_received = keep_received
+        self.failing = False
+        self.counts = {'connections': 0, 'requests': 0, 'received': 0}
+        self.received = []
+        self.call_duration = 0.0
+        self.call_outcomes = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return 'http://127.0.0.1:%s' % self.server_port
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.counts[name] += 1
+
+    def record(self, form) -> None:
+        with self._lock:
+            self.counts['received'] += 1
+            if self.keep_received:
+                self.received.append(form)
+
+    def finish_call(self, call_sid: str, form) -> None:
+        with self._lock:
+            outcomes = self.call_outcomes.get(form.get('To'))
+            outcome = outcomes.pop(0) if outcomes else 'completed'
+        statuses = ['ringing', 'in-progress', 'completed'] if outcome == 'completed' else ['ringing', outcome]
+        if form.get('StatusCallback'):
+            threading.Thread(target=self.post_statuses, args=(form['StatusCallback'], call_sid, statuses),
+                             daemon=True).start()
+
+    def post_statuses(self, url: str, call_sid: str, statuses) -> None:
+        for status in statuses:
+            if status == statuses[-1]:
+                time.sleep(self.call_duration)
+            body = urllib.parse.urlencode({'CallSid': call_sid, 'CallStatus': status}).encode()
+            try:
+                urllib.request.urlopen(urllib.request.Request(url, data=body), timeout=5).close()
+            except OSError:
+                pass
+
+    @staticmethod
+    def make_beer(beer_id: str):
+        return {'id': beer_id, 'name': 'Beer %s' % beer_id, 'abv': '5.5', 'ibu': '40',
+                'style': {'id': 1, 'name': 'Pale Ale', 'description': 'A hoppy pale ale.'}}
+
+    def start(self) -> 'StubServer':
+        self._thread = threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,110 @@
+import asyncio
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from twiliotutorial.asgi import application
+from twiliotutorial.async_http import close_async_session
+from twiliotutorial.async_views import wait_for_background_tasks
+from twiliotutorial.beer_cache import reset_beer_fact_cache
+from twiliotutorial.rate_limiter import reset_sms_rate_limiter
+from twiliotutorial.tests.stubs import BeerApiStubHandler, StubServer, TwilioStubHandler
+
+
+async def call_asgi(path, body=b'', query_string=b''):
+    scope = {'type': 'http', 'method': 'POST', 'path': path, 'query_string': query_string, 'root_path': '',
+             'scheme': 'http', 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234), 'http_version': '1.1',
+             'headers': [(b'content-type', b'application/x-www-form-urlencoded'),
+                         (b'content-length', str(len(body)).encode())]}
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    await application(scope, receive, send)
+    await wait_for_background_tasks()
+    await close_async_session()
+    status = sent[0]['status']
+    headers = dict(sent[0]['headers'])
+    content = b''.join(message.get('body', b'') for message in sent[1:])
+    return status, headers, content
+
+
+class AsgiApplicationTestCase(SimpleTestCase):
+    """Test the ASGI entry point against local stub Beer API and Twilio servers."""
+
+    def setUp(self) -> None:
+        self.beer_api = StubServer(BeerApiStubHandler).start()
+        self.addCleanup(self.beer_api.stop)
+        self.twilio = StubServer(TwilioStubHandler).start()
+        self.addCleanup(self.twilio.stop)
+        reset_beer_fact_cache()
+        reset_sms_rate_limiter()
+        self.addCleanup(reset_sms_rate_limiter)
+        overrides = override_settings(BEER_API_URL=self.beer_api.url, TWILIO_API_BASE_URL=self.twilio.url,
+                                      TWILIO_ACCOUNT_SID='ACtest', TWILIO_ACCOUNT_TOKEN='token')
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test__beerfact__returns_twiml_for_random_beer(self):
+        status, headers, content = asyncio.run(call_asgi('/beerfact'))
+
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b'content-type'], b'text/xml')
+        self.assertIn(b'<Gather action="/beertext?beerid=', content)
+        self.assertEqual(self.beer_api.counts['requests'], 1)
+
+    @mock.patch('twiliotutorial.views.get_sms_dispatcher')
+    def test__beertext__queue_backend__enqueued_on_dispatcher(self, mock_get_sms_dispatcher):
+        asyncio.run(call_asgi('/beertext', body=b'From=8675309&To=5551234&CallSid=CA1', query_string=b'beerid=abc123'))
+
+        mock_get_sms_dispatcher.return_value.enqueue.assert_called_once_with(
+            dedupe_key='CA1:abc123', beer_id='abc123', from_='8675309', to_='5551234', call_sid='CA1')
+        self.assertEqual(self.twilio.received, [])
+
+    @override_settings(SMS_QUEUE_BACKEND='')
+    def test__beertext__texts_beer_to_caller(self):
+        status, headers, content = asyncio.run(call_asgi('/beertext', body=b'From=8675309&To=5551234',
+                                                         query_string=b'beerid=abc123'))
+
+        self.assertEqual(content, b'<?xml version="1.0" encoding="UTF-8"?><Response />')
+        self.assertEqual(self.twilio.received, [{
+            'Body': 'Hi there! You were listening to: Beer abc123, 5.5%, IBU: 40',
+            'From': '5551234',
+            'To': '8675309',
+        }])
+
+    @override_settings(SMS_QUEUE_BACKEND='')
+    @mock.patch('twiliotutorial.async_views.get_sms_rate_limiter')
+    def test__beertext__rate_limit_reserved_off_event_loop(self, mock_get_sms_rate_limiter):
+        threads = []
+
+        def reserve(sending_number):
+            threads.append(threading.get_ident())
+            return 0.0
+
+        mock_get_sms_rate_limiter.return_value.reserve.side_effect = reserve
+
+        asyncio.run(call_asgi('/beertext', body=b'From=8675309&To=5551234', query_string=b'beerid=abc123'))
+
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+        self.assertEqual(len(self.twilio.received), 1)
+
+    def test__beertext__missing_number__does_not_text(self):
+        status, headers, content = asyncio.run(call_asgi('/beertext', body=b'To=5551234',
+                                                         query_string=b'beerid=abc123'))
+
+        self.assertEqual(content, b'<?xml version="1.0" encoding="UTF-8"?><Response />')
+        self.assertEqual(self.twilio.received, [])
+
+    def test__other_paths__served_by_django(self):
+        status, headers, content = asyncio.run(call_asgi('/play-again', body=b'Digits=2'))
+
+        self.assertEqual(status, 200)
+        self.assertIn(b'<Say>Goodbye</Say>', content)
@@ -2,15 +2,22 @@ import json
 from unittest import mock
 from unittest.mock import call
 
+import requests
 from django.conf import settings
 from django.test import SimpleTestCase
 
 from twiliotutorial.beer import Beer, BeerFact
+from twiliotutorial.beer_cache import get_beer_fact_cache, reset_beer_fact_cache
+from twiliotutorial.circuit_breaker import reset_beer_api_breaker
 
 
 class BeerTestCase(SimpleTestCase):
     """Test Beer class methods. Since we dont have a Database, use SimpleTestCase"""
 
+    def setUp(self) -> None:
+        reset_beer_fact_cache()
+        reset_beer_api_breaker()
+
     def test__get_random_beer_url__returns_url(self):
         expected_url = 'https://sandbox-api.brewerydb.com/v2/beer/random'
         beer = Beer()
@@ -25,8 +32,8 @@ class BeerTestCase(SimpleTestCase):
 
         self.assertEqual(url, expected_url)
 
-    @mock.patch('twiliotutorial.beer.requests')
-    def test__get_beer_fact_from_api__returns_beer_fact(self, mock_requests):
+    @mock.patch('twiliotutorial.beer.get_session')
+    def test__get_beer_fact_from_api__returns_beer_fact(self, mock_get_session):
         expected_result = json.dumps({
             'data': {
                 'name': 'test',
@@ -39,7 +46,7 @@ class BeerTestCase(SimpleTestCase):
         mock_result = mock.Mock()
         mock_result.status_code = 200
         mock_result.content = expected_result
-        mock_requests.get.return_value = mock_result
+        mock_get_session.return_value.get.return_value = mock_result
 
         beer = Beer()
 
@@ -47,11 +54,11 @@ class BeerTestCase(SimpleTestCase):
 
         self.assertEqual(result, json.loads(expected_result))
 
-    @mock.patch('twiliotutorial.beer.requests')
-    def test__get_beer_fact_from_api__status_non_200__returns_empty_result(self, mock_requests):
+    @mock.patch('twiliotutorial.beer.get_session')
+    def test__get_beer_fact_from_api__status_non_200__returns_empty_result(self, mock_get_session):
         mock_result = mock.Mock()
         mock_result.status_code = 404
-        mock_requests.get.return_value = mock_result
+        mock_get_session.return_value.get.return_value = mock_result
 
         beer = Beer()
 
@@ -59,13 +66,23 @@ class BeerTestCase(SimpleTestCase):
 
         self.assertEqual(result, {})
 
-    @mock.patch('twiliotutorial.beer.requests')
-    def test__get_beer_fact_from_api__content_not_json__returns_empty_result(self, mock_requests):
+    @mock.patch('twiliotutorial.beer.get_session')
+    def test__get_beer_fact_from_api__content_not_json__returns_empty_result(self, mock_get_session):
         bad_json = 'foo: bar, [waz, foop]'
         mock_result = mock.Mock()
         mock_result.status_code = 200
         mock_result.content = bad_json
-        mock_requests.get.return_value = mock_result
+        mock_get_session.return_value.get.return_value = mock_result
+
+        beer = Beer()
+
+        result = beer.get_beer_fact_from_api('http://some/url', {'some': 'param'})
+
+        self.assertEqual(result, {})
+
+    @mock.patch('twiliotutorial.beer.get_session')
+    def test__get_beer_fact_from_api__request_fails__returns_empty_result(self, mock_get_session):
+        mock_get_session.return_value.get.side_effect = requests.ConnectTimeout()
 
         beer = Beer()
 
@@ -73,6 +90,19 @@ class BeerTestCase(SimpleTestCase):
 
         self.assertEqual(result, {})
 
+    @mock.patch('twiliotutorial.beer.get_session')
+    def test__get_beer_fact_from_api__passes_timeout(self, mock_get_session):
+        mock_result = mock.Mock()
+        mock_result.status_code = 404
+        mock_get_session.return_value.get.return_value = mock_result
+
+        beer = Beer()
+        beer.get_beer_fact_from_api('http://some/url', {'some': 'param'})
+
+        self.assertEqual(mock_get_session.return_value.get.call_args_list[0],
+                         call(url='http://some/url', params={'some': 'param'},
+                              timeout=(settings.BEER_API_CONNECT_TIMEOUT, settings.BEER_API_READ_TIMEOUT)))
+
     def test__convert_result_to_beer_fact__paginated__returns_first_result_as_beer_fact(self):
         mock_api_response_data = {
             'currentPage': 1,
@@ -205,3 +235,122 @@ class BeerTestCase(SimpleTestCase):
         self.assertEqual(beer_fact, expected_beer_fact)
         self.assertEqual(mock_get.call_args_list[0],
                          call(url=mock_url(), params={'key': settings.BEER_API_KEY, 'ids': 'test_id'}))
+
+    @mock.patch('twiliotutorial.beer.Beer.get_beer_with_id_url')
+    @mock.patch('twiliotutorial.beer.Beer.get_beer_fact_from_api')
+    def test__get_beer_by_id__called_twice__only_calls_api_once(self, mock_get, mock_url):
+        mock_get.return_value = {
+            'currentPage': 1,
+            'data': [{'name': 'test', 'id': 'test_id'}]
+        }
+        mock_url.return_value = 'http:/useless.org'
+        beer = Beer()
+        first = beer.get_beer_by_id('test_id')
+        second = Beer().get_beer_by_id('test_id')
+
+        self.assertEqual(first, second)
+        self.assertEqual(mock_get.call_count, 1)
+
+    @mock.patch('twiliotutorial.beer.Beer.get_beer_with_id_url')
+    @mock.patch('twiliotutorial.beer.Beer.get_beer_fact_from_api')
+    def test__get_beer_by_id__not_found__caches_empty_beer_fact(self, mock_get, mock_url):
+        mock_get.return_value = {'currentPage': 1, 'numberOfPages': 0, 'totalResults': 0}
+        mock_url.return_value = 'http:/useless.org'
+        beer = Beer()
+        beer.get_beer_by_id('missing_id')
+        beer_fact = beer.get_beer_by_id('missing_id')
+
+        self.assertIsNone(beer_fact.id)
+        self.assertEqual(mock_get.call_count, 1)
+
+    @mock.patch('twiliotutorial.beer.Beer.get_beer_fact_from_api')
+    def test__get_beer_by_id__api_fails__returns_stale_beer_fact_without_caching_failure(self, mock_get):
+        stale_fact = BeerFact(name='test', id='test_id', abv='1.0', ibu=99, style=None)
+        cache = get_beer_fact_cache()
+        cache.set('test_id', stale_fact)
+        cache.clock = lambda: float('inf')
+        mock_get.return_value = {}
+        beer = Beer()
+
+        self.assertEqual(beer.get_beer_by_id('test_id'), stale_fact)
+        self.assertIsNone(beer.get_beer_by_id('missing_id').id)
+        self.assertIsNone(cache.get_stale('missing_id'))
+        self.assertEqual(mock_get.call_count, 2)
+
+    @mock.patch('twiliotutorial.beer.Beer.get_beer_fact_from_api')
+    def test__get_random_beer_fact__api_fails__returns_cached_beer_fact(self, mock_get):
+        stale_fact = BeerFact(name='test', id='test_id', abv='1.0', ibu=99, style=None)
+        get_beer_fact_cache().set('test_id', stale_fact)
+        mock_get.return_value = {}
+
+        self.assertEqual(Beer().get_random_beer_fact(), stale_fact)
+
+    @mock.patch('twiliotutorial.beer.get_session')
+    def test__get_beer_fact_from_api__circuit_open__doesnt_call_api(self, mock_get_session):
+        mock_get_session.return_value.get.side_effect = requests.ConnectionError('down')
+        beer = Beer()
+        for _ in range(settings.BEER_API_BREAKER_MINIMUM_REQUESTS):
+            beer.get_beer_fact_from_api('http://some/url', None)
+        mock_get_session.return_value.get.reset_mock()
+
+        self.assertEqual(beer.get_beer_fact_from_api('http://some/url', None), {})
+        self.assertFalse(mock_get_session.return_value.get.called)
+
+    @mock.patch('twiliotutorial.beer.Beer.get_random_beer_url')
+    @mock.patch('twiliotutorial.beer.Beer.get_beer_fact_from_api')
+    def test__get_random_beer_fact__caches_beer_fact_by_id(self, mock_get, mock_url):
+        mock_get.return_value = {'data': {'name': 'test', 'id': 'test_id'}}
+        mock_url.return_value = 'http:/useless.org'
+        beer = Beer()
+        beer_fact = beer.get_random_beer_fact()
+
+        self.assertEqual(get_beer_fact_cache().get('test_id'), beer_fact)
+
+    @mock.patch('twiliotutorial.beer.Beer.get_beer_with_id_url')
+    @mock.patch('twiliotutorial.beer.Beer.get_beer_fact_from_api')
+    def test__get_beers_by_ids__chunks_ids_and_follows_pages(self, mock_get, mock_url):
+        def fake_api(url, params):
+            ids = params['ids'].split(',')
+            # Pretend the API splits every response into pages of 2 beers
+            page_data = ids[(params['p'] - 1) * 2:params['p'] * 2]
+            return {
+                'currentPage': params['p'],
+                'numberOfPages': (len(ids) + 1) // 2,
+                'data': [{'id': beer_id, 'name': 'name_' + beer_id} for beer_id in page_data if beer_id != 'gone']
+            }
+
+        mock_get.side_effect = fake_api
+        mock_url.return_value = 'http:/useless.org'
+        beer_ids = ['id_%s' % number for number in range(12)] + ['gone']
+
+        with self.settings(BEER_API_MAX_IDS_PER_REQUEST=10):
+            beer_facts = Beer().get_beers_by_ids(beer_ids)
+
+        self.assertEqual(list(beer_facts), beer_ids)
+        self.assertEqual(beer_facts['id_11'].name, 'name_id_11')
+        self.assertEqual(beer_facts['gone'], BeerFact(id=None, name=None, abv=None, style=None, ibu=None))
+        # 10 ids over 5 pages, then 3 ids over 2 pages
+        self.assertEqual(mock_get.call_count, 7)
+        self.assertEqual(mock_get.call_args_list[0],
+                         call(url=mock_url(), params={'key': settings.BEER_API_KEY,
+                                                      'ids': ','.join(beer_ids[:10]), 'p': 1}))
+
+    @mock.patch('twiliotutorial.beer.Beer.get_beer_fact_from_api')
+    def test__get_beers_by_ids__cached_ids__only_fetches_missing(self, mock_get):
+        cached_fact = BeerFact(id='cached', name='cached', abv=None, style=None, ibu=None)
+        get_beer_fact_cache().set('cached', cached_fact)
+        mock_get.return_value = {'currentPage': 1, 'numberOfPages': 1, 'data': [{'id': 'new', 'name': 'new'}]}
+
+        beer_facts = Beer().get_beers_by_ids(['cached', 'new', 'cached'])
+
+        self.assertEqual(beer_facts['cached'], cached_fact)
+        self.assertEqual(beer_facts['new'].name, 'new')
+        self.assertEqual(mock_get.call_args_list[0][1]['params']['ids'], 'new')
+        self.assertEqual(Beer().get_beer_by_id('new'), beer_facts['new'])
+        self.assertEqual(mock_get.call_count, 1)
+
+    def test__convert_result_to_beer_fact__paginated_without_data__returns_empty_beer_fact(self):
+        expected_beer_fact = BeerFact(id=None, name=None, abv=None, style=None, ibu=None)
+        result = Beer().convert_result_to_beer_fact({'currentPage': 1, 'status': 'success'})
+
+        self.assertEqual(result, expected_beer_fact)
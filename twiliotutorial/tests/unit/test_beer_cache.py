@@ -0,0 +1,81 @@
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase
+
+from twiliotutorial.beer import BeerFact
+from twiliotutorial.beer_cache import BeerFactCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class BeerFactCacheTestCase(SimpleTestCase):
+    """Test BeerFactCache expiry, eviction and counters."""
+
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.cache = BeerFactCache(max_size=2, ttl=100, negative_ttl=10, clock=self.clock)
+        self.beer_fact = BeerFact(name='test', id='test_1', abv=1.0, ibu=99,
+                                  style=dict(description='test_description'))
+        self.empty_beer_fact = BeerFact(id=None, name=None, abv=None, style=None, ibu=None)
+
+    def test__get__missing__returns_none_and_counts_miss(self):
+        self.assertIsNone(self.cache.get('test_1'))
+        self.assertEqual(self.cache.stats(), {'hits': 0, 'misses': 1, 'size': 0})
+
+    def test__get__after_set__returns_beer_fact_and_counts_hit(self):
+        self.cache.set('test_1', self.beer_fact)
+
+        self.assertEqual(self.cache.get('test_1'), self.beer_fact)
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 0, 'size': 1})
+
+    def test__get__after_ttl__returns_none(self):
+        self.cache.set('test_1', self.beer_fact)
+        self.clock.now = 100
+
+        self.assertIsNone(self.cache.get('test_1'))
+
+    def test__get_stale__after_ttl__returns_beer_fact(self):
+        self.cache.set('test_1', self.beer_fact)
+        self.clock.now = 100
+        self.cache.get('test_1')
+
+        self.assertEqual(self.cache.get_stale('test_1'), self.beer_fact)
+        self.assertEqual(self.cache.random_stale(), self.beer_fact)
+
+    def test__get_stale__empty_beer_fact__returns_none(self):
+        self.cache.set('missing', self.empty_beer_fact)
+
+        self.assertIsNone(self.cache.get_stale('missing'))
+        self.assertIsNone(self.cache.random_stale())
+
+    def test__get__empty_beer_fact__expires_after_negative_ttl(self):
+        self.cache.set('missing', self.empty_beer_fact)
+        self.clock.now = 9
+        self.assertEqual(self.cache.get('missing'), self.empty_beer_fact)
+
+        self.clock.now = 10
+        self.assertIsNone(self.cache.get('missing'))
+
+    def test__set__over_max_size__evicts_least_recently_used(self):
+        self.cache.set('a', self.beer_fact)
+        self.cache.set('b', self.beer_fact)
+        self.cache.get('a')
+        self.cache.set('c', self.beer_fact)
+
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
+
+    def test__get__shared_backend__returns_beer_fact_set_by_other_cache(self):
+        shared = LocMemCache('test-beer-cache', {})
+        writer = BeerFactCache(max_size=2, ttl=100, negative_ttl=10, shared_cache=shared)
+        reader = BeerFactCache(max_size=2, ttl=100, negative_ttl=10, shared_cache=shared)
+        writer.set('test_1', self.beer_fact)
+
+        self.assertEqual(reader.get('test_1'), self.beer_fact)
+        self.assertEqual(reader.stats(), {'hits': 1, 'misses': 0, 'size': 1})
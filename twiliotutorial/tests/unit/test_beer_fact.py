@@ -0,0 +1,45 @@
+import pickle
+
+from django.test import SimpleTestCase
+
+from twiliotutorial.beer import BeerFact
+
+
+class BeerFactTestCase(SimpleTestCase):
+    """Test BeerFact keeps only what we use and formats it once."""
+
+    def setUp(self) -> None:
+        self.beer_fact = BeerFact(id='test_1', name='test', abv='5.5', ibu='40',
+                                  style={'id': 1, 'name': 'Pale Ale', 'description': 'test_description'})
+
+    def test__init__keeps_only_style_description(self):
+        self.assertEqual(self.beer_fact.style_description, 'test_description')
+        self.assertFalse(hasattr(self.beer_fact, '__dict__'))
+
+    def test__say_lines__populated__includes_abv_and_description(self):
+        self.assertEqual(self.beer_fact.say_lines, ('Our beer today is test', 'Coming in at 5.5 percent.',
+                                                    'test_description'))
+
+    def test__say_lines__no_abv_or_style__only_names_beer(self):
+        beer_fact = BeerFact(id='test_1', name='test', abv=None, ibu=None, style=dict())
+
+        self.assertEqual(beer_fact.say_lines, ('Our beer today is test',))
+
+    def test__text_body__formats_name_abv_ibu(self):
+        self.assertEqual(self.beer_fact.text_body, 'Hi there! You were listening to: test, 5.5%, IBU: 40')
+
+    def test__setattr__raises(self):
+        with self.assertRaises(AttributeError):
+            self.beer_fact.name = 'other'
+
+    def test__eq__same_fields__equal_and_same_hash(self):
+        other = BeerFact(id='test_1', name='test', abv='5.5', ibu='40', style={'description': 'test_description'})
+
+        self.assertEqual(self.beer_fact, other)
+        self.assertEqual(hash(self.beer_fact), hash(other))
+
+    def test__pickle__round_trips(self):
+        beer_fact = pickle.loads(pickle.dumps(self.beer_fact))
+
+        self.assertEqual(beer_fact, self.beer_fact)
+        self.assertEqual(beer_fact.say_lines, self.beer_fact.say_lines)
@@ -0,0 +1,104 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from twiliotutorial.beer import BeerFact
+from twiliotutorial.beer_pool import RandomBeerPool
+
+
+class CountingFetch:
+    def __init__(self, empty=False):
+        self.calls = 0
+        self.empty = empty
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.calls += 1
+            beer_id = None if self.empty else 'test_%s' % self.calls
+        return BeerFact(id=beer_id, name='test', abv=1.0, ibu=99, style=None)
+
+
+class RandomBeerPoolTestCase(SimpleTestCase):
+    """Test RandomBeerPool refills and falls back. Since we dont have a Database, use SimpleTestCase"""
+
+    def wait_for_refill(self, pool):
+        deadline = time.monotonic() + 5
+        while pool.metrics()['in_flight'] and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+    def test__refill__empty_pool__fills_to_high_watermark(self):
+        fetch = CountingFetch()
+        pool = RandomBeerPool(fetch=fetch, low_watermark=2, high_watermark=5, refill_concurrency=2)
+        pool.refill()
+        self.wait_for_refill(pool)
+
+        self.assertEqual(pool.metrics()['depth'], 5)
+        self.assertEqual(fetch.calls, 5)
+
+    def test__get__pool_filled__returns_pooled_beer_without_fetching(self):
+        fetch = CountingFetch()
+        pool = RandomBeerPool(fetch=fetch, low_watermark=2, high_watermark=5, refill_concurrency=2)
+        pool.refill()
+        self.wait_for_refill(pool)
+
+        beer_fact = pool.get()
+
+        self.assertEqual(beer_fact.id, 'test_1')
+        self.assertEqual(fetch.calls, 5)
+        self.assertEqual(pool.metrics()['fallbacks'], 0)
+
+    def test__get__below_low_watermark__refills(self):
+        fetch = CountingFetch()
+        pool = RandomBeerPool(fetch=fetch, low_watermark=4, high_watermark=5, refill_concurrency=1)
+        pool.refill()
+        self.wait_for_refill(pool)
+
+        pool.get()
+        pool.get()
+        self.wait_for_refill(pool)
+
+        self.assertEqual(pool.metrics()['depth'], 5)
+        self.assertEqual(fetch.calls, 7)
+
+    def test__get__empty_pool__falls_back_to_direct_fetch(self):
+        fetch = mock.Mock(return_value=BeerFact(id='direct', name='test', abv=None, ibu=None, style=None))
+        pool = RandomBeerPool(fetch=fetch, low_watermark=0, high_watermark=0, refill_concurrency=1)
+
+        beer_fact = pool.get()
+
+        self.assertEqual(beer_fact.id, 'direct')
+        self.assertEqual(pool.metrics()['fallbacks'], 1)
+
+    def test__refill__upstream_returns_empty__does_not_pool_and_waits_before_retrying(self):
+        fetch = CountingFetch(empty=True)
+        pool = RandomBeerPool(fetch=fetch, low_watermark=1, high_watermark=3, refill_concurrency=1,
+                              retry_interval=60)
+        pool.refill()
+        self.wait_for_refill(pool)
+        pool.refill()
+        self.wait_for_refill(pool)
+
+        self.assertEqual(pool.metrics()['depth'], 0)
+        self.assertEqual(fetch.calls, 3)
+
+    def test__metrics__refill_in_progress__reports_refill_lag(self):
+        release = threading.Event()
+        now = [10.0]
+
+        def slow_fetch():
+            release.wait(5)
+            return BeerFact(id='test', name='test', abv=None, ibu=None, style=None)
+
+        pool = RandomBeerPool(fetch=slow_fetch, low_watermark=1, high_watermark=1, refill_concurrency=1,
+                              clock=lambda: now[0])
+        pool.refill()
+        now[0] = 12.5
+
+        self.assertEqual(pool.metrics()['refill_lag_seconds'], 2.5)
+        release.set()
+        self.wait_for_refill(pool)
+        self.assertEqual(pool.metrics()['refill_lag_seconds'], 2.5)
+        self.assertEqual(pool.metrics()['depth'], 1)
@@ -0,0 +1,125 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from twiliotutorial.beer import BeerFact, get_beer
+from twiliotutorial.beer_cache import reset_beer_fact_cache
+from twiliotutorial.beer_snapshot import (BeerSnapshot, SnapshotBeer, read_snapshot, refresh_snapshot,
+                                          reset_beer_snapshot, write_snapshot)
+
+
+def make_page(beer_ids, page=1, pages=1):
+    return {
+        'currentPage': page,
+        'numberOfPages': pages,
+        'data': [{'id': beer_id, 'name': 'name_' + beer_id, 'abv': '5.0', 'style': {'description': 'hoppy'}}
+                 for beer_id in beer_ids]
+    }
+
+
+class BeerSnapshotTestCase(SimpleTestCase):
+    """Test writing, refreshing and serving the local beer snapshot."""
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'beers.jsonl')
+        overrides = override_settings(BEER_BACKEND='snapshot', BEER_SNAPSHOT_PATH=self.path)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        reset_beer_snapshot()
+        self.addCleanup(reset_beer_snapshot)
+        reset_beer_fact_cache()
+        self.beer_fact = BeerFact(id='a', name='name_a', abv='5.0', ibu=None, style={'description': 'hoppy'})
+
+    def test__write_snapshot__read_snapshot__round_trips(self):
+        write_snapshot(self.path, [self.beer_fact], updated_at=123.0)
+
+        facts, updated_at = read_snapshot(self.path)
+
+        self.assertEqual(facts, [self.beer_fact])
+        self.assertEqual(facts[0].say_lines, self.beer_fact.say_lines)
+        self.assertEqual(updated_at, 123.0)
+
+    def test__write_snapshot__readable_by_other_users(self):
+        write_snapshot(self.path, [self.beer_fact], updated_at=123.0)
+
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o644)
+
+    @mock.patch('twiliotutorial.beer.Beer.get_beer_fact_from_api')
+    def test__refresh_snapshot__no_snapshot__fetches_every_page(self, mock_get):
+        mock_get.side_effect = [make_page(['a', 'b'], 1, 2), make_page(['c'], 2, 2)]
+
+        total, fetched = refresh_snapshot(self.path, clock=lambda: 1000.0)
+
+        self.assertEqual((total, fetched), (3, 3))
+        self.assertNotIn('since', mock_get.call_args_list[0][1]['params'])
+        self.assertEqual(mock_get.call_args_list[1][1]['params']['p'], 2)
+
+    @mock.patch('twiliotutorial.beer.Beer.get_beer_fact_from_api')
+    def test__refresh_snapshot__recent_snapshot__only_fetches_changes(self, mock_get):
+        write_snapshot(self.path, [self.beer_fact, BeerFact(id='b', name='old_b', abv=None, ibu=None, style=None)],
+                       updated_at=1000.0)
+        mock_get.return_value = make_page(['b', 'c'])
+
+        total, fetched = refresh_snapshot(self.path, clock=lambda: 2000.0)
+
+        self.assertEqual((total, fetched), (3, 2))
+        self.assertEqual(mock_get.call_args_list[0][1]['params']['since'], 1000)
+        facts, updated_at = read_snapshot(self.path)
+        self.assertEqual({fact.id: fact.name for fact in facts}, {'a': 'name_a', 'b': 'name_b', 'c': 'name_c'})
+        self.assertEqual(updated_at, 2000.0)
+
+    @mock.patch('twiliotutorial.beer.Beer.get_beer_fact_from_api')
+    def test__refresh_snapshot__api_down__keeps_old_snapshot(self, mock_get):
+        write_snapshot(self.path, [self.beer_fact], updated_at=1000.0)
+        mock_get.return_value = {}
+
+        with self.assertRaises(IOError):
+            refresh_snapshot(self.path, clock=lambda: 2000.0)
+        self.assertEqual(read_snapshot(self.path), ([self.beer_fact], 1000.0))
+
+    def test__get_beer__snapshot_backend__returns_snapshot_beer(self):
+        self.assertIsInstance(get_beer(), SnapshotBeer)
+
+    @mock.patch('twiliotutorial.beer.Beer.get_beer_fact_from_api')
+    def test__snapshot_beer__serves_lookups_without_api(self, mock_get):
+        write_snapshot(self.path, [self.beer_fact], updated_at=1000.0)
+
+        beer = get_beer()
+
+        self.assertEqual(beer.get_random_beer_fact(), self.beer_fact)
+        self.assertEqual(beer.get_beer_by_id('a'), self.beer_fact)
+        self.assertFalse(mock_get.called)
+
+    @mock.patch('twiliotutorial.beer.Beer.get_beer_fact_from_api')
+    def test__snapshot_beer__unknown_id__asks_api(self, mock_get):
+        write_snapshot(self.path, [self.beer_fact], updated_at=1000.0)
+        mock_get.return_value = make_page(['new'])
+
+        beer_fact = get_beer().get_beer_by_id('new')
+
+        self.assertEqual(beer_fact.name, 'name_new')
+        self.assertEqual(mock_get.call_count, 1)
+
+    def test__beer_snapshot__random__picks_from_all_beers(self):
+        facts = [BeerFact(id=str(number), name='beer', abv=None, ibu=None, style=None) for number in range(3)]
+        snapshot = BeerSnapshot(facts)
+
+        picked = {snapshot.random().id for _ in range(200)}
+
+        self.assertEqual(picked, {'0', '1', '2'})
+
+    @mock.patch('twiliotutorial.beer.Beer.get_beer_fact_from_api')
+    def test__export_beer_snapshot_command__writes_snapshot(self, mock_get):
+        mock_get.return_value = make_page(['a'])
+        out = StringIO()
+
+        call_command('export_beer_snapshot', '--full', stdout=out)
+
+        self.assertIn('Wrote 1 beers', out.getvalue())
+        self.assertEqual(read_snapshot(self.path)[0], [self.beer_fact])
@@ -1,6 +1,6 @@
 from unittest import mock
 
-from django.test import SimpleTestCase, RequestFactory
+from django.test import SimpleTestCase, RequestFactory, override_settings
 
 from twiliotutorial.beer import BeerFact
 from twiliotutorial.views import BeerFactView
@@ -84,6 +84,21 @@ class BeerFactViewTestCase(SimpleTestCase):
 
         self.assertEqual(response.to_xml(), expected_response)
 
+    def test__build_response__empty_beer_fact__apologises_and_hangs_up(self):
+        beer_fact = BeerFact(id=None, name=None, abv=None, ibu=None, style=None)
+        view = BeerFactView()
+        response = view.build_response(beer_fact)
+
+        expected_response = '<?xml version="1.0" encoding="UTF-8"?>' \
+                            '<Response>' \
+                            '<Say voice="Polly.Brian">Hello! I am going to drop a dank beer on you.</Say>' \
+                            '<Say voice="Polly.Brian">Sorry, I can\'t find any beer right now. ' \
+                            'Please call back later.</Say>' \
+                            '<Hangup />' \
+                            '</Response>'
+
+        self.assertEqual(response.to_xml(), expected_response)
+
     @mock.patch('twiliotutorial.views.Beer.get_random_beer_fact', autospec=True)
     def test__get_beer_fact__returns_beer_fact(self, mock_random_beer_fact):
         expected_beer_fact = BeerFact(name='test', id='test_1', abv=1.0, ibu=99,
@@ -94,6 +109,17 @@ class BeerFactViewTestCase(SimpleTestCase):
         beer_fact = view.get_beer_fact()
         self.assertEqual(beer_fact, expected_beer_fact)
 
+    @override_settings(BEER_POOL_ENABLED=True)
+    @mock.patch('twiliotutorial.views.get_random_beer_pool')
+    def test__get_beer_fact__pool_enabled__returns_beer_fact_from_pool(self, mock_get_random_beer_pool):
+        expected_beer_fact = BeerFact(name='test', id='test_1', abv=1.0, ibu=99,
+                                      style=dict(description='test_description'))
+
+        mock_get_random_beer_pool.return_value.get.return_value = expected_beer_fact
+        view = BeerFactView()
+        beer_fact = view.get_beer_fact()
+        self.assertEqual(beer_fact, expected_beer_fact)
+
     @mock.patch('twiliotutorial.views.Beer.get_random_beer_fact', autospec=True)
     def test__post__request_with_valid_query_params__returns_content_type_text_xml(self, mock_random_beer_fact):
         expected_beer_fact = BeerFact(name='test', id='test_1', abv=1.0, ibu=99,
@@ -1,8 +1,10 @@
 from unittest import mock
 
-from django.test import SimpleTestCase, RequestFactory
+from django.test import SimpleTestCase, RequestFactory, override_settings
 
 from twiliotutorial.beer import BeerFact
+from twiliotutorial.rate_limiter import reset_sms_rate_limiter
+from twiliotutorial.sms_queue import SmsJob, SmsQueueFull
 from twiliotutorial.views import BeerTextView
 
 
@@ -10,6 +12,8 @@ class BeerTextViewTestCase(SimpleTestCase):
     """Test BeerTextView class. Since we dont have a Database, use SimpleTestCase"""
 
     def setUp(self) -> None:
+        reset_sms_rate_limiter()
+        self.addCleanup(reset_sms_rate_limiter)
         self.beer_fact = BeerFact(name='test', id='test_1', abv=1.0, ibu=99,
                                   style=dict(description='test_description'))
 
@@ -19,7 +23,7 @@ class BeerTextViewTestCase(SimpleTestCase):
         expected_text_body = f'Hi there! You were listening to: {self.beer_fact.name}, {self.beer_fact.abv}%, IBU: {self.beer_fact.ibu}'
         self.assertEqual(text_body, expected_text_body)
 
-    @mock.patch('twiliotutorial.views.Client', autospec=True)
+    @mock.patch('twiliotutorial.views.get_twilio_client')
     def test__text_beer_info_to_number__populated_beer_fact__calls_message_creat_with_args(self, mock_twilio_client):
         assertable_mock = mock.Mock()
         mock_twilio_client.return_value = assertable_mock
@@ -32,7 +36,7 @@ class BeerTextViewTestCase(SimpleTestCase):
                          mock.call(body='Hi there! You were listening to: test, 1.0%, IBU: 99', from_='8675309',
                                    to='5551234'))
 
-    @mock.patch('twiliotutorial.views.Client', autospec=True)
+    @mock.patch('twiliotutorial.views.get_twilio_client')
     def test__text_beer_info_to_number__populated_beer_fact_no_abv__calls_message_creat_with_args(self,
                                                                                                   mock_twilio_client):
         assertable_mock = mock.Mock()
@@ -47,7 +51,7 @@ class BeerTextViewTestCase(SimpleTestCase):
                         mock.call(body='Hi there! You were listening to: test, Unknown, IBU: 99', from_='8675309',
                                   to='5551234'))
 
-    @mock.patch('twiliotutorial.views.Client', autospec=True)
+    @mock.patch('twiliotutorial.views.get_twilio_client')
     def test__text_beer_info_to_number__populated_beer_fact_no_ibu__calls_message_creat_with_args(self,
                                                                                                   mock_twilio_client):
         assertable_mock = mock.Mock()
@@ -102,6 +106,7 @@ class BeerTextViewTestCase(SimpleTestCase):
         self.assertFalse(mock_text_beer_info_to_number.called)
         self.assertEqual(response.content, expected_response_data)
 
+    @override_settings(SMS_QUEUE_BACKEND='')
     @mock.patch('twiliotutorial.views.BeerTextView.text_beer_info_to_number', autospec=True)
     @mock.patch('twiliotutorial.views.BeerTextView.get_beer_fact_for_beer_id', autospec=True)
     def test__post__request_with_valid_query_params__calls_text_beer_info_to_number_with_params_returns_content(self,
@@ -120,3 +125,65 @@ class BeerTextViewTestCase(SimpleTestCase):
                          mock.call(view, beer_fact=self.beer_fact, from_='8675309',
                                    to_='5551234'))
         self.assertEqual(response.content, expected_response_data)
+
+    @mock.patch('twiliotutorial.views.get_sms_dispatcher')
+    @mock.patch('twiliotutorial.views.BeerTextView.text_beer_info_to_number', autospec=True)
+    def test__post__request_with_valid_query_params__queues_text_returns_content(self,
+                                                                                 mock_text_beer_info_to_number,
+                                                                                 mock_get_sms_dispatcher):
+        expected_response_data = b'<?xml version="1.0" encoding="UTF-8"?><Response />'
+
+        rf = RequestFactory()
+        request = rf.post('test/path', {'From': '8675309', 'To': '5551234', 'CallSid': 'CA123'},
+                          QUERY_STRING='beerid=test_id')
+        view = BeerTextView()
+        response = view.post(request)
+
+        self.assertFalse(mock_text_beer_info_to_number.called)
+        self.assertEqual(mock_get_sms_dispatcher.return_value.enqueue.call_args_list[0],
+                         mock.call(dedupe_key='CA123:test_id', beer_id='test_id', from_='8675309', to_='5551234',
+                                   call_sid='CA123'))
+        self.assertEqual(response.content, expected_response_data)
+
+    @override_settings(SMS_QUEUE_BACKEND='', SMS_RATE_LIMIT_PER_NUMBER=1, SMS_RATE_LIMIT_PER_NUMBER_BURST=1,
+                       SMS_RATE_LIMIT_GLOBAL=0)
+    @mock.patch('twiliotutorial.views.get_sms_dispatcher')
+    @mock.patch('twiliotutorial.views.BeerTextView.text_beer_info_to_number', autospec=True)
+    @mock.patch('twiliotutorial.views.BeerTextView.get_beer_fact_for_beer_id', autospec=True)
+    def test__post__sending_number_over_rate_limit__queues_text(self, get_beer_fact_for_beer_id,
+                                                               mock_text_beer_info_to_number, mock_get_sms_dispatcher):
+        get_beer_fact_for_beer_id.return_value = self.beer_fact
+
+        for call_sid in ('CA1', 'CA2'):
+            request = RequestFactory().post('test/path', {'From': '8675309', 'To': '5551234', 'CallSid': call_sid},
+                                            QUERY_STRING='beerid=test_id')
+            BeerTextView().post(request)
+
+        self.assertEqual(mock_text_beer_info_to_number.call_count, 1)
+        self.assertEqual(mock_get_sms_dispatcher.return_value.enqueue.call_args_list,
+                         [mock.call(dedupe_key='CA2:test_id', beer_id='test_id', from_='8675309', to_='5551234',
+                                    call_sid='CA2')])
+
+    @mock.patch('twiliotutorial.views.get_sms_dispatcher')
+    def test__post__sms_queue_full__returns_content(self, mock_get_sms_dispatcher):
+        expected_response_data = b'<?xml version="1.0" encoding="UTF-8"?><Response />'
+        mock_get_sms_dispatcher.return_value.enqueue.side_effect = SmsQueueFull('CA123:test_id')
+
+        rf = RequestFactory()
+        request = rf.post('test/path', {'From': '8675309', 'To': '5551234', 'CallSid': 'CA123'},
+                          QUERY_STRING='beerid=test_id')
+        response = BeerTextView().post(request)
+
+        self.assertEqual(response.content, expected_response_data)
+
+    @mock.patch('twiliotutorial.views.BeerTextView.text_beer_info_to_number', autospec=True)
+    @mock.patch('twiliotutorial.views.BeerTextView.get_beer_fact_for_beer_id', autospec=True)
+    def test__send_queued_text__looks_up_beer_and_texts_number(self, get_beer_fact_for_beer_id,
+                                                              mock_text_beer_info_to_number):
+        get_beer_fact_for_beer_id.return_value = self.beer_fact
+        job = SmsJob(dedupe_key='CA123:test_1', beer_id='test_1', from_='8675309', to_='5551234', attempts=0)
+
+        BeerTextView.send_queued_text(job)
+
+        self.assertEqual(mock_text_beer_info_to_number.call_args_list[0],
+                         mock.call(mock.ANY, beer_fact=self.beer_fact, from_='8675309', to_='5551234'))
@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+from unittest import skipUnless
+
+from django.test import SimpleTestCase
+
+from benchmarks.suite import BASELINE_PATH, build_scenarios, compare, measured_on, process_tree, resident_memory_mb
+
+# A parent that starts a child which sleeps, and prints the child's pid
+PARENT_CODE = ('import subprocess, sys, time\n'
+               'child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])\n'
+               'print(child.pid, flush=True)\n'
+               'child.wait()\n')
+
+
+class BenchmarkSuiteTestCase(SimpleTestCase):
+    """Test the committed baseline still matches the suite's scenarios, so --compare checks every one."""
+
+    def test__baseline__covers_every_scenario(self):
+        with open(BASELINE_PATH) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        self.assertEqual(set(baseline['results']), set(build_scenarios(1, ['beer0'])))
+        self.assertEqual(compare(baseline['results'], baseline['results'], tolerance=0), [])
+        self.assertEqual(set(baseline['measured_on']), set(measured_on('runserver')))
+
+    def test__compare__p95_doubled__reported(self):
+        baseline = {'beerfact': {'p95_ms': 50.0, 'throughput_rps': 400.0}}
+
+        regressions = compare({'beerfact': {'p95_ms': 100.0, 'throughput_rps': 400.0}}, baseline, tolerance=0.5)
+
+        self.assertEqual(regressions, ['beerfact: p95 100.0ms vs baseline 50.0ms'])
+
+    @skipUnless(os.path.exists('/proc/%s/task/%s/children' % (os.getpid(), os.getpid())),
+                'needs /proc/<pid>/task/<tid>/children')
+    def test__resident_memory_mb__includes_children(self):
+        parent = subprocess.Popen([sys.executable, '-c', PARENT_CODE], stdout=subprocess.PIPE,
+                                  universal_newlines=True)
+        self.addCleanup(parent.wait)
+        child_pid = int(parent.stdout.readline())
+        self.addCleanup(parent.stdout.close)
+        self.addCleanup(os.kill, child_pid, 9)
+
+        self.assertEqual(process_tree(parent.pid), [parent.pid, child_pid])
+        self.assertGreater(resident_memory_mb(parent.pid), resident_memory_mb(child_pid))
@@ -0,0 +1,137 @@
+from unittest import mock
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from twiliotutorial.beer import BeerFact
+from twiliotutorial.call_session import CallSessionStore, get_call_sessions, reset_call_sessions
+from twiliotutorial.rate_limiter import reset_sms_rate_limiter
+from twiliotutorial.sms_queue import SmsJob
+from twiliotutorial.views import BeerFactView, BeerTextView, InteractiveVoiceResponseView, PlayAgain
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CallSessionStoreTestCase(SimpleTestCase):
+    """Test CallSessionStore expiry, eviction and the shared backend."""
+
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.store = CallSessionStore(ttl=100, max_size=2, clock=self.clock)
+
+    def test__get__missing__returns_empty_session(self):
+        self.assertEqual(self.store.get('CA1'), {})
+
+    def test__update__merges_values(self):
+        self.store.update('CA1', digits='42')
+        self.store.update('CA1', beer_id='abc')
+
+        self.assertEqual(self.store.get('CA1'), {'digits': '42', 'beer_id': 'abc'})
+
+    def test__get__returns_copy(self):
+        self.store.update('CA1', digits='42')
+        self.store.get('CA1')['digits'] = '7'
+
+        self.assertEqual(self.store.get('CA1'), {'digits': '42'})
+
+    def test__get__after_ttl__returns_empty_session(self):
+        self.store.update('CA1', digits='42')
+        self.clock.now = 100
+
+        self.assertEqual(self.store.get('CA1'), {})
+        self.assertEqual(self.store.size(), 0)
+
+    def test__update__over_max_size__evicts_least_recently_used(self):
+        self.store.update('CA1', digits='1')
+        self.store.update('CA2', digits='2')
+        self.store.get('CA1')
+        self.store.update('CA3', digits='3')
+
+        self.assertEqual(self.store.get('CA2'), {})
+        self.assertEqual(self.store.get('CA1'), {'digits': '1'})
+
+    def test__get__shared_backend__reads_session_written_by_other_store(self):
+        shared_cache = LocMemCache('call-session-test', {})
+        beer_fact = BeerFact(name='test', id='test_1', abv=1.0, ibu=99, style=None)
+        CallSessionStore(ttl=100, max_size=2, shared_cache=shared_cache).update('CA1', beer_fact=beer_fact)
+
+        store = CallSessionStore(ttl=100, max_size=2, shared_cache=shared_cache)
+        self.assertEqual(store.get('CA1'), {'beer_fact': beer_fact})
+
+        store.delete('CA1')
+        self.assertEqual(CallSessionStore(ttl=100, max_size=2, shared_cache=shared_cache).get('CA1'), {})
+
+
+class CallSessionViewsTestCase(SimpleTestCase):
+    """Test that the IVR views keep state per CallSid and reuse it."""
+
+    def setUp(self) -> None:
+        reset_call_sessions()
+        self.addCleanup(reset_call_sessions)
+        reset_sms_rate_limiter()
+        self.addCleanup(reset_sms_rate_limiter)
+        self.beer_fact = BeerFact(name='test', id='test_1', abv=1.0, ibu=99, style=None)
+
+    def test__callback__digits__session_not_written(self):
+        request = RequestFactory().post('/callback', {'Digits': '42', 'CallSid': 'CA1'})
+        InteractiveVoiceResponseView().post(request)
+
+        self.assertEqual(get_call_sessions().get('CA1'), {})
+
+    def test__play_again__hang_up__deletes_session(self):
+        get_call_sessions().update('CA1', digits='42')
+        PlayAgain().post(RequestFactory().post('/play-again', {'Digits': '2', 'CallSid': 'CA1'}))
+
+        self.assertEqual(get_call_sessions().get('CA1'), {})
+
+    @mock.patch('twiliotutorial.views.BeerFactView.get_beer_fact', autospec=True)
+    def test__beerfact__same_call_twice__fetches_beer_once(self, mock_get_beer_fact):
+        mock_get_beer_fact.return_value = self.beer_fact
+        request = RequestFactory().post('/beerfact', {'CallSid': 'CA1'})
+        first = BeerFactView().post(request)
+        second = BeerFactView().post(request)
+
+        self.assertEqual(mock_get_beer_fact.call_count, 1)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(get_call_sessions().get('CA1'), {'beer_fact': self.beer_fact})
+
+    @mock.patch('twiliotutorial.views.BeerFactView.get_beer_fact', autospec=True)
+    def test__beerfact__empty_beer_fact__not_saved(self, mock_get_beer_fact):
+        mock_get_beer_fact.return_value = BeerFact(id=None, name=None, abv=None, ibu=None, style=None)
+        BeerFactView().post(RequestFactory().post('/beerfact', {'CallSid': 'CA1'}))
+
+        self.assertEqual(get_call_sessions().get('CA1'), {})
+
+    @override_settings(SMS_QUEUE_BACKEND='')
+    @mock.patch('twiliotutorial.views.BeerTextView.text_beer_info_to_number', autospec=True)
+    @mock.patch('twiliotutorial.views.BeerTextView.get_beer_fact_for_beer_id', autospec=True)
+    def test__beertext__beer_in_session__not_looked_up(self, get_beer_fact_for_beer_id,
+                                                       mock_text_beer_info_to_number):
+        get_call_sessions().update('CA1', beer_fact=self.beer_fact)
+        request = RequestFactory().post('/beertext', {'From': '8675309', 'To': '5551234', 'CallSid': 'CA1'},
+                                        QUERY_STRING='beerid=test_1')
+        view = BeerTextView()
+        view.post(request)
+
+        self.assertFalse(get_beer_fact_for_beer_id.called)
+        self.assertEqual(mock_text_beer_info_to_number.call_args_list[0],
+                         mock.call(view, beer_fact=self.beer_fact, from_='8675309', to_='5551234'))
+
+    @mock.patch('twiliotutorial.views.BeerTextView.text_beer_info_to_number', autospec=True)
+    @mock.patch('twiliotutorial.views.BeerTextView.get_beer_fact_for_beer_id', autospec=True)
+    def test__send_queued_text__beer_in_session__not_looked_up(self, get_beer_fact_for_beer_id,
+                                                               mock_text_beer_info_to_number):
+        get_call_sessions().update('CA1', beer_fact=self.beer_fact)
+        job = SmsJob(dedupe_key='CA1:test_1', beer_id='test_1', from_='8675309', to_='5551234', attempts=0,
+                     call_sid='CA1')
+
+        BeerTextView.send_queued_text(job)
+
+        self.assertFalse(get_beer_fact_for_beer_id.called)
+        self.assertEqual(mock_text_beer_info_to_number.call_args[1]['beer_fact'], self.beer_fact)
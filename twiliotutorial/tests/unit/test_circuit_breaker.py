@@ -0,0 +1,76 @@
+from django.test import SimpleTestCase
+
+from twiliotutorial.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTestCase(SimpleTestCase):
+    """Test CircuitBreaker state changes."""
+
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker('test', failure_rate=0.5, minimum_requests=4, window=10, open_seconds=5,
+                                      clock=self.clock)
+
+    def fail(self, times: int) -> None:
+        for _ in range(times):
+            self.breaker.record_failure()
+
+    def test__record_failure__below_minimum_requests__stays_closed(self):
+        self.fail(3)
+
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test__record_failure__failure_rate_reached__opens_and_rejects(self):
+        self.breaker.record_success()
+        self.breaker.record_success()
+        self.fail(2)
+
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.rejected, 1)
+
+    def test__record_failure__old_failures_outside_window__stays_closed(self):
+        self.fail(3)
+        self.clock.now = 10
+        self.breaker.record_success()
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test__allow__after_open_seconds__lets_one_probe_through(self):
+        self.fail(4)
+        self.clock.now = 5
+
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test__record_success__probe_succeeds__closes(self):
+        self.fail(4)
+        self.clock.now = 5
+        self.breaker.allow()
+        self.breaker.record_success()
+
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test__record_failure__probe_fails__opens_again(self):
+        self.fail(4)
+        self.clock.now = 5
+        self.breaker.allow()
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, OPEN)
+        self.clock.now = 9
+        self.assertFalse(self.breaker.allow())
+        self.clock.now = 10
+        self.assertTrue(self.breaker.allow())
@@ -0,0 +1,188 @@
+import threading
+from socketserver import ThreadingMixIn
+from unittest import mock
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.core.wsgi import get_wsgi_application
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from twiliotutorial.dialer import OutboundDialer, twilio_call_placer
+from twiliotutorial.tests.stubs import StubServer, TwilioStubHandler
+from twiliotutorial.twilio_client import reset_twilio_client
+from twiliotutorial.views import CallStatusView
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class OutboundDialerTestCase(SimpleTestCase):
+    """Test the dialer's pacing, in-flight cap and retries."""
+
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.placed = []
+
+    def place_call(self, to):
+        self.placed.append(to)
+        return 'CA%s' % len(self.placed)
+
+    def make_dialer(self, rate=100, max_in_flight=10, max_attempts=3, retry_delay=60, call_timeout=3600):
+        return OutboundDialer(place_call=self.place_call, rate=rate, max_in_flight=max_in_flight,
+                              max_attempts=max_attempts, retry_delay=retry_delay, call_timeout=call_timeout,
+                              clock=self.clock)
+
+    def test__dial_due__paced__one_call_per_token(self):
+        dialer = self.make_dialer(rate=2)
+        for number in ('+15550001', '+15550002', '+15550003'):
+            dialer.enqueue(number)
+
+        self.assertEqual(dialer.dial_due(), 0.5)
+        self.clock.now = 0.5
+        dialer.dial_due()
+
+        self.assertEqual(self.placed, ['+15550001', '+15550002'])
+
+    def test__dial_due__max_in_flight__waits_for_a_call_to_finish(self):
+        dialer = self.make_dialer(max_in_flight=2)
+        for number in ('+15550001', '+15550002', '+15550003'):
+            dialer.enqueue(number)
+        dialer.dial_due()
+        self.clock.now = 1
+
+        self.assertIsNone(dialer.dial_due())
+        self.assertEqual(len(self.placed), 2)
+        dialer.status_update('CA1', 'in-progress')
+        dialer.dial_due()
+        self.assertEqual(len(self.placed), 2)
+
+        dialer.status_update('CA1', 'completed')
+        self.clock.now = 2
+        dialer.dial_due()
+        self.assertEqual(self.placed, ['+15550001', '+15550002', '+15550003'])
+        self.assertEqual(dialer.call_state('+15550001')['status'], 'completed')
+
+    def test__status_update__busy__called_again_after_retry_delay(self):
+        dialer = self.make_dialer(retry_delay=60)
+        dialer.enqueue('+15550001')
+        dialer.dial_due()
+        dialer.status_update('CA1', 'busy')
+
+        self.assertEqual(dialer.dial_due(), 60)
+        self.assertEqual(dialer.call_state('+15550001')['status'], 'retrying')
+        self.clock.now = 60
+        dialer.dial_due()
+        self.assertEqual(dialer.call_state('+15550001'), {'number': '+15550001', 'attempts': 2,
+                                                          'status': 'dialing', 'call_sid': 'CA2'})
+
+    def test__status_update__no_answer_every_time__gives_up_after_max_attempts(self):
+        dialer = self.make_dialer(max_attempts=2, retry_delay=10)
+        dialer.enqueue('+15550001')
+        dialer.dial_due()
+        dialer.status_update('CA1', 'no-answer')
+        self.clock.now = 10
+        dialer.dial_due()
+        dialer.status_update('CA2', 'no-answer')
+
+        self.assertIsNone(dialer.dial_due())
+        self.assertEqual(dialer.call_state('+15550001')['status'], 'gave-up')
+        self.assertEqual(dialer.gave_up, 1)
+
+    def test__status_update__before_place_call_returns__applied(self):
+        dialer = None
+
+        def place_call(to):
+            dialer.status_update('CA1', 'completed')
+            return 'CA1'
+
+        dialer = OutboundDialer(place_call=place_call, rate=100, max_in_flight=1, max_attempts=3, retry_delay=60,
+                                clock=self.clock)
+        dialer.enqueue('+15550001')
+        dialer.dial_due()
+
+        self.assertEqual(dialer.call_state('+15550001')['status'], 'completed')
+        self.assertEqual(dialer.metrics()['in_flight'], 0)
+
+    def test__dial_due__callback_never_comes__slot_freed_after_call_timeout(self):
+        dialer = self.make_dialer(max_in_flight=1, call_timeout=120)
+        dialer.enqueue('+15550001')
+        dialer.enqueue('+15550002')
+        dialer.dial_due()
+
+        self.clock.now = 120
+        dialer.dial_due()
+
+        self.assertEqual(self.placed, ['+15550001', '+15550002'])
+        self.assertEqual(dialer.call_state('+15550001')['status'], 'retrying')
+
+    def test__place_call_raises__retried(self):
+        dialer = OutboundDialer(place_call=mock.Mock(side_effect=IOError('twilio is down')), rate=100,
+                                max_in_flight=1, max_attempts=3, retry_delay=60, clock=self.clock)
+        dialer.enqueue('+15550001')
+
+        self.assertEqual(dialer.dial_due(), 60)
+        self.assertEqual(dialer.call_state('+15550001')['attempts'], 1)
+
+    @mock.patch('twiliotutorial.views.get_outbound_dialer')
+    def test__call_status_view__updates_dialer(self, mock_get_outbound_dialer):
+        request = RequestFactory().post('/call-status', {'CallSid': 'CA1', 'CallStatus': 'completed'})
+
+        response = CallStatusView().post(request)
+
+        self.assertEqual(response.status_code, 204)
+        mock_get_outbound_dialer.return_value.status_update.assert_called_once_with('CA1', 'completed')
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class OutboundDialerEndToEndTestCase(SimpleTestCase):
+    """Test calls placed through a local Twilio stand-in, which posts status callbacks back to the app."""
+
+    def setUp(self) -> None:
+        self.twilio = StubServer(TwilioStubHandler).start()
+        self.addCleanup(self.twilio.stop)
+        self.twilio.call_duration = 0.02
+        self.app = make_server('127.0.0.1', 0, get_wsgi_application(), server_class=ThreadingWSGIServer,
+                               handler_class=QuietWSGIRequestHandler)
+        threading.Thread(target=self.app.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        self.addCleanup(self.app.server_close)
+        self.addCleanup(self.app.shutdown)
+        self.app_url = 'http://127.0.0.1:%s' % self.app.server_port
+        overrides = override_settings(TWILIO_API_BASE_URL=self.twilio.url, TWILIO_ACCOUNT_SID='ACtest',
+                                      TWILIO_ACCOUNT_TOKEN='token', TWILIO_VALIDATE_SIGNATURES=False)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        reset_twilio_client()
+        self.addCleanup(reset_twilio_client)
+
+    def test__dialer__calls_numbers_and_follows_status_callbacks(self):
+        self.twilio.call_outcomes = {'+15550002': ['busy'], '+15550003': ['no-answer', 'no-answer']}
+        dialer = OutboundDialer(place_call=twilio_call_placer('+15005550006', self.app_url), rate=50,
+                                max_in_flight=2, max_attempts=2, retry_delay=0.05)
+        self.addCleanup(dialer.stop)
+
+        with mock.patch('twiliotutorial.views.get_outbound_dialer', return_value=dialer):
+            for number in ('+15550001', '+15550002', '+15550003', '+15550004'):
+                dialer.enqueue(number)
+            dialer.start()
+            self.assertTrue(dialer.wait_until_idle(10))
+
+        states = {number: dialer.call_state(number) for number in ('+15550001', '+15550002', '+15550003',
+                                                                    '+15550004')}
+        self.assertEqual({number: (state['status'], state['attempts']) for number, state in states.items()},
+                         {'+15550001': ('completed', 1), '+15550002': ('completed', 2),
+                          '+15550003': ('gave-up', 2), '+15550004': ('completed', 1)})
+        call = self.twilio.received[0]
+        self.assertEqual((call['Url'], call['StatusCallback']), (self.app_url + '/callback',
+                                                                 self.app_url + '/call-status'))
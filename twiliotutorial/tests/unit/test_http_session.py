@@ -0,0 +1,64 @@
+import threading
+
+from django.test import SimpleTestCase, override_settings
+
+from twiliotutorial import http_session
+from twiliotutorial.beer import Beer
+from twiliotutorial.circuit_breaker import reset_beer_api_breaker
+from twiliotutorial.tests.stubs import BeerApiStubHandler, StubServer
+
+
+@override_settings(BEER_API_POOL_SIZE=4, BEER_API_MAX_RETRIES=0)
+class HttpSessionTestCase(SimpleTestCase):
+    """Test the shared Beer API session against a local stub server."""
+
+    def setUp(self) -> None:
+        self.server = StubServer(BeerApiStubHandler).start()
+        self.addCleanup(self.server.stop)
+        self.url = self.server.url + '/v2/beer/random'
+        http_session.reset_session()
+        self.addCleanup(http_session.reset_session)
+        reset_beer_api_breaker()
+        self.addCleanup(reset_beer_api_breaker)
+
+    def test__get_session__returns_same_session(self):
+        self.assertIs(http_session.get_session(), http_session.get_session())
+
+    def test__get_beer_fact_from_api__many_beer_instances__reuses_one_connection(self):
+        for _ in range(10):
+            result = Beer().get_beer_fact_from_api(self.url, {'key': 'test'})
+            self.assertIn('id', result['data'])
+
+        self.assertEqual(self.server.counts['requests'], 10)
+        self.assertEqual(self.server.counts['connections'], 1)
+
+    def test__get_beer_fact_from_api__threaded__connections_bounded_by_pool_size(self):
+        barrier = threading.Barrier(4)
+
+        def worker():
+            barrier.wait()
+            for _ in range(25):
+                Beer().get_beer_fact_from_api(self.url, {'key': 'test'})
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.server.counts['requests'], 100)
+        self.assertLessEqual(self.server.counts['connections'], 4)
+
+    @override_settings(BEER_API_MAX_RETRIES=2)
+    def test__get_beer_fact_from_api__503__not_retried(self):
+        self.server.failing = True
+
+        self.assertEqual(Beer().get_beer_fact_from_api(self.url, {'key': 'test'}), {})
+        self.assertEqual(self.server.counts['requests'], 1)
+
+    @override_settings(BEER_API_MAX_RETRIES=2, BEER_API_READ_TIMEOUT=0.1)
+    def test__get_beer_fact_from_api__read_timeout__not_retried(self):
+        self.server.latency = 0.3
+
+        self.assertEqual(Beer().get_beer_fact_from_api(self.url, {'key': 'test'}), {})
+        self.assertEqual(self.server.counts['requests'], 1)
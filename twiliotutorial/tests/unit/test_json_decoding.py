@@ -0,0 +1,33 @@
+import json
+
+from django.test import SimpleTestCase, override_settings
+
+from twiliotutorial.json_decoding import DecodeError, get_decoder, loads, preview
+
+
+class DecoderTestCase(SimpleTestCase):
+    """Test picking a JSON decoder."""
+
+    def test__get_decoder__json__returns_json_loads(self):
+        self.assertIs(get_decoder('json'), json.loads)
+
+    def test__get_decoder__unknown__raises_value_error(self):
+        with self.assertRaises(ValueError):
+            get_decoder('simplejson')
+
+    @override_settings(BEER_API_JSON_DECODER='json')
+    def test__loads__bad_json__raises_decode_error(self):
+        with self.assertRaises(DecodeError):
+            loads(b'{"data"')
+
+    def test__loads__not_json__raises_decode_error(self):
+        for content in (b'<html>', b'{"data": [{"id": "a"} {"id": "b"}]}', b'{"data": [', b'{1: 2}'):
+            with self.subTest(content=content), self.assertRaises(DecodeError):
+                loads(content)
+
+    def test__loads__auto__decodes_bytes(self):
+        self.assertEqual(loads(b'{"data": [1]}'), {'data': [1]})
+
+    def test__preview__long_content__truncates(self):
+        self.assertEqual(preview(b'x' * 300, length=10), b'xxxxxxxxxx...')
+        self.assertEqual(preview('short'), 'short')
@@ -0,0 +1,85 @@
+import threading
+
+from django.test import SimpleTestCase
+
+from twiliotutorial.metrics import Histogram, Registry, webhook_latency
+
+
+class HistogramTestCase(SimpleTestCase):
+    """Test Histogram bucketing, sharding and Prometheus output."""
+
+    def setUp(self) -> None:
+        self.histogram = Histogram('test_seconds', 'Test latency.', 'endpoint', buckets=(0.1, 1.0))
+
+    def test__observe__counts_into_buckets_and_sum(self):
+        self.histogram.observe('a', 0.05)
+        self.histogram.observe('a', 0.1)
+        self.histogram.observe('a', 0.5)
+        self.histogram.observe('a', 3.0)
+
+        self.assertEqual(self.histogram.collect(), {'a': [2, 1, 1, 3.65]})
+
+    def test__observe__many_threads__adds_up_every_shard(self):
+        def worker():
+            for _ in range(1000):
+                self.histogram.observe('a', 0.5)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.histogram.collect()['a'][:3], [0, 8000, 0])
+        # Every thread has finished, so their shards are folded away
+        self.assertEqual(self.histogram._shards, [])
+
+    def test__exposition__cumulative_buckets(self):
+        self.histogram.observe('a', 0.05)
+        self.histogram.observe('a', 0.5)
+
+        self.assertEqual(self.histogram.exposition(), [
+            '# HELP test_seconds Test latency.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{endpoint="a",le="0.1"} 1',
+            'test_seconds_bucket{endpoint="a",le="1.0"} 2',
+            'test_seconds_bucket{endpoint="a",le="+Inf"} 2',
+            'test_seconds_sum{endpoint="a"} 0.55',
+            'test_seconds_count{endpoint="a"} 2',
+        ])
+
+    def test__registry_exposition__includes_callbacks(self):
+        registry = Registry()
+        registry.register_callback('test_depth', 'Test depth.', 'gauge', lambda: 3)
+
+        self.assertEqual(registry.exposition(), '# HELP test_depth Test depth.\n# TYPE test_depth gauge\n'
+                                                'test_depth 3.0\n')
+
+    def test__registry_exposition__extra_labels_on_every_series(self):
+        registry = Registry()
+        registry.register_callback('test_depth', 'Test depth.', 'gauge', lambda: 3)
+        registry.histogram('test_seconds', 'Test latency.', 'endpoint').observe('a', 0.5)
+
+        lines = registry.exposition('worker="7"').splitlines()
+
+        self.assertIn('test_seconds_count{endpoint="a",worker="7"} 1', lines)
+        self.assertIn('test_depth{worker="7"} 3.0', lines)
+
+
+class MetricsEndpointTestCase(SimpleTestCase):
+    """Test the timing middleware and /metrics view."""
+
+    @staticmethod
+    def count(endpoint):
+        counts = webhook_latency.collect().get(endpoint)
+        return sum(counts[:-1]) if counts else 0
+
+    def test__webhook_request__recorded_and_exposed(self):
+        before = self.count('play-again')
+
+        self.client.post('/play-again', {'Digits': '2'})
+        response = self.client.get('/metrics')
+
+        self.assertEqual(self.count('play-again'), before + 1)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4')
+        self.assertIn(b'twiliotutorial_webhook_request_seconds_count{endpoint="play-again"}', response.content)
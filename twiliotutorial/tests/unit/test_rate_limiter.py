@@ -0,0 +1,108 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from twiliotutorial.rate_limiter import InMemoryTokenBuckets, SmsRateLimiter, SqliteTokenBuckets
+from twiliotutorial.sms_queue import InMemorySmsBackend, SmsDispatcher
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_limiter(buckets, per_number_rate=1, per_number_burst=1, global_rate=0, global_burst=1):
+    return SmsRateLimiter(buckets=buckets, per_number_rate=per_number_rate, per_number_burst=per_number_burst,
+                          global_rate=global_rate, global_burst=global_burst)
+
+
+class SmsRateLimiterTestCase(SimpleTestCase):
+    """Test the token bucket limits on outbound SMS."""
+
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+
+    def test__reserve__burst_used__returns_wait_for_next_token(self):
+        limiter = make_limiter(InMemoryTokenBuckets(clock=self.clock), per_number_rate=2, per_number_burst=2)
+
+        self.assertEqual([limiter.reserve('+15005550006') for _ in range(3)], [0, 0, 0.5])
+        self.assertEqual(limiter.deferred, 1)
+
+    def test__reserve__other_number__has_own_bucket(self):
+        limiter = make_limiter(InMemoryTokenBuckets(clock=self.clock))
+        limiter.reserve('+15005550006')
+
+        self.assertEqual(limiter.reserve('+15005550007'), 0)
+
+    def test__reserve__global_limit_empty__number_token_not_taken(self):
+        limiter = make_limiter(InMemoryTokenBuckets(clock=self.clock), per_number_rate=1, global_rate=1)
+        limiter.reserve('+15005550006')
+
+        self.assertGreater(limiter.reserve('+15005550007'), 0)
+        self.clock.now = 1
+        self.assertEqual(limiter.reserve('+15005550007'), 0)
+
+    def test__reserve__no_limits__returns_zero(self):
+        limiter = make_limiter(InMemoryTokenBuckets(clock=self.clock), per_number_rate=0)
+
+        self.assertEqual([limiter.reserve('+15005550006') for _ in range(100)], [0] * 100)
+
+    def test__reserve__sustained_load__holds_configured_rate(self):
+        limiter = make_limiter(InMemoryTokenBuckets(clock=self.clock), per_number_rate=5, per_number_burst=3)
+        sent = 0
+        # A send tried every 1/128th of a second (exact in binary) for a minute
+        for tick in range(128 * 60 + 1):
+            self.clock.now = tick / 128
+            if limiter.reserve('+15005550006') == 0:
+                sent += 1
+
+        self.assertEqual(sent, 3 + 5 * 60)
+
+    def test__reserve__sqlite_buckets__shared_between_processes(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'rate.sqlite3')
+        first = SqliteTokenBuckets(path=path, clock=self.clock)
+        second = SqliteTokenBuckets(path=path, clock=self.clock)
+        self.addCleanup(first.close)
+        self.addCleanup(second.close)
+
+        self.assertEqual(make_limiter(first).reserve('+15005550006'), 0)
+        self.assertEqual(make_limiter(second).reserve('+15005550006'), 1)
+        self.clock.now = 1
+        self.assertEqual(make_limiter(second).reserve('+15005550006'), 0)
+
+
+class RateLimitedSmsDispatcherTestCase(SimpleTestCase):
+    """Test the dispatcher holds a sending number to its rate under a backlog."""
+
+    def test__enqueue__backlog__sent_at_configured_rate(self):
+        rate = 20
+        jobs = 21
+        sent_at = []
+        attempts = []
+        done = threading.Event()
+
+        def send(job):
+            sent_at.append(time.monotonic())
+            attempts.append(job.attempts)
+            if len(sent_at) == jobs:
+                done.set()
+
+        limiter = make_limiter(InMemoryTokenBuckets(), per_number_rate=rate, per_number_burst=1)
+        dispatcher = SmsDispatcher(backend=InMemorySmsBackend(capacity=100), send=send, workers=4, max_attempts=1,
+                                   backoff=1, rate_limiter=limiter)
+        self.addCleanup(dispatcher.stop)
+        for number in range(jobs):
+            dispatcher.enqueue(dedupe_key='CA%s:beer' % number, beer_id='beer', from_='8675309', to_='5551234')
+
+        self.assertTrue(done.wait(10))
+        # One token to start with, then one every 1/rate seconds
+        self.assertGreaterEqual(sent_at[-1] - sent_at[0], (jobs - 1) / rate * 0.95)
+        self.assertEqual(attempts, [0] * jobs)
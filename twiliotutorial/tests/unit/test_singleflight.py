@@ -0,0 +1,149 @@
+import asyncio
+import threading
+
+from django.test import SimpleTestCase, override_settings
+
+from twiliotutorial import http_session
+from twiliotutorial.async_beer import AsyncBeer
+from twiliotutorial.async_http import close_async_session
+from twiliotutorial.beer import Beer
+from twiliotutorial.beer_cache import reset_beer_fact_cache
+from twiliotutorial.random_beer_batch import RandomBeerBatch, reset_random_beer_batch
+from twiliotutorial.singleflight import AsyncSingleFlight, SingleFlight
+from twiliotutorial.tests.stubs import BeerApiStubHandler, StubServer
+
+
+def run_threads(count, target):
+    barrier = threading.Barrier(count)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(target())
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class SingleFlightTestCase(SimpleTestCase):
+    """Test SingleFlight and AsyncSingleFlight."""
+
+    def test__do__concurrent_same_key__calls_fn_once(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            release.wait(5)
+            return 'result'
+
+        threading.Timer(0.2, release.set).start()
+        results = run_threads(5, lambda: flight.do('key', fn))
+
+        self.assertEqual(results, ['result'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.shared, 4)
+
+    def test__do__fn_raises__waiters_get_exception_and_next_call_runs_again(self):
+        flight = SingleFlight()
+
+        with self.assertRaises(IOError):
+            flight.do('key', lambda: (_ for _ in ()).throw(IOError('down')))
+        self.assertEqual(flight.do('key', lambda: 'result'), 'result')
+
+    def test__do__async_concurrent_same_key__calls_fn_once(self):
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'result'
+
+        async def main():
+            return await asyncio.gather(*(flight.do('key', fn) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(main()), ['result'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.shared, 4)
+
+    def test__do__async_caller_cancelled__others_still_get_result(self):
+        flight = AsyncSingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.05)
+            return 'result'
+
+        async def main():
+            first = asyncio.ensure_future(flight.do('key', fn))
+            second = asyncio.ensure_future(flight.do('key', fn))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        self.assertEqual(asyncio.run(main()), 'result')
+
+
+class RandomBeerBatchTestCase(SimpleTestCase):
+    """Test handing out random beers fetched in batches."""
+
+    def test__get__hands_out_each_beer_of_a_batch_once(self):
+        batch = RandomBeerBatch(batch_size=3)
+        sizes = []
+
+        def fetch_batch(count):
+            sizes.append(count)
+            return ['beer%s-%s' % (len(sizes), number) for number in range(count)]
+
+        beers = [batch.get(fetch_batch) for _ in range(4)]
+
+        self.assertEqual(beers, ['beer1-0', 'beer1-1', 'beer1-2', 'beer2-0'])
+        self.assertEqual(sizes, [3, 3])
+
+    def test__get__fetch_returns_nothing__returns_none(self):
+        self.assertIsNone(RandomBeerBatch(batch_size=3).get(lambda count: []))
+
+
+@override_settings(BEER_API_MAX_RETRIES=0)
+class CoalescedBeerLookupTestCase(SimpleTestCase):
+    """Test that concurrent lookups against a slow stub Beer API share their calls."""
+
+    def setUp(self) -> None:
+        self.server = StubServer(BeerApiStubHandler, latency=0.2).start()
+        self.addCleanup(self.server.stop)
+        overrides = override_settings(BEER_API_URL=self.server.url)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        reset_beer_fact_cache()
+        reset_random_beer_batch()
+        http_session.reset_session()
+        self.addCleanup(http_session.reset_session)
+
+    def test__get_beer_by_id__concurrent_same_id__one_api_call(self):
+        facts = run_threads(10, lambda: Beer().get_beer_by_id('abc123'))
+
+        self.assertEqual({fact.id for fact in facts}, {'abc123'})
+        self.assertEqual(self.server.counts['requests'], 1)
+
+    def test__get_beer_by_id__async_concurrent_same_id__one_api_call(self):
+        async def main():
+            facts = await asyncio.gather(*(AsyncBeer().get_beer_by_id('abc123') for _ in range(10)))
+            await close_async_session()
+            return facts
+
+        facts = asyncio.run(main())
+
+        self.assertEqual({fact.id for fact in facts}, {'abc123'})
+        self.assertEqual(self.server.counts['requests'], 1)
+
+    @override_settings(BEER_RANDOM_BATCH_SIZE=5)
+    def test__get_random_beer_fact__batched__one_api_call_per_batch(self):
+        facts = run_threads(10, lambda: Beer().get_random_beer_fact())
+
+        self.assertEqual(len({fact.id for fact in facts}), 10)
+        self.assertEqual(self.server.counts['requests'], 2)
@@ -0,0 +1,106 @@
+import json
+import os
+import tempfile
+import threading
+
+from django.test import SimpleTestCase, override_settings
+
+from twiliotutorial.sms_campaign import CampaignCheckpoint, CampaignError, SmsCampaign, read_recipients, twilio_sender
+from twiliotutorial.tests.stubs import StubServer, TwilioStubHandler
+from twiliotutorial.twilio_client import reset_twilio_client
+
+BODY = 'Hi there! You were listening to: test, 1.0%, IBU: 99'
+
+
+class SmsCampaignTestCase(SimpleTestCase):
+    """Test campaigns send to every recipient once and resume where they stopped."""
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.recipients = os.path.join(directory.name, 'recipients.csv')
+        self.checkpoint_path = os.path.join(directory.name, 'checkpoint.json')
+
+    def write_recipients(self, lines):
+        with open(self.recipients, 'w') as recipients_file:
+            recipients_file.write('\n'.join(lines) + '\n')
+
+    def make_checkpoint(self):
+        return CampaignCheckpoint(self.checkpoint_path, self.recipients, BODY)
+
+    def test__read_recipients__csv_with_comments__yields_numbers_with_line_numbers(self):
+        self.write_recipients(['# subscribers', '+15550001,Ann', '', '+15550002'])
+
+        self.assertEqual(list(read_recipients(self.recipients)), [(1, '+15550001'), (3, '+15550002')])
+        self.assertEqual(list(read_recipients(self.recipients, start_line=2)), [(3, '+15550002')])
+
+    def test__done__out_of_order__next_line_stops_at_first_gap(self):
+        checkpoint = self.make_checkpoint()
+        checkpoint.done(1, sent=True)
+        checkpoint.done(2, sent=True)
+
+        self.assertEqual(checkpoint.next_line, 0)
+        checkpoint.done(0, sent=False)
+        self.assertEqual((checkpoint.next_line, checkpoint.sent, checkpoint.failed), (3, 2, 1))
+
+    def test__run__sends_to_every_recipient(self):
+        self.write_recipients(['#'] + ['+1555%04d' % number for number in range(200)])
+        sent = []
+        lock = threading.Lock()
+
+        def send(to):
+            with lock:
+                sent.append(to)
+
+        checkpoint = SmsCampaign(self.make_checkpoint(), send=send, workers=8).run()
+
+        self.assertEqual(sorted(sent), ['+1555%04d' % number for number in range(200)])
+        self.assertEqual((checkpoint.next_line, checkpoint.sent), (201, 200))
+        with open(self.checkpoint_path) as checkpoint_file:
+            self.assertEqual(json.load(checkpoint_file)['next_line'], 201)
+
+    def test__run__stopped_then_resumed__every_recipient_sent(self):
+        self.write_recipients(['+1555%04d' % number for number in range(100)])
+        sent = []
+        campaign = None
+
+        def send(to):
+            sent.append(to)
+            if len(sent) == 30:
+                campaign.stop()
+
+        campaign = SmsCampaign(self.make_checkpoint(), send=send, workers=1)
+        campaign.run()
+        checkpoint = CampaignCheckpoint.resume(self.checkpoint_path, self.recipients)
+        SmsCampaign(checkpoint, send=sent.append, workers=4).run()
+
+        self.assertEqual(checkpoint.body, BODY)
+        self.assertEqual(set(sent), {'+1555%04d' % number for number in range(100)})
+        self.assertLessEqual(len(sent), 100 + 8)
+
+    def test__resume__other_recipients_file__raises(self):
+        self.write_recipients(['+15550001'])
+        self.make_checkpoint().save()
+
+        with self.assertRaises(CampaignError):
+            CampaignCheckpoint.resume(self.checkpoint_path, self.recipients + '.other')
+
+    @override_settings(TWILIO_ACCOUNT_SID='ACtest', TWILIO_ACCOUNT_TOKEN='token')
+    def test__run__fake_twilio_failing_then_back__retries_and_sends(self):
+        server = StubServer(TwilioStubHandler).start()
+        self.addCleanup(server.stop)
+        server.failing = True
+        timer = threading.Timer(0.05, lambda: setattr(server, 'failing', False))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        reset_twilio_client()
+        self.addCleanup(reset_twilio_client)
+        self.write_recipients(['+15550001', '+15550002'])
+
+        with override_settings(TWILIO_API_BASE_URL=server.url, TWILIO_MAX_RETRIES=0):
+            checkpoint = SmsCampaign(self.make_checkpoint(), send=twilio_sender('+15005550006', BODY), workers=2,
+                                     max_attempts=5, backoff=0.05).run()
+
+        self.assertEqual((checkpoint.sent, checkpoint.failed), (2, 0))
+        self.assertEqual(sorted(form['To'] for form in server.received), ['+15550001', '+15550002'])
+        self.assertEqual({form['Body'] for form in server.received}, {BODY})
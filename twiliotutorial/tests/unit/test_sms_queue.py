@@ -0,0 +1,188 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from twiliotutorial.sms_queue import (InMemorySmsBackend, SmsDispatcher, SmsJob, SmsQueueFull, SqliteSmsBackend,
+                                      get_sms_dispatcher, stop_sms_dispatcher)
+
+
+def make_job(dedupe_key='CA1:beer'):
+    return SmsJob(dedupe_key=dedupe_key, beer_id='beer', from_='8675309', to_='5551234', attempts=0, call_sid='CA1')
+
+
+class InMemorySmsBackendTestCase(SimpleTestCase):
+    """Test the in-process sms queue."""
+
+    def setUp(self) -> None:
+        self.now = 0.0
+        self.backend = InMemorySmsBackend(capacity=2, clock=lambda: self.now)
+
+    def test__put__duplicate_key__returns_false(self):
+        self.assertTrue(self.backend.put(make_job()))
+        self.assertFalse(self.backend.put(make_job()))
+        self.assertEqual(self.backend.size(), 1)
+
+    def test__put__after_ack__duplicate_key_still_rejected(self):
+        self.backend.put(make_job())
+        self.backend.ack(self.backend.get(timeout=0))
+
+        self.assertFalse(self.backend.put(make_job()))
+
+    def test__put__over_capacity__raises(self):
+        self.backend.put(make_job('a'))
+        self.backend.put(make_job('b'))
+
+        with self.assertRaises(SmsQueueFull):
+            self.backend.put(make_job('c'))
+
+    def test__get__retried_job__not_returned_before_delay(self):
+        self.backend.put(make_job())
+        self.backend.retry(self.backend.get(timeout=0), delay=10)
+
+        self.assertIsNone(self.backend.get(timeout=0))
+        self.now = 10
+        self.assertEqual(self.backend.get(timeout=0).attempts, 1)
+
+
+class SqliteSmsBackendTestCase(SimpleTestCase):
+    """Test the sqlite sms queue keeps jobs across restarts."""
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'sms.sqlite3')
+
+    def open_backend(self, clock=time.time):
+        backend = SqliteSmsBackend(path=self.path, capacity=10, poll_interval=0.01, lease_seconds=60, clock=clock)
+        self.addCleanup(backend.close)
+        return backend
+
+    def test__put__duplicate_key__returns_false(self):
+        backend = self.open_backend()
+
+        self.assertTrue(backend.put(make_job()))
+        self.assertFalse(backend.put(make_job()))
+
+    def test__get__after_restart__returns_pending_job(self):
+        self.open_backend().put(make_job())
+
+        job = self.open_backend().get(timeout=0)
+
+        self.assertEqual(job, make_job())
+
+    def test__get__queue_file_without_call_sids__job_has_none(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute("CREATE TABLE sms_jobs (dedupe_key TEXT PRIMARY KEY, beer_id TEXT, from_number TEXT, "
+                           "to_number TEXT, attempts INTEGER NOT NULL DEFAULT 0, not_before REAL NOT NULL, "
+                           "status TEXT NOT NULL)")
+        connection.execute("INSERT INTO sms_jobs VALUES ('CA1:beer', 'beer', '8675309', '5551234', 0, 0, 'pending')")
+        connection.commit()
+        connection.close()
+
+        job = self.open_backend().get(timeout=0)
+
+        self.assertEqual(job, make_job()._replace(call_sid=None))
+
+    def test__get__in_flight_in_live_worker__not_taken_by_another(self):
+        now = [0.0]
+        backend = self.open_backend(clock=lambda: now[0])
+        backend.put(make_job())
+        backend.get(timeout=0)
+
+        sibling = self.open_backend(clock=lambda: now[0])
+        now[0] = 59
+        self.assertIsNone(sibling.get(timeout=0))
+        now[0] = 60
+        self.assertEqual(sibling.get(timeout=0).dedupe_key, 'CA1:beer')
+
+    def test__get__in_flight_when_owner_died__job_is_sent_again(self):
+        backend = self.open_backend()
+        backend.put(make_job())
+        backend.get(timeout=0)
+        exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+        exited.wait()
+        with sqlite3.connect(self.path) as connection:
+            connection.execute("UPDATE sms_jobs SET owner_pid = ?", (exited.pid,))
+
+        job = self.open_backend().get(timeout=0)
+
+        self.assertEqual(job.dedupe_key, 'CA1:beer')
+
+    def test__ack__job_not_returned_again(self):
+        backend = self.open_backend()
+        backend.put(make_job())
+        backend.ack(backend.get(timeout=0))
+
+        self.assertIsNone(backend.get(timeout=0))
+        self.assertEqual(backend.size(), 0)
+
+
+class SmsDispatcherTestCase(SimpleTestCase):
+    """Test SmsDispatcher retries and acks."""
+
+    def test__enqueue__send_fails_then_succeeds__retries_with_backoff(self):
+        sent = threading.Event()
+        attempts = []
+
+        def send(job):
+            attempts.append(job.attempts)
+            if job.attempts == 0:
+                raise IOError('twilio is down')
+            sent.set()
+
+        backend = InMemorySmsBackend(capacity=10)
+        dispatcher = SmsDispatcher(backend=backend, send=send, workers=1, max_attempts=3, backoff=0.01)
+        self.addCleanup(dispatcher.stop)
+        dispatcher.enqueue(dedupe_key='CA1:beer', beer_id='beer', from_='8675309', to_='5551234')
+
+        self.assertTrue(sent.wait(5))
+        self.assertEqual(attempts, [0, 1])
+
+    def test__enqueue__send_always_fails__gives_up_after_max_attempts(self):
+        attempts = []
+        done = threading.Event()
+
+        def send(job):
+            attempts.append(job.attempts)
+            if len(attempts) == 2:
+                done.set()
+            raise IOError('twilio is down')
+
+        backend = InMemorySmsBackend(capacity=10)
+        dispatcher = SmsDispatcher(backend=backend, send=send, workers=1, max_attempts=2, backoff=0.01)
+        self.addCleanup(dispatcher.stop)
+        dispatcher.enqueue(dedupe_key='CA1:beer', beer_id='beer', from_='8675309', to_='5551234')
+
+        self.assertTrue(done.wait(5))
+        dispatcher.stop()
+        self.assertEqual(attempts, [0, 1])
+        self.assertEqual(backend.size(), 0)
+
+    def test__backoff_for__doubles_up_to_max(self):
+        dispatcher = SmsDispatcher(backend=None, send=None, workers=1, max_attempts=5, backoff=1, max_backoff=5)
+
+        self.assertEqual([dispatcher.backoff_for(attempts) for attempts in range(5)], [1, 2, 4, 5, 5])
+
+    @override_settings(SMS_QUEUE_BACKEND='memory', SMS_QUEUE_WORKERS=1)
+    def test__stop_sms_dispatcher__send_in_progress__finished_first(self):
+        sending = threading.Event()
+        sent = []
+
+        def send(job):
+            sending.set()
+            time.sleep(0.2)
+            sent.append(job.dedupe_key)
+
+        self.addCleanup(stop_sms_dispatcher)
+        get_sms_dispatcher(send).enqueue(dedupe_key='CA1:beer', beer_id='beer', from_='8675309', to_='5551234')
+        self.assertTrue(sending.wait(5))
+
+        stop_sms_dispatcher()
+
+        self.assertEqual(sent, ['CA1:beer'])
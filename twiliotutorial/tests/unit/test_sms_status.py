@@ -0,0 +1,137 @@
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from twiliotutorial.beer import BeerFact
+from twiliotutorial.sms_status import (SmsStatusBuffer, SqliteSmsStatusStore, get_sms_status_buffer,
+                                       reset_sms_status_buffer)
+from twiliotutorial.views import BeerTextView, SmsDeliveryRatesView, SmsStatusView
+
+
+class SmsStatusStoreTestCase(SimpleTestCase):
+    """Test the sqlite store keeps each message's furthest status and counts delivery per beer."""
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = SqliteSmsStatusStore(os.path.join(directory.name, 'status.sqlite3'))
+        self.addCleanup(self.store.close)
+
+    def test__write__out_of_order__keeps_furthest_status(self):
+        self.store.write([('SM1', 'delivered', 'beer', None, 2.0), ('SM1', 'sent', 'beer', None, 1.0)])
+
+        self.assertEqual(self.store.delivery_rates()['beer']['delivered'], 1)
+
+    def test__delivery_rates__counts_per_beer(self):
+        self.store.write([('SM1', 'delivered', 'ale', None, 1.0), ('SM2', 'undelivered', 'ale', '30003', 1.0),
+                          ('SM3', 'failed', 'ale', '30006', 1.0), ('SM4', 'delivered', 'ale', None, 1.0),
+                          ('SM5', 'sent', 'stout', None, 1.0)])
+
+        self.assertEqual(self.store.delivery_rates(), {
+            'ale': {'messages': 4, 'delivered': 2, 'not_delivered': 2, 'pending': 0, 'delivery_rate': 0.5},
+            'stout': {'messages': 1, 'delivered': 0, 'not_delivered': 0, 'pending': 1, 'delivery_rate': None},
+        })
+
+
+class SmsStatusBufferTestCase(SimpleTestCase):
+    """Test callbacks are buffered and written in batches."""
+
+    def setUp(self) -> None:
+        self.store = mock.Mock()
+
+    def make_buffer(self, batch_size=3, max_buffered=10):
+        buffer = SmsStatusBuffer(self.store, batch_size=batch_size, flush_interval=60, max_buffered=max_buffered,
+                                 clock=lambda: 1.0)
+        self.addCleanup(buffer.stop)
+        return buffer
+
+    def test__add__below_batch_size__not_written(self):
+        buffer = self.make_buffer()
+        buffer.add('SM1', 'sent', beer_id='ale')
+
+        self.assertFalse(self.store.write.called)
+        self.assertEqual(buffer.buffered(), 1)
+
+    def test__add__batch_size_reached__written_in_one_batch(self):
+        buffer = self.make_buffer()
+        for number in range(3):
+            buffer.add('SM%s' % number, 'delivered', beer_id='ale')
+        buffer.stop()
+
+        self.store.write.assert_called_once_with([('SM0', 'delivered', 'ale', None, 1.0),
+                                                  ('SM1', 'delivered', 'ale', None, 1.0),
+                                                  ('SM2', 'delivered', 'ale', None, 1.0)])
+
+    def test__add__buffer_full__dropped(self):
+        buffer = self.make_buffer(batch_size=100, max_buffered=2)
+
+        self.assertEqual([buffer.add('SM%s' % number, 'sent') for number in range(3)], [True, True, False])
+        self.assertEqual(buffer.dropped, 1)
+
+    def test__flush__store_fails__updates_kept_for_next_flush(self):
+        buffer = self.make_buffer(batch_size=100)
+        buffer.add('SM1', 'sent')
+        self.store.write.side_effect = [IOError('disk full'), None]
+
+        self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(self.store.write.call_args_list[1], mock.call([('SM1', 'sent', None, None, 1.0)]))
+
+
+class SmsStatusViewsTestCase(SimpleTestCase):
+    """Test /sms-status takes Twilio's callbacks and /sms-delivery reports on them."""
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = override_settings(SMS_STATUS_PATH=os.path.join(directory.name, 'status.sqlite3'))
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        reset_sms_status_buffer()
+        self.addCleanup(reset_sms_status_buffer)
+
+    def post_status(self, message_sid, status, beer_id='ale'):
+        request = RequestFactory().post('/sms-status', {'MessageSid': message_sid, 'MessageStatus': status,
+                                                        'AccountSid': 'ACtest'}, QUERY_STRING='beerid=' + beer_id)
+        return SmsStatusView().post(request)
+
+    @staticmethod
+    def get_rates(authorization=None):
+        headers = {'HTTP_AUTHORIZATION': authorization} if authorization is not None else {}
+        return SmsDeliveryRatesView().get(RequestFactory().get('/sms-delivery', **headers))
+
+    @override_settings(SMS_DELIVERY_REPORT_TOKEN='secret', SMS_STATUS_FLUSH_INTERVAL=60)
+    def test__post__then_get_rates__counts_written_callbacks(self):
+        self.assertEqual(self.post_status('SM1', 'sent').status_code, 204)
+        self.post_status('SM1', 'delivered')
+        self.post_status('SM2', 'undelivered')
+        get_sms_status_buffer().flush()
+        self.post_status('SM3', 'delivered')
+
+        response = self.get_rates('Bearer secret')
+
+        self.assertEqual(json.loads(response.content)['ale']['messages'], 2)
+        self.assertEqual(get_sms_status_buffer().buffered(), 1)
+
+    @override_settings(SMS_DELIVERY_REPORT_TOKEN='secret')
+    def test__get_rates__wrong_token__forbidden(self):
+        self.assertEqual(self.get_rates().status_code, 403)
+        self.assertEqual(self.get_rates('Bearer guess').status_code, 403)
+
+    def test__get_rates__no_token_configured__not_found(self):
+        with self.assertRaises(Http404):
+            self.get_rates('Bearer ')
+
+    @override_settings(TWILIO_WEBHOOK_BASE_URL='https://beer.example.com')
+    @mock.patch('twiliotutorial.views.get_twilio_client')
+    def test__text_beer_info_to_number__public_url__asks_for_status_callbacks(self, mock_twilio_client):
+        beer_fact = BeerFact(name='test', id='test_1', abv=1.0, ibu=99, style=None)
+
+        BeerTextView().text_beer_info_to_number(beer_fact=beer_fact, from_='5551234', to_='8675309')
+
+        self.assertEqual(mock_twilio_client.return_value.messages.create.call_args[1]['status_callback'],
+                         'https://beer.example.com/sms-status?beerid=test_1')
@@ -0,0 +1,43 @@
+import os
+import re
+import subprocess
+import sys
+from typing import Dict
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+# Only loaded once a worker makes an outbound call, or by warmup.warm_up
+LAZY_MODULES = ('requests', 'urllib3', 'twilio.rest', 'aiohttp')
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def import_times(code: str) -> Dict[str, int]:
+    """Cumulative import time in microseconds of every module a fresh interpreter imports running code."""
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='twiliotutorial.settings', WARM_UP='false')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=settings.BASE_DIR, env=env,
+                            stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, universal_newlines=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            times[match.group(4)] = int(match.group(2))
+    return times
+
+
+class StartupTestCase(SimpleTestCase):
+    """Test what a worker imports before it serves its first request."""
+
+    def test__wsgi_application__doesnt_import_lazy_modules(self):
+        times = import_times('import twiliotutorial.wsgi, twiliotutorial.urls')
+
+        self.assertIn('twiliotutorial.views', times)
+        for module in LAZY_MODULES:
+            self.assertNotIn(module, times, "%s is imported at startup again" % module)
+
+    def test__warm_up__imports_lazy_modules(self):
+        times = import_times('import twiliotutorial.wsgi; from twiliotutorial.warmup import warm_up; warm_up()')
+
+        for module in ('requests', 'twilio.rest', 'twiliotutorial.twilio_client'):
+            self.assertIn(module, times)
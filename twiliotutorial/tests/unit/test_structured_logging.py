@@ -0,0 +1,165 @@
+import io
+import json
+import logging
+import sys
+import threading
+
+from django.test import RequestFactory, SimpleTestCase
+
+from twiliotutorial.middleware import CallSidMiddleware
+from twiliotutorial.structured_logging import (CallSidFilter, DebugSamplingFilter, JsonFormatter, QueueLogHandler,
+                                               call_sid_var)
+
+
+def make_record(message='Looking for beer id: %s', args=('abc',), level=logging.DEBUG, call_sid=None):
+    record = logging.LogRecord('root', level, __file__, 1, message, args, None)
+    record.call_sid = call_sid
+    return record
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.records.append(record)
+        self.threads.add(threading.current_thread())
+
+
+class BlockingHandler(ListHandler):
+    def __init__(self):
+        super().__init__()
+        self.entered = threading.Event()
+        self.unblock = threading.Event()
+
+    def emit(self, record):
+        self.entered.set()
+        self.unblock.wait(5)
+        super().emit(record)
+
+
+class JsonFormatterTestCase(SimpleTestCase):
+    """Test records come out as one JSON object each."""
+
+    def test__format__record_in_a_call__includes_call_sid(self):
+        entry = json.loads(JsonFormatter().format(make_record(call_sid='CA1')))
+
+        self.assertEqual((entry['level'], entry['message'], entry['call_sid']), ('DEBUG', 'Looking for beer id: abc',
+                                                                                 'CA1'))
+
+    def test__format__exception__includes_traceback(self):
+        try:
+            raise ValueError('no beer')
+        except ValueError:
+            record = logging.LogRecord('root', logging.ERROR, __file__, 1, 'Failed', None, sys.exc_info())
+
+        entry = json.loads(JsonFormatter().format(record))
+
+        self.assertNotIn('call_sid', entry)
+        self.assertIn('ValueError: no beer', entry['exception'])
+
+
+class DebugSamplingFilterTestCase(SimpleTestCase):
+    """Test DEBUG records are sampled per call and other levels always kept."""
+
+    def test__filter__same_call__same_decision_every_time(self):
+        sampling = DebugSamplingFilter(0.5)
+        decisions = {call_sid: {sampling.filter(make_record(call_sid=call_sid)) for _ in range(5)}
+                     for call_sid in ('CA%s' % number for number in range(200))}
+
+        self.assertTrue(all(len(kept) == 1 for kept in decisions.values()))
+        self.assertTrue(60 < sum(kept == {True} for kept in decisions.values()) < 140)
+
+    def test__filter__info__always_kept(self):
+        sampling = DebugSamplingFilter(0)
+
+        self.assertFalse(sampling.filter(make_record(call_sid='CA1')))
+        self.assertTrue(sampling.filter(make_record(level=logging.INFO, call_sid='CA1')))
+
+
+class QueueLogHandlerTestCase(SimpleTestCase):
+    """Test records are written by the listener thread, and dropped rather than waited for when it is behind."""
+
+    def test__emit__written_by_listener_with_call_sid(self):
+        target = ListHandler()
+        handler = QueueLogHandler(target, capacity=10)
+        handler.addFilter(CallSidFilter())
+        self.addCleanup(handler.close)
+        token = call_sid_var.set('CA1')
+        try:
+            handler.handle(make_record())
+        finally:
+            call_sid_var.reset(token)
+        handler.flush()
+
+        self.assertEqual([(record.msg, record.call_sid) for record in target.records],
+                         [('Looking for beer id: abc', 'CA1')])
+        self.assertNotIn(threading.current_thread(), target.threads)
+
+    def test__flush__listener_keeps_running(self):
+        target = ListHandler()
+        handler = QueueLogHandler(target, capacity=10)
+        self.addCleanup(handler.close)
+        handler.handle(make_record(args=('first',)))
+        handler.flush()
+
+        handler.handle(make_record(args=('second',)))
+        handler.flush()
+
+        self.assertEqual([record.msg for record in target.records], ['Looking for beer id: first',
+                                                                     'Looking for beer id: second'])
+        self.assertEqual(len(target.threads), 1)
+        self.assertTrue(all(thread.is_alive() for thread in target.threads))
+
+    def test__close__queued_records_written(self):
+        target = BlockingHandler()
+        handler = QueueLogHandler(target, capacity=10)
+        handler.handle(make_record(args=('first',)))
+        self.assertTrue(target.entered.wait(5))
+        handler.handle(make_record(args=('queued',)))
+        target.unblock.set()
+
+        handler.close()
+
+        self.assertEqual(len(target.records), 2)
+        self.assertFalse(any(thread.is_alive() for thread in target.threads))
+
+    def test__close__target_stream_already_closed__no_error(self):
+        stream = io.StringIO()
+        handler = QueueLogHandler(logging.StreamHandler(stream), capacity=10)
+        handler.handle(make_record())
+        handler.flush()
+        stream.close()
+
+        handler.flush()
+        handler.close()
+
+    def test__emit__queue_full__dropped_and_counted(self):
+        target = BlockingHandler()
+        handler = QueueLogHandler(target, capacity=1)
+        self.addCleanup(handler.close)
+        handler.handle(make_record(args=('first',)))
+        self.assertTrue(target.entered.wait(5))
+
+        handler.handle(make_record(args=('queued',)))
+        handler.handle(make_record(args=('dropped',)))
+        target.unblock.set()
+        handler.flush()
+
+        self.assertEqual(handler.dropped, 1)
+        self.assertEqual([record.msg for record in target.records], ['Looking for beer id: first',
+                                                                     'Looking for beer id: queued'])
+
+
+class CallSidMiddlewareTestCase(SimpleTestCase):
+    """Test the CallSid is set while a webhook is handled, and only then."""
+
+    def test__call__webhook_with_call_sid__set_during_request(self):
+        middleware = CallSidMiddleware(lambda request: call_sid_var.get())
+
+        seen = middleware(RequestFactory().post('/beerfact', {'CallSid': 'CA1', 'Digits': '1'}))
+
+        self.assertEqual(seen, 'CA1')
+        self.assertIsNone(call_sid_var.get())
@@ -0,0 +1,119 @@
+import os
+import tempfile
+import wave
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from twiliotutorial.beer import BeerFact
+from twiliotutorial.tts_cache import (AudioCache, StubTtsBackend, build_tts_backend, get_audio_cache,
+                                     reset_audio_cache)
+from twiliotutorial.views import GREETING, AudioView, BeerFactView
+
+
+class AudioCacheTestCase(SimpleTestCase):
+    """Test rendered speech is kept per voice and text, and bounded in size."""
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def make_cache(self, max_bytes=10 ** 6):
+        cache = AudioCache(directory=self.directory, max_bytes=max_bytes, backend=StubTtsBackend(), base_url='/audio/')
+        self.addCleanup(cache.shutdown)
+        return cache
+
+    def test__url__not_rendered__renders_in_background(self):
+        cache = self.make_cache()
+
+        self.assertIsNone(cache.url(GREETING, 'alice'))
+        cache.shutdown(wait=True)
+        self.assertEqual(cache.url(GREETING, 'alice'), '/audio/' + cache.filename(GREETING, 'alice'))
+
+    def test__render__stub_backend__writes_wav(self):
+        cache = self.make_cache()
+
+        with wave.open(os.path.join(self.directory, cache.render(GREETING, 'alice'))) as audio:
+            self.assertGreater(audio.getnframes(), 0)
+
+    def test__filename__other_voice__other_file(self):
+        cache = self.make_cache()
+
+        self.assertEqual(cache.filename(GREETING, 'alice'), cache.filename(GREETING, 'alice'))
+        self.assertNotEqual(cache.filename(GREETING, 'alice'), cache.filename(GREETING, 'Polly.Brian'))
+
+    def test__render__over_max_bytes__evicts_least_recently_played(self):
+        cache = self.make_cache()
+        first = cache.render('first', 'alice')
+        second = cache.render('second', 'alice')
+        cache.url('first', 'alice')
+        cache.max_bytes = cache.size_bytes()
+
+        cache.render('third', 'alice')
+
+        self.assertIsNotNone(cache.path(first))
+        self.assertIsNone(cache.path(second))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, second)))
+        self.assertEqual(cache.evictions, 1)
+
+    def test__init__existing_files__served_without_rendering(self):
+        name = self.make_cache().render(GREETING, 'alice')
+
+        self.assertEqual(self.make_cache().url(GREETING, 'alice'), '/audio/' + name)
+
+    def test__path__unknown_name__returns_none(self):
+        self.assertIsNone(self.make_cache().path('../settings.py'))
+        self.assertIsNone(self.make_cache().path('0' * 64 + '.wav'))
+
+    def test__path__rendered_by_another_worker__found_on_disk(self):
+        rendering, serving = self.make_cache(), self.make_cache()
+
+        name = rendering.render(GREETING, 'alice')
+
+        self.assertEqual(serving.path(name), os.path.join(self.directory, name))
+
+    @override_settings(TTS_BACKEND='espeak')
+    def test__build_tts_backend__unknown__raises(self):
+        with self.assertRaises(ImproperlyConfigured):
+            build_tts_backend()
+
+
+class AudioViewsTestCase(SimpleTestCase):
+    """Test /beerfact plays rendered audio and /audio/ serves it."""
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = override_settings(TTS_BACKEND='stub', TTS_CACHE_DIR=directory.name, VOICE='alice')
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        reset_audio_cache()
+        self.addCleanup(reset_audio_cache)
+        # Let the renders /beerfact started finish before the directory goes
+        self.addCleanup(lambda: get_audio_cache().shutdown(wait=True))
+        self.beer_fact = BeerFact(name='test', id='test_1', abv=1.0, ibu=99, style=None)
+
+    def test__build_response__greeting_rendered__plays_it(self):
+        name = get_audio_cache().render(GREETING, 'alice')
+
+        twiml = BeerFactView().build_response(self.beer_fact).to_xml()
+
+        self.assertIn('<Play>/audio/%s</Play>' % name, twiml)
+        self.assertIn('<Say voice="alice">Our beer today is test</Say>', twiml)
+
+    @override_settings(TTS_BACKEND='')
+    def test__build_response__tts_off__says_everything(self):
+        twiml = BeerFactView().build_response(self.beer_fact).to_xml()
+
+        self.assertNotIn('<Play>', twiml)
+
+    def test__get__rendered_file__served_cacheable(self):
+        name = get_audio_cache().render(GREETING, 'alice')
+
+        response = AudioView().get(RequestFactory().get('/audio/' + name), name=name)
+
+        self.assertEqual(response['Content-Type'], 'audio/x-wav')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'RIFF'))
+        response.close()
@@ -0,0 +1,44 @@
+import threading
+
+from django.test import SimpleTestCase, override_settings
+
+from twiliotutorial import twilio_client
+from twiliotutorial.tests.stubs import StubServer, TwilioStubHandler
+
+
+@override_settings(TWILIO_ACCOUNT_SID='ACtest', TWILIO_ACCOUNT_TOKEN='token', TWILIO_POOL_SIZE=4)
+class TwilioClientTestCase(SimpleTestCase):
+    """Test the shared Twilio client against a local fake Twilio."""
+
+    def setUp(self) -> None:
+        self.server = StubServer(TwilioStubHandler).start()
+        self.addCleanup(self.server.stop)
+        twilio_client.reset_twilio_client()
+        self.addCleanup(twilio_client.reset_twilio_client)
+
+    def test__get_twilio_client__returns_same_client(self):
+        self.assertIs(twilio_client.get_twilio_client(), twilio_client.get_twilio_client())
+
+    def test__messages_create__base_url_set__posts_to_base_url(self):
+        with self.settings(TWILIO_API_BASE_URL=self.server.url):
+            message = twilio_client.get_twilio_client().messages.create(body='hi', from_='5551234', to='8675309')
+
+        self.assertTrue(message.sid.startswith('SM'))
+        self.assertEqual(self.server.received, [{'Body': 'hi', 'From': '5551234', 'To': '8675309'}])
+
+    def test__messages_create__threaded__reuses_pooled_connections(self):
+        with self.settings(TWILIO_API_BASE_URL=self.server.url):
+            client = twilio_client.get_twilio_client()
+
+        def worker():
+            for _ in range(10):
+                client.messages.create(body='hi', from_='5551234', to='8675309')
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.server.counts['requests'], 40)
+        self.assertLessEqual(self.server.counts['connections'], 4)
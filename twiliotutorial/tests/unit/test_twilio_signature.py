@@ -0,0 +1,102 @@
+import asyncio
+
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from twilio.request_validator import RequestValidator
+
+from twiliotutorial.middleware import TwilioSignatureMiddleware
+from twiliotutorial.tests.unit.test_asgi import call_asgi
+from twiliotutorial.twilio_signature import SignatureValidator, reset_signature_validator
+
+TOKEN = 'test-auth-token'
+PARAMS = {'CallSid': 'CA123', 'Digits': '1', 'From': '+18675309', 'To': '+15005550006', 'AccountSid': 'ACtest'}
+
+
+def sign(url, params):
+    return RequestValidator(TOKEN).compute_signature(url, params)
+
+
+class SignatureValidatorTestCase(SimpleTestCase):
+    """Test SignatureValidator against the twilio library's own RequestValidator."""
+
+    def setUp(self) -> None:
+        self.validator = SignatureValidator(TOKEN)
+        self.url = 'https://beer.example.com/beertext?beerid=abc123'
+        self.params = [(name, [value]) for name, value in PARAMS.items()]
+
+    def test__is_valid__signed_by_twilio__returns_true(self):
+        self.assertTrue(self.validator.is_valid(self.url, self.params, sign(self.url, PARAMS)))
+
+    def test__is_valid__param_changed__returns_false(self):
+        signature = sign(self.url, dict(PARAMS, Digits='2'))
+
+        self.assertFalse(self.validator.is_valid(self.url, self.params, signature))
+
+    def test__is_valid__other_token__returns_false(self):
+        signature = RequestValidator('other-token').compute_signature(self.url, PARAMS)
+
+        self.assertFalse(self.validator.is_valid(self.url, self.params, signature))
+
+    def test__is_valid__missing_signature__returns_false(self):
+        self.assertFalse(self.validator.is_valid(self.url, self.params, None))
+
+    def test__is_valid__signed_without_port__returns_true(self):
+        signature = sign(self.url, PARAMS)
+
+        self.assertTrue(self.validator.is_valid('https://beer.example.com:443/beertext?beerid=abc123', self.params,
+                                                signature))
+
+
+@override_settings(TWILIO_VALIDATE_SIGNATURES=True, TWILIO_ACCOUNT_TOKEN=TOKEN, TWILIO_WEBHOOK_BASE_URL=None)
+class TwilioSignatureMiddlewareTestCase(SimpleTestCase):
+    """Test that unsigned webhooks are refused before the view runs."""
+
+    def setUp(self) -> None:
+        reset_signature_validator()
+        self.addCleanup(reset_signature_validator)
+        self.views_called = []
+        self.middleware = TwilioSignatureMiddleware(lambda request: self.views_called.append(request) or
+                                                    HttpResponse('ok'))
+
+    def test__call__valid_signature__calls_view(self):
+        signature = sign('http://testserver/beertext?beerid=abc123', PARAMS)
+        request = RequestFactory().post('/beertext?beerid=abc123', PARAMS, HTTP_X_TWILIO_SIGNATURE=signature)
+
+        self.assertEqual(self.middleware(request).status_code, 200)
+        self.assertEqual(len(self.views_called), 1)
+
+    @override_settings(TWILIO_ACCOUNT_TOKEN=None)
+    def test__init__no_account_token__refuses_to_start(self):
+        reset_signature_validator()
+
+        with self.assertRaises(ImproperlyConfigured):
+            TwilioSignatureMiddleware(lambda request: HttpResponse('ok'))
+
+    def test__call__missing_signature__returns_403(self):
+        request = RequestFactory().post('/beertext?beerid=abc123', PARAMS)
+
+        self.assertEqual(self.middleware(request).status_code, 403)
+        self.assertEqual(self.views_called, [])
+
+    def test__call__wrong_signature__returns_403(self):
+        request = RequestFactory().post('/beertext?beerid=abc123', PARAMS, HTTP_X_TWILIO_SIGNATURE='bm9wZQ==')
+
+        self.assertEqual(self.middleware(request).status_code, 403)
+        self.assertEqual(self.views_called, [])
+
+    @override_settings(TWILIO_WEBHOOK_BASE_URL='https://beer.example.com')
+    def test__call__behind_proxy__validates_public_url(self):
+        signature = sign('https://beer.example.com/callback', PARAMS)
+        request = RequestFactory().post('/callback', PARAMS, HTTP_X_TWILIO_SIGNATURE=signature)
+
+        self.assertEqual(self.middleware(request).status_code, 200)
+
+    def test__call__exempt_path__calls_view(self):
+        self.assertEqual(self.middleware(RequestFactory().get('/metrics')).status_code, 200)
+
+    def test__call__asgi_route_without_signature__returns_403(self):
+        status, headers, content = asyncio.run(call_asgi('/beertext', body=b'From=8675309&To=5551234',
+                                                         query_string=b'beerid=abc123'))
+
+        self.assertEqual(status, 403)
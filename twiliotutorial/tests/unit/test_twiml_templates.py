@@ -0,0 +1,67 @@
+from django.test import SimpleTestCase, RequestFactory
+from twilio.twiml import voice_response
+
+from twiliotutorial.twiml_templates import TwimlTemplate, get_template, render_twiml
+from twiliotutorial.views import InteractiveVoiceResponseView, PlayAgain
+
+
+class TwimlTemplateTestCase(SimpleTestCase):
+    """Test TwiML templates render the same XML as VoiceResponse."""
+
+    def test__render__static_template__returns_same_bytes_each_time(self):
+        template = get_template('helloworld.xml')
+
+        self.assertEqual(template.render(), b'<?xml version="1.0" encoding="UTF-8"?>'
+                                            b'<Response><Say>Hello, World!</Say></Response>')
+        self.assertIs(template.render(), template.render())
+
+    def test__render__mustache_template__substitutes_variable(self):
+        self.assertEqual(render_twiml('mustache.xml', From='+15551234'),
+                         b'<?xml version="1.0" encoding="UTF-8"?><Response><Say>Hello, +15551234!</Say></Response>')
+
+    def test__render__variable_with_markup__is_escaped(self):
+        template = TwimlTemplate('test.xml', '<Response><Say>{{ text }}</Say><Play url="{{url}}" /></Response>')
+
+        self.assertEqual(template.render(text='<b> & "c"', url='"x"'),
+                         b'<Response><Say>&lt;b&gt; &amp; &quot;c&quot;</Say><Play url="&quot;x&quot;" /></Response>')
+
+    def test__render__missing_variable__raises(self):
+        with self.assertRaises(KeyError):
+            render_twiml('mustache.xml')
+
+    def test__interactive_voice_response__matches_voice_response(self):
+        response = voice_response.VoiceResponse()
+        gather = response.gather(action='/callback', num_digits=2, timeout=30)
+        gather.say("Pick a number between 0 and 99")
+        view = InteractiveVoiceResponseView()
+
+        self.assertEqual(view.handle_prompt().decode(), response.to_xml())
+
+        response = voice_response.VoiceResponse()
+        response.say("You picked 42")
+        response.redirect('/play-again')
+        self.assertEqual(view.handle_digits('42').decode(), response.to_xml())
+
+    def test__play_again__matches_voice_response(self):
+        view = PlayAgain()
+        response = voice_response.VoiceResponse()
+        gather = response.gather(num_digits=1, timeout=30, action='/play-again')
+        gather.say('Press 1 to run again, press 2 to hang up')
+        self.assertEqual(view.handle_prompt().decode(), response.to_xml())
+
+        response = voice_response.VoiceResponse()
+        response.redirect('/callback')
+        self.assertEqual(view.handle_digits('1').decode(), response.to_xml())
+
+        response = voice_response.VoiceResponse()
+        response.say('Goodbye')
+        response.hangup()
+        self.assertEqual(view.handle_digits('2').decode(), response.to_xml())
+
+    def test__play_again__post__returns_text_xml(self):
+        request = RequestFactory().post('/play-again', {'Digits': '2'})
+
+        response = PlayAgain().post(request)
+
+        self.assertEqual(response._headers.get('content-type'), ('Content-Type', 'text/xml'))
+        self.assertIn(b'<Hangup />', response.content)
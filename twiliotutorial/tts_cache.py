@@ -0,0 +1,233 @@
+import hashlib
+import logging
+import os
+import re
+import shlex
+import subprocess
+import threading
+import wave
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from twiliotutorial.metrics import REGISTRY
+
+
+class StubTtsBackend:
+    """Writes a short silent WAV, a little longer for longer text. For tests and local runs without a TTS engine."""
+
+    extension = '.wav'
+
+    def synthesize(self, text: str, voice: str, path: str) -> None:
+        with wave.open(path, 'wb') as audio:
+            audio.setnchannels(1)
+            audio.setsampwidth(1)
+            audio.setframerate(8000)
+            audio.writeframes(b'\x80' * 80 * len(text))
+
+
+class CommandTtsBackend:
+    """Runs a local TTS program, e.g. 'espeak -v {voice} -w {output} {text}'.
+
+    The command is split like a shell would split it and then each argument is formatted, so text with
+    spaces or quotes stays one argument. The voice is passed as settings.VOICE spells it.
+    """
+
+    def __init__(self, command: str, extension: str = '.wav', timeout: float = 30.0):
+        self.command = shlex.split(command)
+        self.extension = extension
+        self.timeout = timeout
+
+    def synthesize(self, text: str, voice: str, path: str) -> None:
+        subprocess.run([argument.format(text=text, voice=voice, output=path) for argument in self.command],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=self.timeout, check=True)
+
+
+class AudioCache:
+    """Speech rendered once and kept on disk, one file per voice and text, named by a hash of both.
+
+    url answers straight away: the file's url if it has been rendered, otherwise None, and the render
+    is queued in the background so the next call can Play it. Once the files add up to more than
+    max_bytes the least recently played are deleted.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, backend, base_url: str):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self.base_url = base_url
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._files = OrderedDict()
+        self._bytes = 0
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tts-render')
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def filename(self, text: str, voice: str) -> str:
+        return hashlib.sha256(f'{voice}\n{text}'.encode()).hexdigest() + self.backend.extension
+
+    def url(self, text: str, voice: str) -> Optional[str]:
+        name = self.filename(text, voice)
+        with self._lock:
+            if name in self._files:
+                self._files.move_to_end(name)
+                self.hits += 1
+                return self.base_url + name
+            self.misses += 1
+            if name in self._pending:
+                return None
+            self._pending.add(name)
+        self._executor.submit(self._render_in_background, text, voice)
+        return None
+
+    def render(self, text: str, voice: str) -> str:
+        """Render now unless it already is, and return the file name."""
+        name = self.filename(text, voice)
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            if name in self._files:
+                return name
+        # Another worker process may have rendered it already
+        if not os.path.exists(path):
+            partial = '%s.%s.partial' % (path, threading.get_ident())
+            try:
+                self.backend.synthesize(text, voice, partial)
+                os.replace(partial, path)
+            finally:
+                if os.path.exists(partial):
+                    os.remove(partial)
+        self._add(name, os.path.getsize(path))
+        return name
+
+    def render_all(self, texts: Iterable[str], voice: str) -> int:
+        rendered = 0
+        for text in texts:
+            self.render(text, voice)
+            rendered += 1
+        return rendered
+
+    def path(self, name: str) -> Optional[str]:
+        """Where the file for a url this cache hands out is, or None if there is no such file (any more).
+
+        The file is looked up on disk rather than in this process's index, as Twilio's fetch of the url
+        often reaches a different worker process than the one that rendered it.
+        """
+        if not re.fullmatch('[0-9a-f]{64}' + re.escape(self.backend.extension), name):
+            return None
+        path = os.path.join(self.directory, name)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            # Evicted, possibly by another worker process
+            self._forget(name)
+            return None
+        self._add(name, size)
+        return path
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._bytes
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._executor.shutdown(wait=wait)
+
+    def _render_in_background(self, text: str, voice: str) -> None:
+        try:
+            self.render(text, voice)
+        except Exception:
+            logging.exception("Could not render speech for %r", text)
+        finally:
+            with self._lock:
+                self._pending.discard(self.filename(text, voice))
+
+    def _load(self) -> None:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(self.backend.extension):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self._bytes += size
+        self._evict()
+
+    def _add(self, name: str, size: int) -> None:
+        with self._lock:
+            if name not in self._files:
+                self._files[name] = size
+                self._bytes += size
+        self._evict()
+
+    def _forget(self, name: str) -> None:
+        with self._lock:
+            size = self._files.pop(name, None)
+            if size is not None:
+                self._bytes -= size
+
+    def _evict(self) -> None:
+        evicted = []
+        with self._lock:
+            # Always keep the newest file, even if it alone is over the limit
+            while self._bytes > self.max_bytes and len(self._files) > 1:
+                name, size = self._files.popitem(last=False)
+                self._bytes -= size
+                self.evictions += 1
+                evicted.append(name)
+        for name in evicted:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+
+def build_tts_backend():
+    if settings.TTS_BACKEND == 'command':
+        return CommandTtsBackend(settings.TTS_COMMAND, extension=settings.TTS_EXTENSION)
+    if settings.TTS_BACKEND == 'stub':
+        return StubTtsBackend()
+    raise ImproperlyConfigured("TTS_BACKEND must be 'stub', 'command' or empty, not %r" % settings.TTS_BACKEND)
+
+
+_audio_cache: Optional[AudioCache] = None
+_audio_cache_lock = threading.Lock()
+
+
+def get_audio_cache() -> AudioCache:
+    global _audio_cache
+    if _audio_cache is None:
+        with _audio_cache_lock:
+            if _audio_cache is None:
+                _audio_cache = AudioCache(directory=settings.TTS_CACHE_DIR, max_bytes=settings.TTS_CACHE_MAX_BYTES,
+                                          backend=build_tts_backend(), base_url=settings.TTS_AUDIO_URL)
+                cache = _audio_cache
+                for name, metric_type, help, value in (
+                        ('hits_total', 'counter', 'Prompts played from pre-rendered audio.', lambda: cache.hits),
+                        ('misses_total', 'counter', 'Prompts spoken with Say while their audio renders.',
+                         lambda: cache.misses),
+                        ('evictions_total', 'counter', 'Rendered audio files deleted to stay under the size limit.',
+                         lambda: cache.evictions),
+                        ('bytes', 'gauge', 'Size of the rendered audio on disk.', cache.size_bytes)):
+                    REGISTRY.register_callback('twiliotutorial_tts_cache_' + name, help, metric_type, value)
+    return _audio_cache
+
+
+def reset_audio_cache() -> None:
+    global _audio_cache
+    with _audio_cache_lock:
+        if _audio_cache is not None:
+            _audio_cache.shutdown()
+        _audio_cache = None
+
+
+# The url of pre-rendered audio for text in voice, if there is any yet. None when TTS_BACKEND is off.
+def audio_url(text: str, voice: str) -> Optional[str]:
+    if not settings.TTS_BACKEND:
+        return None
+    return get_audio_cache().url(text, voice)
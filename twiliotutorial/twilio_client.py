@@ -0,0 +1,63 @@
+import threading
+import urllib.parse
+from typing import Optional, Tuple
+
+import requests
+from django.conf import settings
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client
+
+from twiliotutorial.http_session import build_session
+
+
+class PooledTwilioHttpClient(TwilioHttpClient):
+    """TwilioHttpClient on a session we build, with a default timeout.
+
+    base_url, if set, replaces the scheme and host of every Twilio API url. That is only meant for
+    pointing the client at a local stand-in for tests and benchmarks.
+    """
+
+    def __init__(self, session: requests.Session, timeout: Tuple[float, float], base_url: Optional[str] = None):
+        super().__init__(pool_connections=True)
+        self.session = session
+        self.timeout = timeout
+        self.base_url = base_url
+
+    def request(self, method, url, params=None, data=None, headers=None, auth=None, timeout=None,
+                allow_redirects=False):
+        if self.base_url:
+            base = urllib.parse.urlsplit(self.base_url)
+            url = urllib.parse.urlsplit(url)._replace(scheme=base.scheme, netloc=base.netloc).geturl()
+        return super().request(method, url, params=params, data=data, headers=headers, auth=auth,
+                               timeout=timeout or self.timeout, allow_redirects=allow_redirects)
+
+
+def build_twilio_client(base_url: Optional[str] = None) -> Client:
+    session = build_session(pool_size=settings.TWILIO_POOL_SIZE, max_retries=settings.TWILIO_MAX_RETRIES)
+    http_client = PooledTwilioHttpClient(session=session,
+                                         timeout=(settings.TWILIO_CONNECT_TIMEOUT, settings.TWILIO_READ_TIMEOUT),
+                                         base_url=base_url or settings.TWILIO_API_BASE_URL)
+    return Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_ACCOUNT_TOKEN, http_client=http_client)
+
+
+_twilio_client: Optional[Client] = None
+_twilio_client_lock = threading.Lock()
+
+
+# One Client per process so every send reuses the same keep-alive connections to Twilio. Retries
+# from build_session only cover connection errors here, since POSTs aren't retried on read errors.
+def get_twilio_client() -> Client:
+    global _twilio_client
+    if _twilio_client is None:
+        with _twilio_client_lock:
+            if _twilio_client is None:
+                _twilio_client = build_twilio_client()
+    return _twilio_client
+
+
+def reset_twilio_client() -> None:
+    global _twilio_client
+    with _twilio_client_lock:
+        if _twilio_client is not None:
+            _twilio_client.http_client.session.close()
+        _twilio_client = None
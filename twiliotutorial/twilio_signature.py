@@ -0,0 +1,89 @@
+import base64
+import hmac
+import threading
+import urllib.parse
+from hashlib import sha1
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from twiliotutorial.metrics import REGISTRY
+
+SIGNATURE_HEADER = 'HTTP_X_TWILIO_SIGNATURE'
+
+
+class SignatureValidator:
+    """Checks X-Twilio-Signature: base64 HMAC-SHA1, keyed with the auth token, of the full url Twilio
+    requested followed by every POST parameter name and value, sorted by name.
+
+    The HMAC is keyed once here and every request works on a copy, so only the request's own bytes are
+    hashed per call.
+    """
+
+    def __init__(self, auth_token: str):
+        self._mac = hmac.new(auth_token.encode(), digestmod=sha1)
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def compute(self, url: str, params: Iterable[Tuple[str, List[str]]]) -> bytes:
+        mac = self._mac.copy()
+        mac.update((url + ''.join(name + value for name, values in sorted(params) for value in sorted(values))).encode())
+        return base64.b64encode(mac.digest())
+
+    def is_valid(self, url: str, params: Iterable[Tuple[str, List[str]]], signature: Optional[str]) -> bool:
+        if not signature:
+            return False
+        params = list(params)
+        signature = signature.encode()
+        for candidate in candidate_urls(url):
+            if hmac.compare_digest(self.compute(candidate, params), signature):
+                return True
+        return False
+
+    def reject(self) -> None:
+        with self._lock:
+            self.rejected += 1
+
+
+# Twilio signs the url as it was configured, which may or may not spell out the port
+def candidate_urls(url: str) -> List[str]:
+    parts = urllib.parse.urlsplit(url)
+    if parts.port is None:
+        return [url]
+    return [url, parts._replace(netloc=parts.hostname).geturl()]
+
+
+# The url Twilio requested. Behind a proxy or load balancer the request's own scheme and host are not the
+# public ones, so TWILIO_WEBHOOK_BASE_URL can say what they are.
+def webhook_url(request_url: str) -> str:
+    if not settings.TWILIO_WEBHOOK_BASE_URL:
+        return request_url
+    base = urllib.parse.urlsplit(settings.TWILIO_WEBHOOK_BASE_URL)
+    return urllib.parse.urlsplit(request_url)._replace(scheme=base.scheme, netloc=base.netloc).geturl()
+
+
+_signature_validator: Optional[SignatureValidator] = None
+_signature_validator_lock = threading.Lock()
+
+
+def get_signature_validator() -> SignatureValidator:
+    global _signature_validator
+    if _signature_validator is None:
+        with _signature_validator_lock:
+            if _signature_validator is None:
+                # Without the token every webhook would be refused, so don't start at all
+                if not settings.TWILIO_ACCOUNT_TOKEN:
+                    raise ImproperlyConfigured("TWILIO_VALIDATE_SIGNATURES is on but TWILIO_ACCOUNT_TOKEN isn't set")
+                _signature_validator = SignatureValidator(settings.TWILIO_ACCOUNT_TOKEN)
+                validator = _signature_validator
+                REGISTRY.register_callback('twiliotutorial_webhook_signature_rejected_total',
+                                           'Webhook requests refused for a missing or wrong X-Twilio-Signature.',
+                                           'counter', lambda: validator.rejected)
+    return _signature_validator
+
+
+def reset_signature_validator() -> None:
+    global _signature_validator
+    with _signature_validator_lock:
+        _signature_validator = None
@@ -0,0 +1,61 @@
+import os
+import re
+import threading
+from typing import Dict, Optional
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+
+VARIABLE = re.compile(r'{{\s*(\w+)\s*}}')
+WHITESPACE_BETWEEN_TAGS = re.compile(r'>\s+<')
+XML_ATTRIBUTE_ENTITIES = {'"': '&quot;'}
+
+
+class TwimlTemplate:
+    """A TwiML file from the twiml/ directory, compiled once into literal chunks and variable names.
+
+    Indentation between tags is dropped so the output matches VoiceResponse.to_xml(). Templates
+    without {{variables}} are encoded once and the same bytes are returned for every render.
+    """
+
+    def __init__(self, name: str, source: str):
+        self.name = name
+        parts = VARIABLE.split(WHITESPACE_BETWEEN_TAGS.sub('><', source.strip()))
+        self.literals = [part.encode() for part in parts[0::2]]
+        self.variables = parts[1::2]
+        self.static: Optional[bytes] = self.literals[0] if not self.variables else None
+
+    def render(self, **context) -> bytes:
+        if self.static is not None:
+            return self.static
+        chunks = [self.literals[0]]
+        for variable, literal in zip(self.variables, self.literals[1:]):
+            chunks.append(escape(str(context[variable]), XML_ATTRIBUTE_ENTITIES).encode())
+            chunks.append(literal)
+        return b''.join(chunks)
+
+
+def load_templates(directory: str) -> Dict[str, TwimlTemplate]:
+    templates = {}
+    for file_name in sorted(os.listdir(directory)):
+        if file_name.endswith('.xml'):
+            with open(os.path.join(directory, file_name), encoding='utf-8') as template_file:
+                templates[file_name] = TwimlTemplate(file_name, template_file.read())
+    return templates
+
+
+_templates: Optional[Dict[str, TwimlTemplate]] = None
+_templates_lock = threading.Lock()
+
+
+def get_template(name: str) -> TwimlTemplate:
+    global _templates
+    if _templates is None:
+        with _templates_lock:
+            if _templates is None:
+                _templates = load_templates(settings.TWIML_TEMPLATE_DIR)
+    return _templates[name]
+
+
+def render_twiml(name: str, **context) -> bytes:
+    return get_template(name).render(**context)
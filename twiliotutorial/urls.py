@@ -22,5 +22,10 @@ urlpatterns = [
     path('play-again', app_views.PlayAgain.as_view(), name='play-again'),
     path('beerfact', app_views.BeerFactView.as_view(), name='beerfact'),
     path('beertext', app_views.BeerTextView.as_view(), name='beertext'),
+    path('sms-status', app_views.SmsStatusView.as_view(), name='sms-status'),
+    path('sms-delivery', app_views.SmsDeliveryRatesView.as_view(), name='sms-delivery'),
+    path('call-status', app_views.CallStatusView.as_view(), name='call-status'),
+    path('metrics', app_views.MetricsView.as_view(), name='metrics'),
+    path('audio/<str:name>', app_views.AudioView.as_view(), name='audio'),
 
 ]
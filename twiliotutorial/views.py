@@ -1,132 +1,199 @@
+import hmac
 import logging
+import mimetypes
+import os
+from typing import Optional
 
 from django.conf import settings
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, JsonResponse
 from django.views import View
-from twilio.rest import Client
 from twilio.twiml import voice_response
 
-from twiliotutorial.beer import Beer, BeerFact
+from twiliotutorial.beer import Beer, BeerFact, get_beer
+from twiliotutorial.beer_pool import get_random_beer_pool
+from twiliotutorial.call_session import get_call_sessions
+from twiliotutorial.dialer import get_outbound_dialer
+from twiliotutorial.metrics import REGISTRY, twiml_latency, upstream_latency
+from twiliotutorial.rate_limiter import get_sms_rate_limiter
+from twiliotutorial.sms_queue import SmsJob, SmsQueueFull, get_sms_dispatcher
+from twiliotutorial.sms_status import get_sms_status_buffer, sms_status_callback_url
+from twiliotutorial.tts_cache import audio_url, get_audio_cache
+from twiliotutorial.twiml_templates import render_twiml
 
-logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+
+def get_twilio_client():
+    # twilio.rest and requests take a good part of a worker's import time, so they are only loaded
+    # by the first text a worker sends (or by warmup.warm_up)
+    from twiliotutorial import twilio_client
+    return twilio_client.get_twilio_client()
 
 
 class InteractiveVoiceResponseView(View):
 
     def post(self, request, *args, **kwargs):
         if 'Digits' in request.POST:
-            response = self.handle_digits(digits=request.POST['Digits'])
+            twiml = self.handle_digits(digits=request.POST['Digits'])
         else:
-            response = self.handle_prompt()
+            twiml = self.handle_prompt()
 
-        return HttpResponse(response.to_xml())
+        return HttpResponse(twiml)
 
-    def handle_prompt(self):
-        response = voice_response.VoiceResponse()
-        gather = response.gather(action='/callback', num_digits=2, timeout=30)
-        gather.say("Pick a number between 0 and 99")
-        return response
+    def handle_prompt(self) -> bytes:
+        return render_twiml('pick_a_number.xml')
 
-    def handle_digits(self, digits):
-        response = voice_response.VoiceResponse()
-        response.say(f"You picked {digits}")
-        response.redirect('/play-again')
-
-        return response
+    def handle_digits(self, digits) -> bytes:
+        return render_twiml('you_picked.xml', digits=digits)
 
 
 class PlayAgain(View):
 
     def post(self, request):
         if 'Digits' in request.POST:
-            response = self.handle_digits(digits=request.POST['Digits'])
+            call_sid = request.POST.get('CallSid')
+            if call_sid is not None and request.POST['Digits'] != '1':
+                # The call is hanging up, nothing will ask for its session again
+                get_call_sessions().delete(call_sid)
+            twiml = self.handle_digits(digits=request.POST['Digits'])
         else:
-            response = self.handle_prompt()
+            twiml = self.handle_prompt()
 
-        return HttpResponse(response.to_xml(), content_type='text/xml')
+        return HttpResponse(twiml, content_type='text/xml')
 
-    def handle_prompt(self):
-        response = voice_response.VoiceResponse()
-        gather = response.gather(num_digits=1, timeout=30, action='/play-again')
-        gather.say('Press 1 to run again, press 2 to hang up')
-        return response
-
-    def handle_digits(self, digits):
-        response = voice_response.VoiceResponse()
+    def handle_prompt(self) -> bytes:
+        return render_twiml('play_again.xml')
 
+    def handle_digits(self, digits) -> bytes:
         if digits == '1':
-            response.redirect('/callback')
-        else:
-            response.say('Goodbye')
-            response.hangup()
+            return render_twiml('run_again.xml')
+        return render_twiml('goodbye.xml')
 
-        return response
+
+GREETING = "Hello! I am going to drop a dank beer on you."
+NO_BEER = "Sorry, I can't find any beer right now. Please call back later."
+GOODBYE = "Wow! You made it to the end. Be excellent to each other."
+
+# Every line /beerfact says that doesn't depend on the beer
+STATIC_PROMPTS = (GREETING, NO_BEER, GOODBYE)
 
 
 class BeerFactView(View):
 
+    # Play the line's pre-rendered audio if there is some, so Twilio doesn't synthesize it on every call
+    def speak(self, verb, text: str) -> None:
+        url = audio_url(text, settings.VOICE)
+        if url is None:
+            verb.say(text, voice=settings.VOICE)
+        else:
+            verb.play(url)
+
     def build_response(self, beer_fact: BeerFact) -> voice_response.VoiceResponse:
         response = voice_response.VoiceResponse()
-        response.say("Hello! I am going to drop a dank beer on you.", voice=settings.VOICE)
+        self.speak(response, GREETING)
+        if beer_fact.id is None:
+            # No beer from the API and none cached. There is nothing to text either, so skip the Gather
+            self.speak(response, NO_BEER)
+            response.hangup()
+            return response
         gather = voice_response.Gather(
             action="/beertext?beerid=" + beer_fact.id,
             action_on_empty_result=False,
             timeout=200,
             numDigits=1,
             finishOnKey='')
-        gather.say(f"Our beer today is {beer_fact.name}", voice=settings.VOICE)
-
-        if beer_fact.abv:
-            gather.say(f"Coming in at {beer_fact.abv} percent.", voice=settings.VOICE)
-
-        if beer_fact.style:
-            if 'description' in beer_fact.style:
-                description = beer_fact.style['description']
-                gather.say(f"{description}", voice=settings.VOICE)
+        for line in beer_fact.say_lines:
+            self.speak(gather, line)
         response.append(gather)
-        response.say("Wow! You made it to the end. Be excellent to each other.", voice=settings.VOICE)
+        self.speak(response, GOODBYE)
         response.hangup()
         return response
 
     def get_beer_fact(self) -> BeerFact:
-        beer = Beer()
+        if settings.BEER_POOL_ENABLED:
+            return get_random_beer_pool().get()
+        beer = get_beer()
         fact = beer.get_random_beer_fact()
         logging.debug("Beer info: %s", beer)
         return fact
 
+    # The beer this call already heard, if it comes back to /beerfact, otherwise a new one
+    def get_beer_fact_for_call(self, call_sid: Optional[str]) -> BeerFact:
+        if call_sid is None:
+            return self.get_beer_fact()
+        sessions = get_call_sessions()
+        beer_fact = sessions.get(call_sid).get('beer_fact')
+        if beer_fact is None:
+            beer_fact = self.get_beer_fact()
+            if beer_fact.id is not None:
+                sessions.update(call_sid, beer_fact=beer_fact)
+        return beer_fact
+
     def post(self, request):
-        beer_fact = self.get_beer_fact()
+        beer_fact = self.get_beer_fact_for_call(request.POST.get('CallSid'))
         response = self.build_response(beer_fact)
-        return HttpResponse(response.to_xml(), content_type='text/xml')
+        with twiml_latency.time('beerfact'):
+            twiml = response.to_xml()
+        return HttpResponse(twiml, content_type='text/xml')
 
 
 class BeerTextView(View):
-    def create_text_body(self, beer_fact):
-        body = f"Hi there! You were listening to: {getattr(beer_fact, 'name')}, " \
-               f"{getattr(beer_fact, 'abv', 'Unknown')}%, IBU: {getattr(beer_fact, 'ibu', 'Unknown')}"
-        return body
+    def create_text_body(self, beer_fact: BeerFact) -> str:
+        return beer_fact.text_body
 
     def text_beer_info_to_number(self, beer_fact: BeerFact, from_: str,
                                  to_: str) -> None:
 
-        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_ACCOUNT_TOKEN)
+        client = get_twilio_client()
 
         text_body = self.create_text_body(beer_fact)
 
-        message = client.messages.create(
-            body=text_body,
-            from_=to_,
-            to=from_
-        )
+        # Only ask for delivery callbacks when there is a public url for Twilio to post them to
+        status_callback = sms_status_callback_url(beer_fact.id)
+        extra = {'status_callback': status_callback} if status_callback else {}
+        with upstream_latency.time('twilio_messages'):
+            message = client.messages.create(
+                body=text_body,
+                from_=to_,
+                to=from_,
+                **extra
+            )
         logging.info("Sent sms: %s", message.sid)
 
     def get_beer_fact_for_beer_id(self, beer_id: str) -> BeerFact:
-        beer = Beer()
+        beer = get_beer()
         fact = beer.get_beer_by_id(beer_id=beer_id)
         logging.debug("Beer info: %s", beer)
         return fact
 
+    # The beer /beerfact picked for this call, without looking it up again
+    def get_beer_fact_for_call(self, call_sid: Optional[str], beer_id: str) -> BeerFact:
+        if call_sid is not None:
+            beer_fact = get_call_sessions().get(call_sid).get('beer_fact')
+            if beer_fact is not None and beer_fact.id == beer_id:
+                return beer_fact
+        return self.get_beer_fact_for_beer_id(beer_id=beer_id)
+
+    # Runs on an sms dispatch worker, off the webhook. Raising makes the dispatcher retry the job.
+    @classmethod
+    def send_queued_text(cls, job: SmsJob) -> None:
+        view = cls()
+        # The beer /beerfact saved for the call, when the session is still there
+        beer_fact = view.get_beer_fact_for_call(call_sid=job.call_sid, beer_id=job.beer_id)
+        if beer_fact.id is None:
+            logging.info("No beer found for %s, not texting", job.beer_id)
+            return
+        view.text_beer_info_to_number(beer_fact=beer_fact, from_=job.from_, to_=job.to_)
+
+    def queue_beer_text(self, call_sid: str, beer_id: str, from_: str, to_: str) -> None:
+        dispatcher = get_sms_dispatcher(send=self.send_queued_text)
+        try:
+            queued = dispatcher.enqueue(dedupe_key=f"{call_sid}:{beer_id}", beer_id=beer_id, from_=from_, to_=to_,
+                                        call_sid=call_sid)
+        except SmsQueueFull:
+            logging.warning("SMS queue is full, dropping text for %s", call_sid)
+            return
+        if not queued:
+            logging.info("Already texted %s about %s", call_sid, beer_id)
+
     def post(self, request):
         logging.info("OOhhh...Engagement.")
         request_beerid = request.GET.get('beerid')  # Even though this is a post, django puts query params in the GET.
@@ -137,11 +204,89 @@ class BeerTextView(View):
             logging.info("Weird, we didn't get a beerid")
         elif request_from_number is None:
             logging.info("Weird, we didn't get a number")
+        elif settings.SMS_QUEUE_BACKEND:
+            call_sid = request.POST.get("CallSid", request_from_number)
+            self.queue_beer_text(call_sid=call_sid, beer_id=request_beerid, from_=request_from_number,
+                                 to_=request_to_number)
         else:
-            beer_fact = self.get_beer_fact_for_beer_id(beer_id=request_beerid)
-            self.text_beer_info_to_number(beer_fact=beer_fact, from_=request_from_number,
-                                          to_=request_to_number)
+            beer_fact = self.get_beer_fact_for_call(call_sid=request.POST.get("CallSid"), beer_id=request_beerid)
+            if beer_fact.id is None:
+                logging.info("No beer found for %s, not texting", request_beerid)
+            elif get_sms_rate_limiter().reserve(request_to_number) > 0:
+                # Over the sending rate: hand it to the dispatch queue, which holds it until there is room
+                call_sid = request.POST.get("CallSid", request_from_number)
+                self.queue_beer_text(call_sid=call_sid, beer_id=request_beerid, from_=request_from_number,
+                                     to_=request_to_number)
+            else:
+                from requests import RequestException
+                from twilio.base.exceptions import TwilioException
+                try:
+                    self.text_beer_info_to_number(beer_fact=beer_fact, from_=request_from_number,
+                                                  to_=request_to_number)
+                except (TwilioException, RequestException):
+                    # A 500 would make Twilio tell the caller an application error occurred
+                    logging.exception("Could not text beer %s", request_beerid)
+
+        return HttpResponse(render_twiml('empty.xml'), content_type='text/xml')
+
+
+class SmsStatusView(View):
+
+    # Twilio posts every status change of a text here. Only buffered, so a burst of callbacks never waits on disk
+    def post(self, request):
+        message_sid = request.POST.get('MessageSid')
+        message_status = request.POST.get('MessageStatus')
+        if message_sid is None or message_status is None:
+            logging.info("Weird, we got an sms status without a MessageSid or MessageStatus")
+        else:
+            get_sms_status_buffer().add(message_sid, message_status, beer_id=request.GET.get('beerid'),
+                                        error_code=request.POST.get('ErrorCode'))
+        # Without a content_type Django 2.2 reads settings.DEFAULT_CONTENT_TYPE, which walks the stack to
+        # decide whether to warn about it and costs more than the rest of this view
+        return HttpResponse(status=204, content_type='text/plain')
 
-        response = voice_response.VoiceResponse()
-        response = HttpResponse(response.to_xml(), content_type='text/xml')
+
+class SmsDeliveryRatesView(View):
+
+    # Twilio doesn't call this, so it isn't signed; it takes SMS_DELIVERY_REPORT_TOKEN as a bearer token instead
+    def get(self, request):
+        token = settings.SMS_DELIVERY_REPORT_TOKEN
+        if not token:
+            raise Http404('sms-delivery')
+        if not hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer ' + token):
+            return HttpResponseForbidden()
+        return JsonResponse(get_sms_status_buffer().delivery_rates())
+
+
+class CallStatusView(View):
+
+    # Status callbacks for the calls the outbound dialer places
+    def post(self, request):
+        call_sid = request.POST.get('CallSid')
+        call_status = request.POST.get('CallStatus')
+        if call_sid is None or call_status is None:
+            logging.info("Weird, we got a call status without a CallSid or CallStatus")
+        elif not get_outbound_dialer().status_update(call_sid, call_status):
+            logging.debug("Status %s for call %s, which the dialer doesn't know (yet)", call_status, call_sid)
+        return HttpResponse(status=204, content_type='text/plain')
+
+
+class AudioView(View):
+
+    def get(self, request, name):
+        path = get_audio_cache().path(name)
+        if path is None:
+            raise Http404(name)
+        response = FileResponse(open(path, 'rb'), content_type=mimetypes.guess_type(name)[0])
+        # The name is a hash of the voice and text, so the content never changes
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
         return response
+
+
+class MetricsView(View):
+
+    def get(self, request):
+        # Every worker process keeps its own metrics and answers the scrapes that reach it, so label them by
+        # worker; otherwise each scrape looks like a counter reset. Sum over the label to get the server's.
+        extra_labels = 'worker="%s"' % os.getpid() if settings.METRICS_WORKER_LABEL else ''
+        return HttpResponse(REGISTRY.exposition(extra_labels), content_type='text/plain; version=0.0.4')
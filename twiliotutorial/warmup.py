@@ -0,0 +1,25 @@
+import logging
+import time
+
+from django.conf import settings
+
+
+# Does ahead of time what the first requests of a worker would otherwise do: import the modules that are
+# loaded lazily, compile the TwiML templates and load the beer snapshot. It opens no connections and starts
+# no threads, so it is safe to run in a gunicorn master before it forks (see gunicorn.conf.py).
+def warm_up() -> float:
+    started = time.perf_counter()
+    import requests  # noqa: F401
+    from twilio.rest.api.v2010.account.message import MessageList  # noqa: F401
+
+    import twiliotutorial.urls  # noqa: F401
+    from twiliotutorial import twilio_client  # noqa: F401
+    from twiliotutorial.twiml_templates import get_template
+    get_template('empty.xml')
+    if settings.BEER_BACKEND == 'snapshot':
+        from twiliotutorial.beer_snapshot import get_beer_snapshot
+        get_beer_snapshot()
+
+    elapsed = time.perf_counter() - started
+    logging.info("Warmed up in %.0fms", elapsed * 1000)
+    return elapsed